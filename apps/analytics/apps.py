@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class AnalyticsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.analytics'
+    verbose_name = "Số liệu tổng hợp theo ngày (Rollup)"
+
+    def ready(self):
+        import apps.analytics.signals
@@ -0,0 +1,83 @@
+"""
+Lọc theo ngày (giờ địa phương) trên cột DateTimeField mà vẫn dùng được index.
+
+[TỐI ƯU] Lookup `created_at__date__range` / `appointment_date__date=...` sinh ra DATE(CONVERT_TZ(cột, ...))
+nên MySQL không dùng được index, phải quét toàn bảng. Ở đây khoảng ngày được đổi thành
+[00:00 ngày đầu, 00:00 ngày sau ngày cuối) có múi giờ -> so sánh thẳng trên cột (range scan theo index).
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def to_date(value):
+    """date / datetime / 'YYYY-MM-DD' -> date (None nếu rỗng hoặc sai định dạng)."""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date((value or '').strip()[:10])
+    except ValueError:  # đúng định dạng nhưng không có thật, vd 2026-02-31
+        return None
+
+
+def day_start(day):
+    """00:00 của ngày `day` theo giờ địa phương, có múi giờ."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def parse_bound(value):
+    """Cận ngày từ tham số: rỗng -> None; có giá trị nhưng không đọc được -> ValueError (không lặng lẽ bỏ cận)."""
+    if value is None or value == '':
+        return None
+    day = to_date(value)
+    if day is None:
+        raise ValueError(f"Ngày không hợp lệ: {value}")
+    return day
+
+
+def parse_moment(value):
+    """
+    Mốc thời gian từ tham số: ISO datetime (có / không múi giờ) hoặc 'YYYY-MM-DD' (= 00:00 ngày đó),
+    trả về datetime có múi giờ. Rỗng -> None; sai định dạng -> ValueError (như parse_bound).
+    """
+    if value is None or value == '':
+        return None
+    try:
+        moment = parse_datetime(value.strip())
+    except ValueError:  # đúng định dạng nhưng không có thật
+        raise ValueError(f"Thời điểm không hợp lệ: {value}")
+    if moment is None:
+        return day_start(parse_bound(value))
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def day_bounds(start, end=None):
+    """
+    Khoảng [00:00 ngày start, 00:00 ngày sau end) có múi giờ; end bỏ trống = chỉ 1 ngày start.
+    Ngày thiếu / sai định dạng -> ValueError (giống day_range).
+    """
+    start = parse_bound(start)
+    if start is None:
+        raise ValueError("Thiếu ngày bắt đầu")
+    end = parse_bound(end) or start
+    return day_start(start), day_start(end + timedelta(days=1))
+
+
+def day_range(field, start, end=None):
+    """
+    Q(field__gte=..., field__lt=...) cho các ngày từ start đến end (tính cả 2 đầu), dùng thay cho
+    `field__date__range=[start, end]` / `field__date=start`. Cận rỗng thì bỏ qua; cận sai định dạng
+    -> ValueError để view báo lỗi / về khoảng mặc định thay vì truy vấn không giới hạn.
+    """
+    start = parse_bound(start)
+    end = parse_bound(end) if end is not None else start
+    condition = Q()
+    if start:
+        condition &= Q(**{f'{field}__gte': day_start(start)})
+    if end:
+        condition &= Q(**{f'{field}__lt': day_start(end + timedelta(days=1))})
+    return condition
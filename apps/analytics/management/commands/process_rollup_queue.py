@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.analytics.rollups import QUEUE_BATCH_DAYS, process_pending_days
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại DailyFact cho các ngày trong hàng đợi PendingRollupDay (chạy qua cron hoặc --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-days', type=int, default=QUEUE_BATCH_DAYS, help='Số ngày lấy khỏi hàng đợi mỗi lượt')
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục như 1 worker')
+        parser.add_argument('--sleep', type=int, default=5, help='Số giây nghỉ khi hàng đợi trống (chế độ --loop)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Bắt đầu xử lý hàng đợi tổng hợp số liệu ngày..."))
+        total = 0
+
+        while True:
+            rebuilt = process_pending_days(options['batch_days'])
+            total += rebuilt
+            if rebuilt:
+                self.stdout.write(f"--- Đã dựng lại {rebuilt} ngày")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã dựng lại {total} ngày! ==="))
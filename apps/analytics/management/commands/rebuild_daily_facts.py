@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.analytics.rollups import as_day, rebuild_days
+from apps.customers.models import Customer
+from apps.sales.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Đối soát & dựng lại bảng số liệu ngày (DailyFact). Chạy hằng đêm qua cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Dựng lại N ngày gần nhất (mặc định 7)')
+        parser.add_argument('--start', help='Ngày bắt đầu (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Ngày kết thúc (YYYY-MM-DD), mặc định hôm nay')
+        parser.add_argument('--all', action='store_true', help='Dựng lại toàn bộ lịch sử từ ngày có dữ liệu đầu tiên')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else today
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+        except ValueError:
+            raise CommandError('Ngày phải có dạng YYYY-MM-DD')
+
+        if options['all']:
+            first_lead = as_day(Customer.objects.aggregate(m=Min('created_at'))['m'])
+            first_order = Order.objects.aggregate(m=Min('order_date'))['m']
+            start = min([d for d in (first_lead, first_order) if d] or [today])
+        elif start is None:
+            start = end - timedelta(days=options['days'] - 1)
+
+        if start > end:
+            raise CommandError('Ngày bắt đầu phải trước ngày kết thúc')
+
+        self.stdout.write(self.style.SUCCESS(f"Bắt đầu dựng lại số liệu từ {start} đến {end}..."))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        rebuilt = rebuild_days(days)
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã dựng lại {rebuilt} ngày! ==="))
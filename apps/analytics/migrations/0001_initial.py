@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('sales', '0009_merge_0003_order_order_date_index_0008_order_digitals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Ngày')),
+                ('rebuilt_at', models.DateTimeField(auto_now=True, verbose_name='Dựng lại lúc')),
+            ],
+            options={
+                'verbose_name': 'Ngày đã tổng hợp',
+                'verbose_name_plural': 'Các ngày đã tổng hợp',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Ngày')),
+                ('fanpage_code', models.CharField(blank=True, default='', max_length=50, verbose_name='Mã Fanpage')),
+                ('leads', models.FloatField(default=0, verbose_name='Lead mới')),
+                ('calls', models.FloatField(default=0, verbose_name='Cuộc gọi')),
+                ('appointments', models.FloatField(default=0, verbose_name='Lịch hẹn tạo mới')),
+                ('appointments_arrived', models.FloatField(default=0, verbose_name='Lịch hẹn đã đến')),
+                ('orders', models.FloatField(default=0, verbose_name='Số đơn')),
+                ('paid_orders', models.FloatField(default=0, verbose_name='Số đơn đã thanh toán đủ')),
+                ('revenue', models.FloatField(default=0, verbose_name='Thực thu')),
+                ('sales', models.FloatField(default=0, verbose_name='Tổng giá trị đơn')),
+                ('paid_sales', models.FloatField(default=0, verbose_name='Doanh số đơn đã thanh toán đủ')),
+                ('debt', models.FloatField(default=0, verbose_name='Công nợ')),
+                ('consultant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Tư vấn viên')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sales.service', verbose_name='Dịch vụ')),
+                ('telesale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Telesale')),
+            ],
+            options={
+                'verbose_name': 'Số liệu ngày',
+                'verbose_name_plural': 'Số liệu tổng hợp theo ngày',
+                'indexes': [models.Index(fields=['day', 'fanpage_code'], name='analytics_fact_day_fp_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Ngày')),
+                ('queued_at', models.DateTimeField(auto_now_add=True, verbose_name='Đưa vào hàng đợi lúc')),
+            ],
+            options={
+                'verbose_name': 'Ngày chờ tổng hợp',
+                'verbose_name_plural': 'Hàng đợi tổng hợp theo ngày',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_pendingrollupday'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyfact',
+            name='debt',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Công nợ'),
+        ),
+        migrations.AlterField(
+            model_name='dailyfact',
+            name='paid_sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Doanh số đơn đã thanh toán đủ'),
+        ),
+        migrations.AlterField(
+            model_name='dailyfact',
+            name='revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Thực thu'),
+        ),
+        migrations.AlterField(
+            model_name='dailyfact',
+            name='sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Tổng giá trị đơn'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Min
+from django.utils import timezone
+
+
+def queue_history(apps, schema_editor):
+    # Dashboard chỉ đọc DailyFact: đưa mọi ngày từ ngày có dữ liệu đầu tiên đến hôm nay vào hàng đợi
+    # để worker `process_rollup_queue` dựng bù (migration chỉ chèn ngày, không tính số liệu).
+    Customer = apps.get_model('customers', 'Customer')
+    Order = apps.get_model('sales', 'Order')
+    PendingRollupDay = apps.get_model('analytics', 'PendingRollupDay')
+
+    first_lead = Customer.objects.aggregate(m=Min('created_at'))['m']
+    first_order = Order.objects.aggregate(m=Min('order_date'))['m']
+    starts = [d for d in (first_lead and timezone.localtime(first_lead).date(), first_order) if d]
+    if not starts:
+        return
+    today = timezone.localdate()
+    start = min(starts)
+    days = [start + timedelta(days=i) for i in range((today - start).days + 1)]
+    PendingRollupDay.objects.bulk_create([PendingRollupDay(day=d) for d in days], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_dailyfact_money_decimal'),
+        ('customers', '0020_customer_customers_created_idx'),
+        ('sales', '0012_order_paid_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.db import models
+from django.conf import settings
+
+
+class DailyFact(models.Model):
+    """
+    Bảng số liệu đã tổng hợp sẵn theo: Ngày x Telesale x Tư vấn viên x Dịch vụ x Fanpage.
+    Các Dashboard đọc vài trăm dòng ở đây thay vì quét hàng chục nghìn dòng Order/Customer/CallLog/Appointment.
+
+    Mỗi chỉ số được ghi nhận vào ngày của chính nó:
+    - leads: ngày tạo khách (Customer.created_at), Telesale = người phụ trách khách.
+    - calls: ngày gọi (CallLog.call_time), Telesale = người gọi.
+    - appointments: ngày tạo lịch hẹn; appointments_arrived: ngày hẹn, lịch đã đến (ARRIVED/COMPLETED).
+    - orders / revenue / sales / debt: ngày chốt đơn (Order.order_date); paid_*: chỉ đơn đã thanh toán đủ.
+    Khách thuộc nhiều Fanpage được chia đều 1/n cho từng Fanpage nên các chỉ số có thể là số lẻ;
+    các cột tiền là Decimal (không cộng dồn số thực nhị phân của tiền VNĐ).
+
+    Dữ liệu được dựng lại theo từng ngày (apps.analytics.rollups) - không sửa tay.
+    """
+    day = models.DateField(verbose_name="Ngày")
+    telesale = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Telesale")
+    consultant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Tư vấn viên")
+    service = models.ForeignKey('sales.Service', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Dịch vụ")
+    fanpage_code = models.CharField(max_length=50, blank=True, default='', verbose_name="Mã Fanpage")
+
+    leads = models.FloatField(default=0, verbose_name="Lead mới")
+    calls = models.FloatField(default=0, verbose_name="Cuộc gọi")
+    appointments = models.FloatField(default=0, verbose_name="Lịch hẹn tạo mới")
+    appointments_arrived = models.FloatField(default=0, verbose_name="Lịch hẹn đã đến")
+    orders = models.FloatField(default=0, verbose_name="Số đơn")
+    paid_orders = models.FloatField(default=0, verbose_name="Số đơn đã thanh toán đủ")
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Thực thu")
+    sales = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Tổng giá trị đơn")
+    paid_sales = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Doanh số đơn đã thanh toán đủ")
+    debt = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Công nợ")
+
+    def __str__(self):
+        return f"{self.day} | TS {self.telesale_id} | TV {self.consultant_id} | DV {self.service_id} | {self.fanpage_code or '-'}"
+
+    class Meta:
+        verbose_name = "Số liệu ngày"
+        verbose_name_plural = "Số liệu tổng hợp theo ngày"
+        indexes = [
+            models.Index(fields=['day', 'fanpage_code'], name='analytics_fact_day_fp_idx'),
+        ]
+
+
+class RollupDay(models.Model):
+    """Đánh dấu ngày đã được dựng DailyFact (và dùng làm khoá khi dựng lại ngày đó)."""
+    day = models.DateField(unique=True, verbose_name="Ngày")
+    rebuilt_at = models.DateTimeField(auto_now=True, verbose_name="Dựng lại lúc")
+
+    def __str__(self):
+        return f"{self.day} (dựng lúc {self.rebuilt_at:%d/%m %H:%M})"
+
+    class Meta:
+        verbose_name = "Ngày đã tổng hợp"
+        verbose_name_plural = "Các ngày đã tổng hợp"
+
+
+class PendingRollupDay(models.Model):
+    """
+    Hàng đợi các ngày cần dựng lại DailyFact. Request ghi dữ liệu chỉ chèn ngày vào đây (sau commit),
+    worker `process_rollup_queue` lấy ra và dựng lại.
+    """
+    day = models.DateField(unique=True, verbose_name="Ngày")
+    queued_at = models.DateTimeField(auto_now_add=True, verbose_name="Đưa vào hàng đợi lúc")
+
+    def __str__(self):
+        return str(self.day)
+
+    class Meta:
+        verbose_name = "Ngày chờ tổng hợp"
+        verbose_name_plural = "Hàng đợi tổng hợp theo ngày"
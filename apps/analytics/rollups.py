@@ -0,0 +1,216 @@
+"""
+Dựng bảng DailyFact theo ngày.
+
+- `rebuild_days(days)`: xoá & tính lại số liệu của đúng các ngày được chỉ định
+  (đọc thô bằng .values_list trong khoảng thời gian của lô ngày, cộng dồn trong Python).
+- `mark_days_dirty(days)`: được gọi từ signal khi Order/Customer/CallLog/Appointment thay đổi.
+  Các ngày bẩn được gom theo transaction và sau khi commit chỉ được chèn vào hàng đợi PendingRollupDay
+  (1 câu INSERT) - request không quét / dựng lại gì.
+- `process_pending_days()`: worker (lệnh `process_rollup_queue`) lấy các ngày trong hàng đợi ra dựng lại.
+- `facts_between(start, end)`: queryset DailyFact cho Dashboard, chỉ đọc (không dựng trong request GET).
+  Lịch sử có trước bảng này được migration 0004 đưa cả vào hàng đợi; `pending_days_between` cho Dashboard
+  biết ngày nào còn chờ worker để hiện cảnh báo "số liệu chưa cập nhật".
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.analytics.dates import day_bounds
+from apps.analytics.models import DailyFact, PendingRollupDay, RollupDay
+from apps.bookings.models import Appointment
+from apps.core.oncommit import OnCommitBatch
+from apps.customers.models import Customer
+from apps.marketing.attribution import customer_pages
+from apps.sales.models import Order
+from apps.telesales.models import CallLog
+
+# Số ngày tối đa dựng trong 1 lô (giới hạn kích thước mỗi lần quét)
+REBUILD_CHUNK_DAYS = 31
+# Giới hạn số tham số trong mệnh đề IN khi đọc theo danh sách khách
+ID_CHUNK_SIZE = 900
+
+# Số ngày tối đa worker lấy khỏi hàng đợi mỗi lượt
+QUEUE_BATCH_DAYS = 31
+
+ARRIVED_STATUSES = ['ARRIVED', 'COMPLETED']
+
+MEASURES = (
+    'leads', 'calls', 'appointments', 'appointments_arrived',
+    'orders', 'paid_orders', 'revenue', 'sales', 'paid_sales', 'debt',
+)
+# Cột tiền: cộng dồn bằng Decimal (kể cả phần chia 1/n theo Fanpage), làm tròn đến 0.01 khi ghi
+MONEY_MEASURES = ('revenue', 'sales', 'paid_sales', 'debt')
+CENT = Decimal('0.01')
+
+def as_day(value):
+    """Quy giá trị ngày/giờ về ngày theo múi giờ hệ thống (giống lookup __date của Django)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _empty_measures():
+    return {measure: Decimal(0) if measure in MONEY_MEASURES else 0.0 for measure in MEASURES}
+
+
+def _contiguous_chunks(days):
+    """Tách danh sách ngày thành các lô liên tiếp, mỗi lô tối đa REBUILD_CHUNK_DAYS ngày."""
+    chunk = []
+    for day in sorted(set(days)):
+        if chunk and ((day - chunk[-1]).days > 1 or len(chunk) >= REBUILD_CHUNK_DAYS):
+            yield chunk
+            chunk = []
+        chunk.append(day)
+    if chunk:
+        yield chunk
+
+
+def compute_facts(days):
+    """Tính các dòng DailyFact (chưa lưu) cho 1 lô ngày liên tiếp."""
+    days = set(days)
+    start, end = min(days), max(days)
+    dt_start, dt_end = day_bounds(start, end)
+
+    leads = Customer.objects.filter(created_at__gte=dt_start, created_at__lt=dt_end).values_list(
+        'id', 'created_at', 'assigned_telesale_id', 'fanpage'
+    )
+    calls = CallLog.objects.filter(call_time__gte=dt_start, call_time__lt=dt_end).values_list(
+        'customer_id', 'call_time', 'caller_id', 'customer__fanpage'
+    )
+    appts = Appointment.objects.filter(created_at__gte=dt_start, created_at__lt=dt_end).values_list(
+        'customer_id', 'created_at', 'customer__assigned_telesale_id', 'assigned_consultant_id', 'service_id', 'customer__fanpage'
+    )
+    arrivals = Appointment.objects.filter(
+        appointment_date__gte=dt_start, appointment_date__lt=dt_end, status__in=ARRIVED_STATUSES
+    ).values_list(
+        'customer_id', 'appointment_date', 'customer__assigned_telesale_id', 'assigned_consultant_id', 'service_id', 'customer__fanpage'
+    )
+    orders = Order.objects.filter(order_date__range=[start, end]).values_list(
+        'customer_id', 'order_date', 'customer__assigned_telesale_id', 'assigned_consultant_id', 'service_id', 'customer__fanpage',
+        'actual_revenue', 'total_amount', 'debt_amount', 'is_paid'
+    )
+
+    # (customer_id, ngày, telesale, tư vấn, dịch vụ, fanpage cũ, {chỉ số: giá trị})
+    events = []
+    for cid, created_at, telesale_id, legacy_fp in leads:
+        events.append((cid, as_day(created_at), telesale_id, None, None, legacy_fp, {'leads': 1}))
+    for cid, call_time, caller_id, legacy_fp in calls:
+        events.append((cid, as_day(call_time), caller_id, None, None, legacy_fp, {'calls': 1}))
+    for cid, created_at, telesale_id, consultant_id, service_id, legacy_fp in appts:
+        events.append((cid, as_day(created_at), telesale_id, consultant_id, service_id, legacy_fp, {'appointments': 1}))
+    for cid, appt_date, telesale_id, consultant_id, service_id, legacy_fp in arrivals:
+        events.append((cid, as_day(appt_date), telesale_id, consultant_id, service_id, legacy_fp, {'appointments_arrived': 1}))
+    for cid, order_date, telesale_id, consultant_id, service_id, legacy_fp, revenue, total, debt, is_paid in orders:
+        values = {'orders': 1, 'revenue': Decimal(revenue or 0), 'sales': Decimal(total or 0), 'debt': Decimal(debt or 0)}
+        if is_paid:
+            values.update(paid_orders=1, paid_sales=Decimal(total or 0))
+        events.append((cid, order_date, telesale_id, consultant_id, service_id, legacy_fp, values))
+
+    # Khách nhiều Fanpage được chia đều 1/n (apps.marketing.attribution)
+    pages = customer_pages(e[0] for e in events)
+
+    totals = defaultdict(_empty_measures)
+    for cid, day, telesale_id, consultant_id, service_id, legacy_fp, values in events:
+        if day not in days:
+            continue
+        # Khách chưa gắn Fanpage nào -> ghi nhận trọn vẹn cho mã Fanpage cũ (có thể rỗng)
+        codes = pages.get(cid) or [legacy_fp or '']
+        money_share = Decimal(1) / len(codes)
+        for fanpage_code in codes:
+            row = totals[(day, telesale_id, consultant_id, service_id, fanpage_code)]
+            for measure, value in values.items():
+                row[measure] += value * money_share if measure in MONEY_MEASURES else value / len(codes)
+
+    facts = []
+    for (day, telesale_id, consultant_id, service_id, fanpage_code), measures in totals.items():
+        for measure in MONEY_MEASURES:
+            measures[measure] = measures[measure].quantize(CENT, rounding=ROUND_HALF_UP)
+        facts.append(DailyFact(day=day, telesale_id=telesale_id, consultant_id=consultant_id, service_id=service_id,
+                               fanpage_code=fanpage_code, **measures))
+    return facts
+
+
+def rebuild_days(days):
+    """Xoá & dựng lại DailyFact cho các ngày chỉ định. Trả về số ngày đã dựng."""
+    rebuilt = 0
+    for chunk in _contiguous_chunks(d for d in days if d):
+        with transaction.atomic():
+            RollupDay.objects.bulk_create([RollupDay(day=d) for d in chunk], ignore_conflicts=True)
+            # Khoá các ngày đang dựng để 2 tiến trình không cùng ghi 1 ngày (MySQL/Postgres)
+            list(RollupDay.objects.select_for_update().filter(day__in=chunk).values_list('id', flat=True))
+
+            facts = compute_facts(chunk)
+            DailyFact.objects.filter(day__in=chunk).delete()
+            DailyFact.objects.bulk_create(facts, batch_size=1000)
+            RollupDay.objects.filter(day__in=chunk).update(rebuilt_at=timezone.now())
+        rebuilt += len(chunk)
+    return rebuilt
+
+
+def facts_between(start, end):
+    """Queryset DailyFact trong khoảng ngày."""
+    return DailyFact.objects.filter(day__range=[start, end])
+
+
+def pending_days_between(start, end):
+    """Các ngày trong khoảng còn nằm trong hàng đợi - số liệu DailyFact của các ngày này chưa cập nhật."""
+    return list(PendingRollupDay.objects.filter(day__range=[start, end]).order_by('day').values_list('day', flat=True))
+
+
+# --- HÀNG ĐỢI CÁC NGÀY CẦN DỰNG LẠI ---
+
+def queue_days(days):
+    """Đưa các ngày vào hàng đợi dựng lại (ngày đã có trong hàng đợi thì bỏ qua)."""
+    PendingRollupDay.objects.bulk_create([PendingRollupDay(day=d) for d in days if d], ignore_conflicts=True)
+
+
+_dirty_days = OnCommitBatch(queue_days)
+
+
+def mark_days_dirty(days):
+    """
+    Đánh dấu các ngày cần dựng lại. Mọi thay đổi trong cùng 1 transaction được gom và
+    đưa vào hàng đợi 1 lần khi commit (ngoài transaction thì đưa vào ngay).
+    """
+    _dirty_days.add(days)
+
+
+def process_pending_days(limit=QUEUE_BATCH_DAYS):
+    """
+    Worker: lấy tối đa `limit` ngày khỏi hàng đợi và dựng lại. Trả về số ngày đã dựng (0 khi hàng đợi trống).
+    Ngày được xoá khỏi hàng đợi trước khi dựng: thay đổi commit trong lúc đang dựng sẽ đưa ngày vào lại
+    hàng đợi cho lượt sau. Dựng lỗi thì trả các ngày về hàng đợi.
+    """
+    days = list(PendingRollupDay.objects.order_by('day').values_list('day', flat=True)[:limit])
+    if not days:
+        return 0
+    PendingRollupDay.objects.filter(day__in=days).delete()
+    try:
+        return rebuild_days(days)
+    except Exception:
+        queue_days(days)
+        raise
+
+
+def customer_days(customer_ids):
+    """Tất cả các ngày có số liệu gắn với các khách này (lead, cuộc gọi, lịch hẹn, đơn hàng)."""
+    ids = list(customer_ids)
+    days = set()
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[i:i + ID_CHUNK_SIZE]
+        days.update(as_day(v) for v in Customer.objects.filter(id__in=chunk).values_list('created_at', flat=True))
+        days.update(as_day(v) for v in CallLog.objects.filter(customer_id__in=chunk).values_list('call_time', flat=True))
+        for created_at, appt_date in Appointment.objects.filter(customer_id__in=chunk).values_list('created_at', 'appointment_date'):
+            days.update((as_day(created_at), as_day(appt_date)))
+        days.update(Order.objects.filter(customer_id__in=chunk).values_list('order_date', flat=True).distinct())
+    days.discard(None)
+    return days
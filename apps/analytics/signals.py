@@ -0,0 +1,94 @@
+"""
+Giữ bảng DailyFact luôn khớp dữ liệu gốc: mỗi lần ghi/xoá Order, Customer, CallLog, Appointment
+thì đánh dấu các ngày bị ảnh hưởng (cả ngày cũ lẫn ngày mới), đưa vào hàng đợi dựng lại sau khi commit.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from apps.analytics.rollups import as_day, mark_days_dirty, customer_days
+from apps.bookings.models import Appointment
+from apps.customers.models import Customer
+from apps.sales.models import Order
+from apps.telesales.models import CallLog
+
+# Các cột ngày quyết định bản ghi rơi vào ngày rollup nào
+DAY_FIELDS = {
+    Order: ('order_date',),
+    CallLog: ('call_time',),
+    Appointment: ('created_at', 'appointment_date'),
+}
+
+# Thay đổi các cột này của Khách làm đổi chiều Telesale/Fanpage của mọi số liệu gắn với khách
+CUSTOMER_DIM_FIELDS = ('created_at', 'assigned_telesale_id', 'fanpage')
+CUSTOMER_DIM_NAMES = {'created_at', 'assigned_telesale', 'assigned_telesale_id', 'fanpage'}
+
+
+def _stored_days(model, pk):
+    """Các ngày của bản ghi theo giá trị đang lưu trong DB (rỗng nếu chưa có)."""
+    row = model.objects.filter(pk=pk).values_list(*DAY_FIELDS[model]).first()
+    return {as_day(v) for v in row} if row else set()
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=CallLog)
+@receiver(pre_save, sender=Appointment)
+def remember_old_rollup_days(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    # Đổi ngày chốt đơn / ngày hẹn -> ngày cũ cũng phải dựng lại
+    instance._rollup_old_days = _stored_days(sender, instance.pk)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=CallLog)
+@receiver(post_save, sender=Appointment)
+def mark_rollup_days_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Đọc lại từ DB vì giá trị trên instance có thể vẫn là chuỗi từ form
+    days = _stored_days(sender, instance.pk) | getattr(instance, '_rollup_old_days', set())
+    mark_days_dirty(days)
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=CallLog)
+@receiver(post_delete, sender=Appointment)
+def mark_rollup_days_on_delete(sender, instance, **kwargs):
+    mark_days_dirty(as_day(getattr(instance, field)) for field in DAY_FIELDS[sender])
+
+
+@receiver(pre_save, sender=Customer)
+def remember_customer_dims(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._rollup_old_days = set()
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not CUSTOMER_DIM_NAMES & set(update_fields):
+        return
+    old = Customer.objects.filter(pk=instance.pk).values_list(*CUSTOMER_DIM_FIELDS).first()
+    if old and old != tuple(getattr(instance, f) for f in CUSTOMER_DIM_FIELDS):
+        instance._rollup_old_days = customer_days([instance.pk])
+
+
+@receiver(post_save, sender=Customer)
+def mark_rollup_days_on_customer_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    days = getattr(instance, '_rollup_old_days', set())
+    if created or days:
+        days = days | {as_day(v) for v in Customer.objects.filter(pk=instance.pk).values_list('created_at', flat=True)}
+    mark_days_dirty(days)
+
+
+@receiver(post_delete, sender=Customer)
+def mark_rollup_days_on_customer_delete(sender, instance, **kwargs):
+    # Đơn hàng/lịch hẹn/cuộc gọi bị xoá dây chuyền sẽ tự phát post_delete của chính chúng
+    mark_days_dirty([as_day(instance.created_at)])
+
+
+@receiver(m2m_changed, sender=Customer.fanpages.through)
+def mark_rollup_days_on_fanpages_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    customer_ids = pk_set if reverse else [instance.pk]
+    if customer_ids:
+        mark_days_dirty(customer_days(customer_ids))
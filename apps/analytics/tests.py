@@ -0,0 +1,185 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+from django.test import TestCase, Client
+from django.utils import timezone
+
+from apps.analytics.dates import day_bounds, day_range
+from apps.analytics.models import DailyFact, PendingRollupDay, RollupDay
+from apps.analytics.rollups import facts_between, process_pending_days, rebuild_days
+from apps.customers.models import Customer, Fanpage
+from apps.bookings.models import Appointment
+from apps.sales.models import Order, Service
+from apps.service_calendar.models import TreatmentSession
+from apps.telesales.models import CallLog
+
+User = get_user_model()
+
+
+class DailyFactRollupTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.sale = User.objects.create_user(username='sale1', password='x', role='TELESALE')
+        self.service = Service.objects.create(name='Ultherapy', base_price=1000000)
+        self.page_a = Fanpage.objects.create(code='PAGE_A', name='Page A')
+        self.page_b = Fanpage.objects.create(code='PAGE_B', name='Page B')
+
+    def snapshot(self):
+        """Số liệu rollup hiện tại, để so với bản dựng lại từ đầu."""
+        return sorted(DailyFact.objects.values_list(
+            'day', 'telesale_id', 'consultant_id', 'service_id', 'fanpage_code',
+            'leads', 'calls', 'orders', 'paid_orders', 'revenue', 'paid_sales', 'debt',
+        ))
+
+    def test_signals_keep_facts_in_sync_with_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(name='Khách A', phone='0900000001', assigned_telesale=self.sale)
+            customer.fanpages.set([self.page_a, self.page_b])
+            CallLog.objects.create(customer=customer, caller=self.sale, status='BOOKED')
+            Order.objects.create(customer=customer, service=self.service, total_amount=2000000, actual_revenue=1000000)
+        # Request chỉ đưa ngày vào hàng đợi, worker mới dựng lại
+        self.assertEqual(list(PendingRollupDay.objects.values_list('day', flat=True)), [self.today])
+        self.assertFalse(DailyFact.objects.exists())
+        self.assertEqual(process_pending_days(), 1)
+        self.assertFalse(PendingRollupDay.objects.exists())
+
+        facts = facts_between(self.today, self.today)
+        page_a_revenue = facts.filter(fanpage_code='PAGE_A').aggregate(s=Sum('revenue'))['s']
+        self.assertIsInstance(page_a_revenue, Decimal)
+        self.assertEqual(page_a_revenue, Decimal('500000.00'))
+        self.assertEqual(facts.aggregate(s=Sum('leads'))['s'], 1)
+        self.assertEqual(facts.aggregate(s=Sum('debt'))['s'], 1000000)
+
+        # Đổi ngày chốt đơn: ngày cũ phải được trừ, ngày mới được cộng
+        yesterday = self.today - timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.get()
+            order.order_date = yesterday
+            order.actual_revenue = 2000000
+            order.save()
+        process_pending_days()
+        self.assertEqual(facts_between(self.today, self.today).aggregate(s=Sum('orders'))['s'], 0)
+        self.assertEqual(facts_between(yesterday, yesterday).aggregate(s=Sum('paid_sales'))['s'], 2000000)
+
+        # Đổi Telesale phụ trách: mọi ngày có số liệu của khách đều được gán lại
+        other = User.objects.create_user(username='sale2', password='x', role='TELESALE')
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.assigned_telesale = other
+            customer.save()
+        process_pending_days()
+        self.assertFalse(DailyFact.objects.filter(telesale=self.sale, orders__gt=0).exists())
+
+        incremental = self.snapshot()
+        rebuild_days(RollupDay.objects.values_list('day', flat=True))
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_rolled_back_changes_do_not_leak_into_next_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Customer.objects.create(name='Khách B', phone='0900000002')
+                    raise ValueError
+            except ValueError:
+                pass
+            Customer.objects.create(name='Khách C', phone='0900000003')
+        process_pending_days()
+        self.assertEqual(DailyFact.objects.aggregate(s=Sum('leads'))['s'], 1)
+
+    def test_failed_rebuild_keeps_days_queued(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name='Khách E', phone='0900000005')
+        with mock.patch('apps.analytics.rollups.compute_facts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                process_pending_days()
+        self.assertTrue(PendingRollupDay.objects.filter(day=self.today).exists())
+
+    def test_dashboards_render_from_rollups(self):
+        admin = User.objects.create_user(username='admin1', password='x', role='ADMIN')
+        client = Client()
+        client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(customer=Customer.objects.create(name='Khách D', phone='0900000004'),
+                                 service=self.service, total_amount=3000000, actual_revenue=3000000)
+        # Ngày còn trong hàng đợi -> Dashboard báo số liệu chưa cập nhật
+        self.assertEqual(client.get('/dashboard/').context['rollup_pending'], [self.today])
+        process_pending_days()
+
+        built = RollupDay.objects.count()
+        resp = client.get('/dashboard/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['revenue_current'], 3000000)
+        # Dashboard chỉ đọc: các ngày chưa dựng của kỳ so sánh không được dựng trong request
+        self.assertEqual(RollupDay.objects.count(), built)
+
+        resp = client.get('/marketing/report/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['total_revenue'], 3000000)
+        self.assertEqual(resp.context['rollup_pending'], [])
+
+    def test_migration_queues_history_for_worker(self):
+        customer = Customer.objects.create(name='Khách cũ', phone='0900000005')
+        Customer.objects.filter(pk=customer.pk).update(created_at=timezone.now() - timedelta(days=3))
+        PendingRollupDay.objects.all().delete()
+
+        migration = import_module('apps.analytics.migrations.0004_queue_rollup_history')
+        migration.queue_history(django_apps, None)
+        days = list(PendingRollupDay.objects.order_by('day').values_list('day', flat=True))
+        self.assertEqual(days, [self.today - timedelta(days=i) for i in (3, 2, 1, 0)])
+        self.assertEqual(process_pending_days(), 4)
+        self.assertEqual(facts_between(days[0], days[0]).aggregate(s=Sum('leads'))['s'], 1)
+
+
+class DateRangeTests(TestCase):
+    def test_bounds_are_local_half_open_days(self):
+        start, end = day_bounds('2026-03-01', date(2026, 3, 31))
+        self.assertEqual(timezone.localtime(start).replace(tzinfo=None), datetime(2026, 3, 1))
+        self.assertEqual(timezone.localtime(end).replace(tzinfo=None), datetime(2026, 4, 1))
+        self.assertEqual(day_bounds('2026-03-05'), day_bounds(date(2026, 3, 5), '2026-03-05'))
+
+        # 23:59:59.5 ngày cuối vẫn nằm trong khoảng, 00:00 ngày sau thì không
+        last = timezone.make_aware(datetime.combine(date(2026, 3, 31), time(23, 59, 59, 500000)))
+        Customer.objects.create(name='Khách A', phone='0900000001', created_at=last)
+        Customer.objects.create(name='Khách B', phone='0900000002', created_at=end)
+        self.assertEqual(Customer.objects.filter(day_range('created_at', '2026-03-01', '2026-03-31')).count(), 1)
+        # Cận rỗng bị bỏ qua; cận sai định dạng báo lỗi (không thành truy vấn không giới hạn)
+        self.assertEqual(Customer.objects.filter(day_range('created_at', '', '2026-03-31')).count(), 1)
+        for start, end in [('2026-02-31', '2026-03-31'), ('2026-03-01', 'abc')]:
+            with self.assertRaises(ValueError):
+                day_range('created_at', start, end)
+            with self.assertRaises(ValueError):
+                day_bounds(start, end)
+        with self.assertRaises(ValueError):
+            day_bounds(None)
+
+    def test_report_with_invalid_date_falls_back_to_default_range(self):
+        client = Client()
+        client.force_login(get_user_model().objects.create_user(username='admin', password='x', role='ADMIN'))
+        resp = client.get('/telesale/report/', {'date_start': '2026-02-31', 'date_end': '2026-03-31'})
+        self.assertEqual(resp.status_code, 200)
+        today = timezone.localdate()
+        self.assertEqual((resp.context['date_start'], resp.context['date_end']), (str(today.replace(day=1)), str(today)))
+        self.assertIn('Ngày không hợp lệ: 2026-02-31', [str(m) for m in resp.context['messages']][0])
+
+    def test_date_filters_use_indexes(self):
+        today = timezone.localdate()
+        cases = [
+            (Customer.objects, 'created_at', 'customers_created_idx'),
+            (CallLog.objects, 'call_time', 'telesales_log_time_idx'),
+            (TreatmentSession.objects, 'session_date', 'service_cal_session_date_idx'),
+            (Appointment.objects, 'appointment_date', 'bookings_appt_date_idx'),
+            (Appointment.objects, 'created_at', 'bookings_appt_created_idx'),
+        ]
+        for manager, field, index in cases:
+            with self.subTest(field=field):
+                plan = manager.filter(day_range(field, today - timedelta(days=30), today)).explain()
+                self.assertIn(index, plan)
+
+        # Lookup __date bọc DATE() quanh cột -> không dùng được index (lý do có day_range)
+        plan = Customer.objects.filter(created_at__date__range=[today, today]).explain()
+        self.assertNotIn('customers_created_idx', plan)
@@ -0,0 +1,128 @@
+"""
+Dữ liệu lịch hẹn cho FullCalendar (get_appointments_api).
+
+[TỐI ƯU]
+- Khoảng [start, end) là datetime có múi giờ -> lọc thẳng trên bookings_appt_date_idx.
+- Chỉ đọc các cột cần hiển thị bằng .values(), không dựng model / get_status_display() từng dòng.
+- `feed_version()` = (số lịch hẹn, lần sửa gần nhất): dùng làm ETag / Last-Modified, trình duyệt
+  hỏi lại mà không có gì thay đổi thì trả 304.
+- Sự kiện được cache theo tuần (thứ Hai - Chủ nhật, giờ địa phương) trong process, khoá theo phiên bản:
+  chuyển qua lại tháng / tuần không truy vấn lại, có thay đổi thì phiên bản mới tự bỏ cache cũ.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from apps.analytics.dates import day_start
+from .models import Appointment
+
+# Số tuần giữ trong cache (mỗi process) - đủ cho vài tháng qua lại
+WEEK_CACHE_SIZE = 64
+
+STATUS_COLORS = {
+    'SCHEDULED': '#0d6efd',
+    'ARRIVED': '#ffc107',
+    'IN_CONSULTATION': '#17a2b8',
+    'COMPLETED': '#198754',
+    'CANCELLED': '#dc3545',
+    'NO_SHOW': '#dc3545',
+}
+DEFAULT_COLOR = '#6c757d'
+
+FIELDS = (
+    'id', 'appointment_date', 'status', 'customer__name', 'customer__phone',
+    'customer__customer_code', 'assigned_doctor__last_name',
+)
+
+FeedVersion = namedtuple('FeedVersion', 'count last_modified')
+
+_weeks = OrderedDict()
+_weeks_lock = threading.Lock()
+
+
+def feed_version():
+    """1 truy vấn: thêm / sửa / xoá lịch hẹn đều làm đổi phiên bản."""
+    info = Appointment.objects.aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    return FeedVersion(info['count'], info['last_modified'])
+
+
+def feed_etag(version, start, end):
+    stamp = version.last_modified.timestamp() if version.last_modified else 0
+    key = f"{version.count}-{stamp}-{start.isoformat()}-{end.isoformat()}"
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+def _week_start(moment):
+    day = timezone.localtime(moment).date()
+    return day - timedelta(days=day.weekday())
+
+
+def _to_event(row, status_labels):
+    color = STATUS_COLORS.get(row['status'], DEFAULT_COLOR)
+    return {
+        'id': row['id'],
+        'title': row['customer__name'],
+        'start': row['appointment_date'].isoformat(),
+        'backgroundColor': color,
+        'borderColor': color,
+        'extendedProps': {
+            'customerName': row['customer__name'],
+            'phone': row['customer__phone'],
+            'status': status_labels.get(row['status'], row['status']),
+            'statusCode': row['status'],
+            'customerCode': row['customer__customer_code'] or '',
+            'doctor': row['assigned_doctor__last_name'] if row['assigned_doctor__last_name'] is not None else "Chưa gán",
+        },
+    }
+
+
+def _load_weeks(weeks):
+    """{thứ Hai: [sự kiện]} cho các tuần chỉ định - 1 truy vấn cho cả khoảng."""
+    status_labels = dict(Appointment.Status.choices)
+    loaded = {week: [] for week in weeks}
+    rows = Appointment.objects.filter(
+        appointment_date__gte=day_start(min(weeks)),
+        appointment_date__lt=day_start(max(weeks) + timedelta(days=7)),
+    ).order_by('appointment_date', 'id').values(*FIELDS)
+    for row in rows:
+        week = _week_start(row['appointment_date'])
+        if week in loaded:
+            loaded[week].append((row['appointment_date'], _to_event(row, status_labels)))
+    return loaded
+
+
+def events_between(start, end, version):
+    """Sự kiện có giờ hẹn trong [start, end), lấy từ cache tuần (tuần thiếu được đọc chung 1 lần)."""
+    weeks = []
+    week = _week_start(start)
+    while day_start(week) < end:
+        weeks.append(week)
+        week += timedelta(days=7)
+    if not weeks:
+        return []
+
+    with _weeks_lock:
+        cached = {w: _weeks[(version, w)] for w in weeks if (version, w) in _weeks}
+        for w in cached:
+            _weeks.move_to_end((version, w))
+    missing = [w for w in weeks if w not in cached]
+    if missing:
+        loaded = _load_weeks(missing)
+        with _weeks_lock:
+            for w, events in loaded.items():
+                _weeks[(version, w)] = events
+            while len(_weeks) > WEEK_CACHE_SIZE:
+                _weeks.popitem(last=False)
+        cached.update(loaded)
+
+    return [event for w in weeks for moment, event in cached[w] if start <= moment < end]
+
+
+def clear_cache():
+    with _weeks_lock:
+        _weeks.clear()
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_appointment_updated_at'),
+        ('customers', '0020_customer_customers_created_idx'),
+        ('sales', '0011_order_amount_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['created_at'], name='bookings_appt_created_idx'),
+        ),
+    ]
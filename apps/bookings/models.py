@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from apps.customers.models import Customer
 
 class Appointment(models.Model):
@@ -33,6 +36,8 @@ class Appointment(models.Model):
     note = models.TextField(blank=True, verbose_name="Ghi chú")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # [MỚI] Phiên bản dữ liệu lịch (ETag / cache tuần của get_appointments_api)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Lịch hẹn: {self.customer.name} - {self.appointment_date.strftime('%d/%m/%Y %H:%M')}"
@@ -42,4 +47,13 @@ class Appointment(models.Model):
         verbose_name_plural = "Quản lý Lịch hẹn"
         indexes = [
             models.Index(fields=['appointment_date'], name='bookings_appt_date_idx'),
-        ]
\ No newline at end of file
+            models.Index(fields=['created_at'], name='bookings_appt_created_idx'),
+        ]
+
+
+# Lịch hiển thị tên / SĐT / mã khách -> khách đổi thông tin thì lịch hẹn của khách cũng đổi phiên bản
+@receiver(post_save, sender=Customer)
+def touch_customer_appointments(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and not {'name', 'phone', 'customer_code'} & set(update_fields)):
+        return
+    Appointment.objects.filter(customer_id=instance.pk).update(updated_at=timezone.now())
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.bookings.calendar_feed import clear_cache
+from apps.bookings.models import Appointment
+from apps.customers.models import Customer
+
+User = get_user_model()
+
+URL = '/api/calendar/appointments/'
+# Tuần 09/03 - 15/03/2026, giờ Việt Nam (như FullCalendar gửi lên)
+WEEK = {'start': '2026-03-09T00:00:00+07:00', 'end': '2026-03-16T00:00:00+07:00'}
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(User.objects.create_user(username='reception', password='x', role='RECEPTIONIST'))
+        self.customer = Customer.objects.create(name='Nguyễn Văn A', phone='0912345678', source='FACEBOOK')
+        self.early = Appointment.objects.create(customer=self.customer, appointment_date=local(2026, 3, 9, 0, 30))
+        Appointment.objects.create(customer=self.customer, appointment_date=local(2026, 3, 16, 0, 30))  # tuần sau
+
+    def test_local_bounds_etag_and_week_cache(self):
+        # Lịch 00:30 sáng thứ Hai (giờ VN) là 17:30 Chủ nhật theo UTC - vẫn thuộc tuần này
+        response = self.client.get(URL, WEEK)
+        events = response.json()
+        self.assertEqual([e['id'] for e in events], [self.early.pk])
+        self.assertEqual(events[0]['extendedProps']['status'], 'Đã đặt lịch')
+        self.assertEqual(events[0]['extendedProps']['doctor'], 'Chưa gán')
+
+        # Không đổi gì -> 304; đổi chế độ xem về tuần đã cache -> chỉ còn truy vấn phiên bản
+        with self.assertNumQueries(3):  # session + user + phiên bản
+            self.assertEqual(self.client.get(URL, WEEK, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with self.assertNumQueries(3):
+            day = self.client.get(URL, {'start': '2026-03-09T00:00:00+07:00', 'end': '2026-03-10T00:00:00+07:00'})
+        self.assertEqual(len(day.json()), 1)
+
+        # Đổi tên khách -> phiên bản mới, cache cũ không còn dùng
+        self.customer.name = 'Nguyễn Văn B'
+        self.customer.save()
+        response = self.client.get(URL, WEEK, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['title'], 'Nguyễn Văn B')
+
+    def test_delete_changes_version(self):
+        response = self.client.get(URL, WEEK)
+        self.early.delete()
+        response = self.client.get(URL, WEEK, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.json(), [])
+
+    def test_bounds_use_shared_parser(self):
+        # Chỉ có ngày -> 00:00 giờ địa phương; '+' của offset bị gửi thô thành khoảng trắng vẫn đọc đúng
+        by_day = self.client.get(URL, {'start': '2026-03-09', 'end': '2026-03-10'})
+        self.assertEqual([e['id'] for e in by_day.json()], [self.early.pk])
+        raw = self.client.get(URL + '?start=2026-03-09T00:00:00+07:00&end=2026-03-10T00:00:00+07:00')
+        self.assertEqual([e['id'] for e in raw.json()], [self.early.pk])
+        self.assertEqual(self.client.get(URL, {'start': '2026-02-31', 'end': '2026-03-10'}).status_code, 400)
+        self.assertEqual(self.client.get(URL, {'start': '2026-03-09T25:00:00', 'end': '2026-03-10'}).status_code, 400)
@@ -1,17 +1,25 @@
+from itertools import zip_longest
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.utils.dateparse import parse_date
+from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 
 from apps.bookings.models import Appointment
+from apps.bookings.calendar_feed import events_between, feed_etag, feed_version
 from apps.customers.models import Customer
-from apps.sales.models import Order, Service
+from apps.sales.models import Service
+from apps.sales.checkout import CheckoutItem, checkout
 from apps.telesales.models import CallLog
 from apps.authentication.decorators import allowed_users
+from apps.analytics.dates import day_range, parse_moment
 
 User = get_user_model()
 
@@ -28,7 +36,7 @@ def reception_dashboard(request):
         current_date = today
     
     appointments = Appointment.objects.filter(
-        appointment_date__date=current_date
+        day_range('appointment_date', current_date)
     ).select_related('customer').order_by('status', 'appointment_date')
 
     birthdays_today = Customer.objects.filter(dob__day=today.day, dob__month=today.month)
@@ -62,40 +70,30 @@ def reception_dashboard(request):
 
 @login_required(login_url='/auth/login/')
 def get_appointments_api(request):
-    start_date = request.GET.get('start')
-    end_date = request.GET.get('end')
-    
-    events = []
-    if start_date and end_date:
-        appointments = Appointment.objects.filter(
-            appointment_date__range=[start_date[:10], end_date[:10]]
-        ).select_related('customer', 'assigned_doctor')
+    # [TỐI ƯU] Khoảng giờ có múi giờ + cache theo tuần + ETag (apps.bookings.calendar_feed)
+    try:
+        # dấu + của offset (+07:00) bị đổi thành khoảng trắng khi không được mã hoá trong query string
+        start = parse_moment(request.GET.get('start', '').strip().replace(' ', '+'))
+        end = parse_moment(request.GET.get('end', '').strip().replace(' ', '+'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not (start and end):
+        return JsonResponse([], safe=False)
 
-        for app in appointments:
-            color = '#6c757d'
-            if app.status == 'SCHEDULED': color = '#0d6efd'
-            elif app.status == 'ARRIVED': color = '#ffc107'
-            elif app.status == 'IN_CONSULTATION': color = '#17a2b8'
-            elif app.status == 'COMPLETED': color = '#198754'
-            elif app.status in ['CANCELLED', 'NO_SHOW']: color = '#dc3545'
-            
-            events.append({
-                'id': app.id,
-                'title': f"{app.customer.name}",
-                'start': app.appointment_date.isoformat(),
-                'backgroundColor': color,
-                'borderColor': color,
-                'extendedProps': {
-                    'customerName': app.customer.name,
-                    'phone': app.customer.phone,
-                    'status': app.get_status_display(),
-                    'statusCode': app.status,
-                    'customerCode': app.customer.customer_code or '', 
-                    'doctor': app.assigned_doctor.last_name if app.assigned_doctor else "Chưa gán"
-                }
-            })
-            
-    return JsonResponse(events, safe=False)
+    version = feed_version()
+    etag = feed_etag(version, start, end)
+    last_modified = version.last_modified.timestamp() if version.last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    response = JsonResponse(events_between(start, end, version), safe=False)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Trình duyệt luôn hỏi lại (có If-None-Match) - không đổi thì chỉ nhận 304
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required(login_url='/auth/login/')
 # [CẬP NHẬT] Thêm quyền MARKETING
@@ -204,60 +202,40 @@ def finish_appointment(request):
             if technician_id: appt.assigned_technician_id = technician_id
             if consultant_id: appt.assigned_consultant_id = consultant_id
             
-            appt.status = 'COMPLETED'
-            appt.save()
+            with transaction.atomic():
+                appt.status = 'COMPLETED'
+                appt.save()
 
-            if result_status == 'buy':
-                service_ids = request.POST.getlist('service_ids')
-                prices = request.POST.getlist('original_prices')
-                discounts = request.POST.getlist('discounts')
-                finals = request.POST.getlist('final_amounts')
-                paids = request.POST.getlist('paid_amounts')
-                
-                total_revenue_now = 0
-                total_value = 0
-                service_names = []
+                if result_status == 'buy':
+                    # [TỐI ƯU] Chốt combo qua apps.sales.checkout: số truy vấn không tăng theo số dịch vụ
+                    items = [
+                        CheckoutItem(service_id=s_id, original_price=price, total_amount=final, paid_amount=paid)
+                        for s_id, price, final, paid in zip_longest(
+                            request.POST.getlist('service_ids'),
+                            request.POST.getlist('original_prices'),
+                            request.POST.getlist('final_amounts'),
+                            request.POST.getlist('paid_amounts'),
+                        )
+                    ]
+                    orders = checkout(appt, items, consultant_id=consultant_id, note=f"Chốt đơn ngày {timezone.localdate()}")
 
-                for i in range(len(service_ids)):
-                    if not service_ids[i]: continue
-                    
-                    s_id = service_ids[i]
-                    price = float(prices[i] if prices[i] else 0)
-                    final = float(finals[i] if finals[i] else 0)
-                    paid_now = float(paids[i] if paids[i] else 0)
-                    
-                    total_revenue_now += paid_now
-                    total_value += final
-                    
-                    service_obj = Service.objects.get(id=s_id)
-                    service_names.append(service_obj.name)
+                    total_revenue_now = sum(order.actual_revenue for order in orders)
+                    total_value = sum(order.total_amount for order in orders)
+                    list_sv_str = ", ".join(order.service.name for order in orders)
+                    debt_status = f" (Nợ: {total_value - total_revenue_now:,.0f})" if total_value > total_revenue_now else ""
 
-                    Order.objects.create(
-                        customer=appt.customer,
-                        appointment=appt,
-                        assigned_consultant_id=consultant_id,
-                        service=service_obj,
-                        original_price=price, 
-                        actual_revenue=paid_now,
-                        total_amount=final,
-                        note=f"Chốt đơn ngày {timezone.now().date()}"
+                    CallLog.objects.create(
+                        customer=appt.customer, caller=request.user, status='BOOKED',
+                        note=f"Đã mua combo: {list_sv_str}. Tổng trị giá: {total_value:,.0f}. Thực thu: {total_revenue_now:,.0f}{debt_status}"
                     )
-                
-                list_sv_str = ", ".join(service_names)
-                debt_status = f" (Nợ: {total_value - total_revenue_now:,.0f})" if total_value > total_revenue_now else ""
-                
-                CallLog.objects.create(
-                    customer=appt.customer, caller=request.user, status='BOOKED',
-                    note=f"Đã mua combo: {list_sv_str}. Tổng trị giá: {total_value:,.0f}. Thực thu: {total_revenue_now:,.0f}{debt_status}"
-                )
-                messages.success(request, f"✅ Đã chốt {len(service_names)} dịch vụ. Thực thu: {total_revenue_now:,.0f} VND")
-            else:
-                reason = request.POST.get('rejection_reason') or "Không mua"
-                CallLog.objects.create(
-                    customer=appt.customer, caller=request.user, status='NOT_INTERESTED',
-                    note=f"TỪ CHỐI TẠI QUẦY: {reason}"
-                )
-                messages.warning(request, "Đã ghi nhận kết quả: Khách từ chối dịch vụ.")
+                    messages.success(request, f"✅ Đã chốt {len(orders)} dịch vụ. Thực thu: {total_revenue_now:,.0f} VND")
+                else:
+                    reason = request.POST.get('rejection_reason') or "Không mua"
+                    CallLog.objects.create(
+                        customer=appt.customer, caller=request.user, status='NOT_INTERESTED',
+                        note=f"TỪ CHỐI TẠI QUẦY: {reason}"
+                    )
+                    messages.warning(request, "Đã ghi nhận kết quả: Khách từ chối dịch vụ.")
 
         except Exception as e:
             messages.error(request, f"Lỗi xử lý: {str(e)}")
@@ -0,0 +1,178 @@
+"""
+Xử lý ảnh đính kèm của Chat ngoài request.
+
+send_message chỉ kiểm tra nhanh phần header của ảnh, lưu ngay tin nhắn (nội dung + file gốc, trạng thái
+PENDING) rồi đẩy việc giải mã / thu nhỏ / nén sang thread pool. Xử lý xong: file gốc được thay bằng ảnh đã nén
++ thumbnail; lỗi: tin chuyển sang FAILED (vẫn giữ nội dung) để cả phòng thấy ảnh không gửi được.
+Tiến trình bị tắt khi ảnh đang chờ -> lệnh `process_chat_attachments` xử lý nốt các tin còn PENDING.
+"""
+import io
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+FULL_WIDTH = 1024
+THUMB_SIZE = (240, 240)
+JPEG_QUALITY = 60
+# Tin PENDING lâu hơn chừng này (giây) coi như worker trong tiến trình web đã mất việc
+STALE_SECONDS = 120
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def validate_image(uploaded_file):
+    """Chỉ đọc header (không giải mã pixel). Trả về thông báo lỗi hoặc None nếu hợp lệ."""
+    try:
+        with Image.open(uploaded_file) as img:
+            # Chống đổi đuôi file exe/php thành jpg
+            if img.format not in ALLOWED_FORMATS:
+                return "Định dạng file không hỗ trợ (Chỉ nhận JPG, PNG, WEBP)"
+            if img.width * img.height > Image.MAX_IMAGE_PIXELS:
+                return "Ảnh quá lớn"
+    except Exception as e:
+        return str(e)
+    finally:
+        uploaded_file.seek(0)
+    return None
+
+
+def _encode_jpeg(img):
+    output_io = io.BytesIO()
+    # Không truyền exif/icc_profile -> file mới không mang metadata của ảnh gốc
+    img.save(output_io, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return output_io.getvalue()
+
+
+def render_image(data):
+    """
+    Giải mã ảnh gốc (bytes) -> (bytes ảnh rộng tối đa FULL_WIDTH, bytes thumbnail), đều là JPEG không metadata.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format not in ALLOWED_FORMATS:
+            raise ValueError("Định dạng file không hỗ trợ")
+        # JPEG: giải mã thẳng ở tỉ lệ 1/2, 1/4, 1/8 (gần nhất >= kích thước cần) thay vì full 12MP
+        if img.width > FULL_WIDTH:
+            img.draft('RGB', (FULL_WIDTH, img.height * FULL_WIDTH // img.width))
+        # Xoay theo EXIF trước khi bỏ EXIF, để ảnh chụp dọc không bị nằm ngang
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.info.clear()
+
+        # thumbnail() giữ tỉ lệ và thu nhỏ theo nhiều bước (reducing_gap) nhanh hơn resize LANCZOS 1 lần
+        img.thumbnail((FULL_WIDTH, img.height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        full = _encode_jpeg(img)
+
+        img.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        thumb = _encode_jpeg(img)
+    return full, thumb
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CHAT_IMAGE_WORKERS', 2), thread_name_prefix='chat-image'
+                )
+    return _executor
+
+
+def process_image_message(message_id):
+    """
+    Thu nhỏ / nén file gốc của 1 tin PENDING rồi ghi kết quả. Trả về trạng thái mới,
+    None nếu tin không còn chờ xử lý (đã xoá hoặc worker khác làm xong trước).
+    """
+    from apps.chat.models import Message
+
+    message = Message.objects.filter(id=message_id, attachment_status=Message.AttachmentStatus.PENDING).first()
+    if message is None:
+        return None
+    original = message.attachment.name
+    storage = message.attachment.storage
+    try:
+        with message.attachment.open('rb') as f:
+            full, thumb = render_image(f.read())
+    except Exception:
+        logger.exception("Lỗi xử lý ảnh chat (message=%s)", message_id)
+        values = {'attachment': '', 'thumbnail': '', 'attachment_status': Message.AttachmentStatus.FAILED}
+    else:
+        name = uuid.uuid4()
+        message.attachment.save(f"{name}.jpg", ContentFile(full), save=False)
+        message.thumbnail.save(f"{name}_thumb.jpg", ContentFile(thumb), save=False)
+        values = {
+            'attachment': message.attachment.name, 'thumbnail': message.thumbnail.name,
+            'attachment_status': Message.AttachmentStatus.READY,
+        }
+
+    # UPDATE có điều kiện: worker trong tiến trình web và lệnh xử lý tồn đọng không ghi đè lẫn nhau
+    if not Message.objects.filter(id=message_id, attachment_status=Message.AttachmentStatus.PENDING).update(**values):
+        for name in (values['attachment'], values['thumbnail']):
+            if name:
+                storage.delete(name)
+        return None
+    # File gốc còn metadata (EXIF, GPS...) -> không giữ lại
+    if original:
+        storage.delete(original)
+    return values['attachment_status']
+
+
+def process_stale_images(older_than=STALE_SECONDS, limit=100):
+    """Xử lý các tin còn PENDING quá `older_than` giây (tiến trình web đã tắt giữa chừng). Trả về số tin."""
+    from apps.chat.models import Message
+
+    ids = list(Message.objects.filter(
+        attachment_status=Message.AttachmentStatus.PENDING,
+        timestamp__lt=timezone.now() - timedelta(seconds=older_than),
+    ).order_by('timestamp').values_list('id', flat=True)[:limit])
+    for message_id in ids:
+        process_image_message(message_id)
+    return len(ids)
+
+
+def _run_in_worker(message_id):
+    # Thread của pool không đi qua request_started/finished -> tự dọn kết nối DB
+    close_old_connections()
+    try:
+        return process_image_message(message_id)
+    except Exception:
+        logger.exception("Lỗi lưu ảnh chat (message=%s)", message_id)
+    finally:
+        close_old_connections()
+
+
+def submit_image_message(room, sender, content, parent, uploaded_file):
+    """
+    Lưu tin nhắn kèm file gốc (đã giới hạn 10MB) ở trạng thái PENDING rồi giao cho worker pool sau khi commit.
+    CHAT_IMAGE_WORKERS = 0 -> xử lý ngay trong request (môi trường dev/test).
+    """
+    from apps.chat.models import Message
+
+    message = Message(
+        room=room, sender=sender, content=content, parent=parent,
+        attachment_status=Message.AttachmentStatus.PENDING,
+    )
+    # Tên ngẫu nhiên, không phải đuôi ảnh: file gốc không hiển thị cho client trước khi được xử lý
+    message.attachment.save(f"{uuid.uuid4()}.upload", uploaded_file, save=False)
+    message.save()
+
+    if getattr(settings, 'CHAT_IMAGE_WORKERS', 2) == 0:
+        process_image_message(message.id)
+        message.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, message.id))
+    return message
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.chat.attachments import STALE_SECONDS, process_stale_images
+
+
+class Command(BaseCommand):
+    help = 'Xử lý nốt ảnh chat còn chờ (PENDING) khi tiến trình web bị tắt giữa chừng (chạy qua cron hoặc --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=STALE_SECONDS, help='Chỉ lấy tin chờ lâu hơn số giây này')
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục như 1 worker')
+        parser.add_argument('--sleep', type=int, default=30, help='Số giây nghỉ khi không còn ảnh tồn đọng (chế độ --loop)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Bắt đầu xử lý ảnh chat tồn đọng..."))
+        total = 0
+
+        while True:
+            done = process_stale_images(options['older_than'])
+            total += done
+            if done:
+                self.stdout.write(f"--- Đã xử lý {done} ảnh")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã xử lý {total} ảnh! ==="))
@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    Room = apps.get_model('chat', 'Room')
+    Message = apps.get_model('chat', 'Message')
+    RoomMember = apps.get_model('chat', 'RoomMember')
+
+    latest = Message.objects.filter(room_id=models.OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+    Room.objects.update(last_message=models.Subquery(latest))
+    # Dữ liệu cũ chưa có con trỏ đọc -> coi như đã đọc hết, tránh hiện hàng loạt tin "chưa đọc" giả
+    latest_id = Message.objects.filter(room_id=models.OuterRef('room_id')).order_by('-id').values('id')[:1]
+    RoomMember.objects.update(last_read_message_id=models.functions.Coalesce(models.Subquery(latest_id), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_room_time_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Bảng chat_room_members đã tồn tại (bảng tự sinh của M2M) -> chỉ khai báo model trong state
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RoomMember',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.room')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_room_members',
+                        'unique_together': {('room', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='room',
+                    name='members',
+                    field=models.ManyToManyField(related_name='chat_rooms', through='chat.RoomMember', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='roommember',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
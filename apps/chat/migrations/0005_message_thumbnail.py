@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_roommember_room_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='thumbnail',
+            field=models.FileField(blank=True, null=True, upload_to='chat_attachments/thumbs/%Y/%m/'),
+        ),
+    ]
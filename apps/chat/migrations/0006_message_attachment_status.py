@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_thumbnail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='attachment_status',
+            field=models.CharField(blank=True, choices=[('', 'Không có / đã xử lý'), ('PENDING', 'Đang xử lý ảnh'), ('FAILED', 'Lỗi xử lý ảnh')], default='', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['attachment_status', 'timestamp'], name='chat_msg_attach_status_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 import os
 
 class Room(models.Model):
@@ -11,21 +13,43 @@ class Room(models.Model):
     name = models.CharField(max_length=255, blank=True, null=True, verbose_name="Tên nhóm")
     type = models.CharField(max_length=10, choices=ROOM_TYPES, default='DIRECT')
     
-    members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chat_rooms')
+    # [TỐI ƯU] Bảng trung gian RoomMember (vẫn là bảng chat_room_members cũ) lưu con trỏ "đã đọc tới đâu"
+    members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chat_rooms', through='RoomMember')
     admins = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chat_admin_rooms', verbose_name="Trưởng nhóm")
     
     updated_at = models.DateTimeField(auto_now=True)
+    # [TỐI ƯU] Tin nhắn cuối (cập nhật khi có tin mới) -> danh sách phòng không phải truy vấn từng phòng
+    last_message = models.ForeignKey('Message', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
 
     def __str__(self):
         return self.name if self.name else f"Room {self.id}"
 
+class RoomMember(models.Model):
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_memberships')
+    # ID tin nhắn lớn nhất user đã xem trong phòng; số tin chưa đọc = tin của người khác có id lớn hơn
+    last_read_message_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'chat_room_members'
+        unique_together = [('room', 'user')]
+
 class Message(models.Model):
+    class AttachmentStatus(models.TextChoices):
+        READY = '', 'Không có / đã xử lý'
+        PENDING = 'PENDING', 'Đang xử lý ảnh'
+        FAILED = 'FAILED', 'Lỗi xử lý ảnh'
+
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField(blank=True, null=True) # Cho phép rỗng nếu chỉ gửi ảnh
     
     # [MỚI] Trường lưu file/ảnh
     attachment = models.FileField(upload_to='chat_attachments/%Y/%m/', blank=True, null=True)
+    # [MỚI] Ảnh thu nhỏ để hiển thị trong khung chat (ảnh 1024px chỉ tải khi bấm xem)
+    thumbnail = models.FileField(upload_to='chat_attachments/thumbs/%Y/%m/', blank=True, null=True)
+    # [MỚI] Tin kèm ảnh được lưu ngay (nội dung + file gốc, PENDING); worker thay file gốc bằng ảnh đã nén
+    attachment_status = models.CharField(max_length=10, choices=AttachmentStatus.choices, blank=True, default=AttachmentStatus.READY)
     
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
@@ -37,6 +61,32 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Phân trang keyset theo (timestamp, id) trong từng phòng
+            models.Index(fields=['room', 'timestamp', 'id'], name='chat_msg_room_time_idx'),
+            # Lệnh process_chat_attachments tìm các ảnh còn chờ xử lý
+            models.Index(fields=['attachment_status', 'timestamp'], name='chat_msg_attach_status_idx'),
+        ]
+
+@receiver(post_save, sender=Message)
+def notify_new_message(sender, instance, created, **kwargs):
+    """[MỚI] Đánh thức các request long-poll đang chờ phòng này (sau khi transaction commit)."""
+    if not created:
+        return
+    Room.objects.filter(id=instance.room_id).update(last_message=instance, updated_at=instance.timestamp)
+    # Người gửi hiển nhiên đã "đọc" tới tin của mình
+    RoomMember.objects.filter(
+        room_id=instance.room_id, user_id=instance.sender_id, last_read_message_id__lt=instance.id
+    ).update(last_read_message_id=instance.id)
+    from apps.chat.notifier import get_notifier
+    room_id, message_id = instance.room_id, instance.id
+    transaction.on_commit(lambda: get_notifier().publish(room_id, message_id))
+
+@receiver(post_delete, sender=Message)
+def refresh_room_last_message(sender, instance, **kwargs):
+    """Xoá tin cuối -> trỏ lại tin mới nhất còn lại của phòng."""
+    latest = Message.objects.filter(room_id=instance.room_id).order_by('-timestamp', '-id').values('id')[:1]
+    Room.objects.filter(id=instance.room_id, last_message__isnull=True).update(last_message=models.Subquery(latest))
 
 # --- BẢNG THÔNG BÁO (GIỮ NGUYÊN) ---
 class Announcement(models.Model):
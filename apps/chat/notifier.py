@@ -0,0 +1,142 @@
+"""
+Kênh báo "có tin nhắn mới" cho long-poll của Chat (`wait_for_messages`).
+
+- DatabaseNotifier (mặc định): như InProcessNotifier + 1 thread dò DB dùng chung cho cả tiến trình:
+  mỗi CHAT_DB_NOTIFIER_INTERVAL giây đúng 1 truy vấn "phòng nào có tin id > id đã thấy", rồi đánh thức
+  các request đang chờ phòng đó. Số truy vấn không tăng theo số tab đang mở; đúng khi chạy nhiều
+  tiến trình/máy (tin nhắn có thể được ghi ở tiến trình khác). Không còn ai chờ thì thread tự dừng.
+- InProcessNotifier: đánh thức ngay các request đang chờ trong CÙNG tiến trình - chỉ dùng khi chạy
+  đúng 1 tiến trình ASGI (uvicorn/daphne, không --workers): hàng trăm client rảnh chỉ là hàng trăm
+  coroutine đang await, không chiếm worker. Chạy nhiều tiến trình thì tin ghi ở tiến trình khác
+  không đánh thức được ai, client chỉ thấy tin khi long-poll hết hạn.
+
+Chọn bằng settings.CHAT_NOTIFIER (đường dẫn class).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    def __init__(self, after_id=0):
+        self.after_id = after_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        # publish() có thể chạy ở thread khác (view đồng bộ / on_commit) -> phải qua event loop
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # Event loop của request đã đóng
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class InProcessNotifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = defaultdict(set)
+
+    def publish(self, room_id, message_id):
+        with self._lock:
+            waiters = list(self._waiters.get(room_id, ()))
+        for waiter in waiters:
+            waiter.wake()
+
+    @asynccontextmanager
+    async def listen(self, room_ids, after_id):
+        """Đăng ký chờ TRƯỚC khi kiểm tra DB để không lỡ tin đến giữa 2 bước."""
+        waiter = _Waiter(after_id)
+        with self._lock:
+            for room_id in room_ids:
+                self._waiters[room_id].add(waiter)
+        try:
+            yield waiter
+        finally:
+            with self._lock:
+                for room_id in room_ids:
+                    self._waiters[room_id].discard(waiter)
+                    if not self._waiters[room_id]:
+                        del self._waiters[room_id]
+
+
+class DatabaseNotifier(InProcessNotifier):
+    def __init__(self, interval=None):
+        super().__init__()
+        self.interval = interval or getattr(settings, 'CHAT_DB_NOTIFIER_INTERVAL', 1)
+        self._last_id = None
+        self._poller = None
+
+    @asynccontextmanager
+    async def listen(self, room_ids, after_id):
+        async with super().listen(room_ids, after_id) as waiter:
+            with self._lock:
+                # Mốc dò không vượt after_id của request mới -> tin đến trước lượt dò kế tiếp vẫn được thấy
+                self._last_id = after_id if self._last_id is None else min(self._last_id, after_id)
+                if self._poller is None:
+                    self._poller = threading.Thread(target=self._poll, name='chat-db-notifier', daemon=True)
+                    self._poller.start()
+            yield waiter
+
+    def _poll(self):
+        from apps.chat.models import Message
+
+        try:
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self._waiters:
+                        self._poller = self._last_id = None
+                        return
+                    last_id = self._last_id
+                try:
+                    rows = list(
+                        Message.objects.filter(id__gt=last_id)
+                        .order_by().values('room_id').annotate(latest_id=Max('id')).values_list('room_id', 'latest_id')
+                    )
+                except Exception:
+                    logger.exception("Dò tin nhắn mới thất bại")
+                    connection.close()  # lượt sau mở kết nối mới
+                    continue
+                with self._lock:
+                    # Có request mới hạ mốc trong lúc dò -> giữ mốc thấp, lượt sau dò lại từ đó
+                    if rows and self._last_id >= last_id:
+                        self._last_id = max(self._last_id, max(latest_id for _, latest_id in rows))
+                    woken = [
+                        waiter for room_id, latest_id in rows
+                        for waiter in self._waiters.get(room_id, ()) if latest_id > waiter.after_id
+                    ]
+                for waiter in woken:
+                    waiter.wake()
+        finally:
+            connection.close()
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                path = getattr(settings, 'CHAT_NOTIFIER', 'apps.chat.notifier.DatabaseNotifier')
+                _notifier = import_string(path)()
+    return _notifier
@@ -0,0 +1,282 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.chat.models import Room, RoomMember, Message
+from apps.chat.attachments import process_stale_images, render_image
+from apps.chat.notifier import DatabaseNotifier, InProcessNotifier
+from apps.chat.views import MESSAGE_SYNC_LIMIT
+from PIL import Image
+
+User = get_user_model()
+
+
+class RoomMessagesSyncTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='x', role='TELESALE')
+        self.bob = User.objects.create_user(username='bob', password='x', role='TELESALE')
+        self.room = Room.objects.create(type='DIRECT')
+        self.room.members.add(self.alice, self.bob)
+        self.client = Client()
+        self.client.force_login(self.alice)
+        self.url = f'/chat/api/room/{self.room.id}/messages/'
+
+    def send(self, n, sender=None):
+        return [Message.objects.create(room=self.room, sender=sender or self.bob, content=f'tin {i}') for i in range(n)]
+
+    def test_initial_page_then_older_pages(self):
+        msgs = self.send(120)
+        data = self.client.get(self.url).json()
+        self.assertEqual([m['id'] for m in data['messages']], [m.id for m in msgs[-50:]])
+        self.assertTrue(data['has_more'])
+
+        older = self.client.get(self.url, {'before_id': msgs[-50].id}).json()
+        self.assertEqual([m['id'] for m in older['messages']], [m.id for m in msgs[-100:-50]])
+        oldest = self.client.get(self.url, {'before_id': msgs[-100].id}).json()
+        self.assertEqual(len(oldest['messages']), 20)
+        self.assertFalse(oldest['has_more'])
+
+    def test_poll_returns_only_new_messages_and_304_when_idle(self):
+        first = self.send(3)
+        resp = self.client.get(self.url)
+        etag = resp['ETag']
+
+        idle = self.client.get(self.url, {'after_id': first[-1].id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(idle.status_code, 304)
+
+        new = self.send(2, sender=self.alice)
+        resp = self.client.get(self.url, {'after_id': first[-1].id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual([m['id'] for m in data['messages']], [m.id for m in new])
+        self.assertTrue(all(m['is_me'] for m in data['messages']))
+
+    def test_catch_up_pages_past_sync_limit_are_not_304(self):
+        first = self.send(1)[0]
+        etag = self.client.get(self.url)['ETag']
+        msgs = self.send(MESSAGE_SYNC_LIMIT + 10)
+
+        page1 = self.client.get(self.url, {'after_id': first.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(page1.json()['messages']), MESSAGE_SYNC_LIMIT)
+        self.assertTrue(page1.json()['has_more'])
+        # client gửi lại ETag nhận ở trang 1 (= tin cuối của phòng) khi lấy tiếp
+        page2 = self.client.get(self.url, {'after_id': msgs[MESSAGE_SYNC_LIMIT - 1].id}, HTTP_IF_NONE_MATCH=page1['ETag'])
+        self.assertEqual(page2.status_code, 200)
+        self.assertEqual([m['id'] for m in page2.json()['messages']], [m.id for m in msgs[MESSAGE_SYNC_LIMIT:]])
+        idle = self.client.get(self.url, {'after_id': msgs[-1].id}, HTTP_IF_NONE_MATCH=page2['ETag'])
+        self.assertEqual(idle.status_code, 304)
+
+    def test_invalid_since_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'since': '2026-02-31T10:00'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'hôm qua'}).status_code, 400)
+        msg = self.send(1)[0]
+        naive = timezone.localtime(msg.timestamp).replace(tzinfo=None) - timedelta(minutes=1)
+        data = self.client.get(self.url, {'since': naive.isoformat()}).json()
+        self.assertEqual([m['id'] for m in data['messages']], [msg.id])
+
+    def test_non_member_is_rejected(self):
+        outsider = User.objects.create_user(username='carol', password='x', role='TELESALE')
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ChatHomeRoomListTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='x', role='TELESALE')
+        self.client = Client()
+        self.client.force_login(self.alice)
+
+    def make_rooms(self, n):
+        for i in range(Room.objects.count(), Room.objects.count() + n):
+            other = User.objects.create_user(username=f'user{i}', password='x', first_name=f'Tên{i}', role='TELESALE')
+            room = Room.objects.create(type='DIRECT')
+            room.members.add(self.alice, other)
+            Message.objects.create(room=room, sender=other, content=f'xin chào {i}')
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        self.make_rooms(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/chat/')
+        self.make_rooms(10)
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.get('/chat/')
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(resp.context['rooms']), 12)
+
+    def test_last_message_and_unread_counts(self):
+        bob = User.objects.create_user(username='bob', password='x', role='TELESALE')
+        room = Room.objects.create(type='DIRECT')
+        room.members.add(self.alice, bob)
+        for i in range(3):
+            Message.objects.create(room=room, sender=bob, content=f'tin {i}')
+        mine = Message.objects.create(room=room, sender=self.alice, content='trả lời')
+
+        room.refresh_from_db()
+        self.assertEqual(room.last_message_id, mine.id)
+        rooms = self.client.get('/chat/').context['rooms']
+        self.assertEqual((rooms[0]['last_msg'], rooms[0]['unread']), ('trả lời', 0))
+
+        self.client.force_login(bob)
+        self.assertEqual(self.client.get('/chat/').context['rooms'][0]['unread'], 1)
+        self.client.get(f'/chat/api/room/{room.id}/messages/')
+        self.assertEqual(RoomMember.objects.get(room=room, user=bob).last_read_message_id, mine.id)
+        self.assertEqual(self.client.get('/chat/').context['rooms'][0]['unread'], 0)
+
+        mine.delete()
+        room.refresh_from_db()
+        self.assertEqual(room.last_message.content, 'tin 2')
+
+
+class WaitForMessagesTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='x', role='TELESALE')
+        self.bob = User.objects.create_user(username='bob', password='x', role='TELESALE')
+        self.room = Room.objects.create(type='DIRECT')
+        self.room.members.add(self.alice, self.bob)
+        self.other_room = Room.objects.create(type='DIRECT')
+        self.other_room.members.add(self.bob)
+        self.client = AsyncClient()
+        self.client.force_login(self.alice)
+
+    async def test_returns_immediately_when_rooms_have_newer_messages(self):
+        first = await Message.objects.acreate(room=self.room, sender=self.bob, content='a')
+        await Message.objects.acreate(room=self.other_room, sender=self.bob, content='không phải phòng của alice')
+        latest = await Message.objects.acreate(room=self.room, sender=self.bob, content='b')
+
+        data = (await self.client.get('/chat/api/wait/', {'after_id': first.id})).json()
+        self.assertEqual(data, {'rooms': {str(self.room.id): latest.id}, 'latest_id': latest.id})
+
+    @override_settings(CHAT_LONG_POLL_TIMEOUT=0.05)
+    async def test_times_out_when_idle(self):
+        msg = await Message.objects.acreate(room=self.room, sender=self.bob, content='a')
+        data = (await self.client.get('/chat/api/wait/', {'after_id': msg.id})).json()
+        self.assertTrue(data['timeout'])
+
+    async def test_anonymous_is_rejected(self):
+        self.assertEqual((await AsyncClient().get('/chat/api/wait/')).status_code, 401)
+
+    def test_wsgi_falls_back_to_short_polling(self):
+        client = Client()
+        client.force_login(self.alice)
+        self.assertEqual(client.get('/chat/api/wait/').json(), {'long_poll': False})
+
+    def test_in_process_notifier_wakes_waiter_from_other_thread(self):
+        notifier = InProcessNotifier()
+
+        async def scenario():
+            async with notifier.listen([1, 2], after_id=0) as waiter:
+                threading.Timer(0.01, notifier.publish, args=(2, 99)).start()
+                woke = await waiter.wait(5)
+            return woke, notifier._waiters
+
+        woke, waiters = asyncio.run(scenario())
+        self.assertTrue(woke)
+        self.assertEqual(dict(waiters), {})
+
+
+class DatabaseNotifierTests(TransactionTestCase):
+    def test_one_shared_poller_wakes_waiters_of_changed_rooms(self):
+        alice = User.objects.create_user(username='alice', password='x', role='TELESALE')
+        room, other = Room.objects.create(type='DIRECT'), Room.objects.create(type='DIRECT')
+        first = Message.objects.create(room=room, sender=alice, content='a')
+        notifier = DatabaseNotifier(interval=0.01)
+
+        def send():
+            Message.objects.create(room=room, sender=alice, content='b')
+            connection.close()
+
+        async def scenario():
+            async with notifier.listen([room.id], first.id) as w1, notifier.listen([room.id, other.id], first.id) as w2, \
+                    notifier.listen([other.id], first.id) as w3:
+                pollers = [t for t in threading.enumerate() if t.name == 'chat-db-notifier']
+                threading.Timer(0.02, send).start()
+                return len(pollers), await asyncio.gather(w1.wait(5), w2.wait(5), w3.wait(0.2))
+
+        pollers, woke = asyncio.run(scenario())
+        self.assertEqual(pollers, 1)
+        self.assertEqual(woke, [True, True, False])
+        # Hết người chờ -> thread dò tự dừng
+        for _ in range(100):
+            if notifier._poller is None:
+                break
+            time.sleep(0.01)
+        self.assertIsNone(notifier._poller)
+
+
+class ImageAttachmentTests(TestCase):
+    def jpeg_bytes(self, size=(3000, 2000)):
+        exif = Image.Exif()
+        exif[0x0110] = 'Điện thoại của khách'  # Model
+        out = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(out, format='JPEG', exif=exif)
+        return out.getvalue()
+
+    def test_render_strips_metadata_and_builds_thumbnail(self):
+        full, thumb = render_image(self.jpeg_bytes())
+        with Image.open(io.BytesIO(full)) as img:
+            self.assertEqual(img.size, (1024, 683))
+            self.assertNotIn('exif', img.info)
+        with Image.open(io.BytesIO(thumb)) as img:
+            self.assertLessEqual(max(img.size), 240)
+
+    def test_send_message_with_image(self):
+        alice = User.objects.create_user(username='alice', password='x', role='TELESALE')
+        room = Room.objects.create(type='DIRECT')
+        room.members.add(alice)
+        self.client.force_login(alice)
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media, CHAT_IMAGE_WORKERS=0):
+            upload = SimpleUploadedFile('anh.jpg', self.jpeg_bytes(), content_type='image/jpeg')
+            resp = self.client.post('/chat/api/send/', {'room_id': room.id, 'content': 'ảnh da', 'attachment': upload})
+            self.assertEqual(resp.json(), {'status': 'ok', 'pending': False})
+            msg = Message.objects.get()
+            self.assertTrue(msg.attachment.name.endswith('.jpg'))
+            self.assertTrue(msg.thumbnail.name.endswith('_thumb.jpg'))
+            # File gốc (còn EXIF) đã bị xoá, chỉ còn ảnh đã nén + thumbnail
+            self.assertEqual(sum(len(files) for _, _, files in os.walk(media)), 2)
+
+            fake = SimpleUploadedFile('virus.jpg', b'MZ not an image', content_type='image/jpeg')
+            resp = self.client.post('/chat/api/send/', {'room_id': room.id, 'attachment': fake})
+            self.assertEqual(resp.status_code, 400)
+
+    def test_pending_image_keeps_text_and_failure_is_visible(self):
+        alice = User.objects.create_user(username='alice', password='x', role='TELESALE')
+        room = Room.objects.create(type='DIRECT')
+        room.members.add(alice)
+        self.client.force_login(alice)
+        url = f'/chat/api/room/{room.id}/messages/'
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media, CHAT_IMAGE_WORKERS=2), \
+                mock.patch('apps.chat.attachments._get_executor') as executor:
+            upload = SimpleUploadedFile('anh.jpg', self.jpeg_bytes((40, 40)), content_type='image/jpeg')
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post('/chat/api/send/', {'room_id': room.id, 'content': 'ảnh da', 'attachment': upload})
+            self.assertEqual(resp.json(), {'status': 'ok', 'pending': True})
+            executor.return_value.submit.assert_called_once()
+
+            # Tin (kèm nội dung) đã có ngay, chưa lộ đường dẫn file gốc
+            msg = Message.objects.get()
+            data = self.client.get(url).json()['messages'][0]
+            self.assertEqual((data['content'], data['attachment_status'], data['file_url']), ('ảnh da', 'PENDING', None))
+            self.assertEqual(self.client.get(url, {'pending': msg.id}).json(), {'updated': []})
+
+            # Worker chết giữa chừng, file gốc hỏng -> lệnh xử lý tồn đọng đánh dấu lỗi cho cả phòng thấy
+            with msg.attachment.open('wb') as f:
+                f.write(b'hong')
+            with self.assertLogs('apps.chat.attachments', 'ERROR'):
+                self.assertEqual(process_stale_images(older_than=0), 1)
+            updated = self.client.get(url, {'pending': msg.id}).json()['updated']
+            self.assertEqual([(m['id'], m['attachment_status'], m['content']) for m in updated], [(msg.id, 'FAILED', 'ảnh da')])
+            self.assertEqual(process_stale_images(older_than=0), 0)
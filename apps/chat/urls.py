@@ -12,6 +12,7 @@ urlpatterns = [
     # API Chat (Đã sửa để dùng room_id)
     path('api/room/<int:room_id>/messages/', views.get_room_messages, name='get_room_messages'),
     path('api/send/', views.send_message, name='send_message'),
+    path('api/wait/', views.wait_for_messages, name='wait_for_messages'),
     
     # API Cũ (Giữ lại logic Announcement)
     path('create-announcement/', views.create_announcement, name='create_announcement'),
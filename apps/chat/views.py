@@ -1,80 +1,53 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q
+from django.http import JsonResponse, HttpResponseNotModified
+from django.db.models import Q, Max, Count, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
-from .models import Message, Announcement, Room
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Message, Announcement, Room, RoomMember
+from .notifier import get_notifier
+from .attachments import validate_image, submit_image_message
 import json
-import uuid
-import io
-import os
-
-# Thư viện xử lý ảnh (Cần cài đặt: pip install Pillow)
-try:
-    from PIL import Image
-except ImportError:
-    import sys
-    # Fallback nếu chưa cài Pillow (để tránh lỗi crash server ngay lập tức)
-    print("WARNING: Pillow not installed. Image upload will fail.", file=sys.stderr)
 
 User = get_user_model()
 
-# --- HÀM HỖ TRỢ NÉN & BẢO MẬT ẢNH ---
-def process_image(uploaded_file):
-    try:
-        # 1. Kiểm tra định dạng (Chống đổi đuôi file exe/php thành jpg)
-        img = Image.open(uploaded_file)
-        
-        # Chỉ chấp nhận các định dạng an toàn
-        if img.format not in ['JPEG', 'PNG', 'WEBP']:
-            return None, "Định dạng file không hỗ trợ (Chỉ nhận JPG, PNG, WEBP)"
-
-        # 2. Xóa Metadata (Nơi hacker hay giấu mã độc)
-        if hasattr(img, 'getdata'):
-            data = list(img.getdata())
-            image_without_exif = Image.new(img.mode, img.size)
-            image_without_exif.putdata(data)
-            img = image_without_exif
-
-        # 3. Resize ảnh (Tiết kiệm dung lượng)
-        max_width = 1024
-        if img.width > max_width:
-            ratio = max_width / float(img.width)
-            new_height = int((float(img.height) * float(ratio)))
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-
-        # 4. Chuyển đổi sang RGB (để lưu thống nhất thành JPEG)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # 5. Nén ảnh
-        output_io = io.BytesIO()
-        # Quality=60: Giảm dung lượng cực mạnh nhưng vẫn nhìn rõ
-        img.save(output_io, format='JPEG', quality=60, optimize=True) 
-        
-        # 6. Đổi tên file ngẫu nhiên
-        filename = f"{uuid.uuid4()}.jpg"
-        
-        # Trả về file đã xử lý
-        return ContentFile(output_io.getvalue(), name=filename), None
-
-    except Exception as e:
-        return None, str(e)
-
 @login_required(login_url='/auth/login/')
 def chat_home(request):
     users = User.objects.filter(is_active=True).exclude(id=request.user.id).order_by('first_name')
-    my_rooms = request.user.chat_rooms.all().order_by('-updated_at')
-    
+
+    # [TỐI ƯU] 1 truy vấn cho phòng + tin cuối + số tin chưa đọc, 1 truy vấn prefetch thành viên còn lại
+    # (trước đây mỗi phòng tốn thêm 2 truy vấn: members.exclude().first() và messages.last())
+    unread = (
+        Message.objects.filter(room_id=OuterRef('room_id'), id__gt=OuterRef('last_read_message_id'))
+        .exclude(sender_id=request.user.id)
+        .order_by().values('room_id').annotate(c=Count('id')).values('c')
+    )
+    memberships = (
+        RoomMember.objects.filter(user=request.user)
+        .select_related('room__last_message')
+        .annotate(unread_count=Coalesce(Subquery(unread), 0))
+        .prefetch_related(Prefetch(
+            'room__memberships',
+            queryset=RoomMember.objects.exclude(user=request.user).select_related('user'),
+            to_attr='other_members',
+        ))
+        .order_by('-room__updated_at')
+    )
+
     room_data = []
-    for room in my_rooms:
+    latest_message_id = 0
+    for membership in memberships:
+        room = membership.room
         display_name = room.name
         avatar_char = "G"
         is_group = (room.type == 'GROUP')
         
         if not is_group:
-            other_member = room.members.exclude(id=request.user.id).first()
+            other_member = room.other_members[0].user if room.other_members else None
             if other_member:
                 display_name = f"{other_member.last_name} {other_member.first_name}"
                 avatar_char = other_member.username[0].upper()
@@ -84,8 +57,9 @@ def chat_home(request):
             avatar_char = room.name[0].upper() if room.name else "G"
 
         last_msg_content = "Trò chuyện mới"
-        last_msg = room.messages.last()
+        last_msg = room.last_message
         if last_msg:
+            latest_message_id = max(latest_message_id, last_msg.id)
             if last_msg.attachment:
                 last_msg_content = "📎 Đã gửi một ảnh"
             else:
@@ -97,6 +71,7 @@ def chat_home(request):
             'avatar': avatar_char,
             'is_group': is_group,
             'last_msg': last_msg_content,
+            'unread': membership.unread_count,
             'updated_at': room.updated_at
         })
 
@@ -108,7 +83,9 @@ def chat_home(request):
         'users': users, 
         'rooms': room_data,
         'announcements': announcements,
-        'current_user_id': request.user.id
+        'current_user_id': request.user.id,
+        # Mốc cho long-poll (api/wait/): chỉ báo các tin có id lớn hơn
+        'latest_message_id': latest_message_id,
     })
 
 @login_required
@@ -171,50 +148,166 @@ def add_member_to_group(request):
     return JsonResponse({'status': 'error'}, status=400)
 
 # --- API LẤY TIN NHẮN (CẬP NHẬT) ---
+# [TỐI ƯU] Đồng bộ theo phần chênh lệch thay vì trả toàn bộ lịch sử mỗi 3 giây:
+# - Không tham số: MESSAGE_PAGE_SIZE tin mới nhất.
+# - ?after_id=<id> (hoặc ?since=<ISO datetime>): chỉ các tin mới hơn (dùng khi polling).
+# - ?before_id=<id>: trang tin cũ hơn ("Tải tin cũ hơn").
+# Phân trang keyset theo (timestamp, id) + ETag: phòng không có gì mới chỉ trả 304.
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_SYNC_LIMIT = 200
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+def _parse_int(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _is_room_member(room_id, user):
+    return RoomMember.objects.filter(room_id=room_id, user_id=user.id).exists()
+
+def _serialize_message(msg, user_id):
+    parent_data = None
+    if msg.parent:
+        parent_data = {
+            'id': msg.parent.id,
+            'content': msg.parent.content[:50] + "..." if msg.parent.content else "Tin nhắn đính kèm",
+            'sender': msg.parent.sender.last_name or msg.parent.sender.username
+        }
+
+    # Xử lý File/Ảnh
+    file_url = None
+    is_image = False
+    file_name = ""
+    # Ảnh đang chờ xử lý: chưa trả đường dẫn file gốc (client hiện "đang xử lý" và hỏi lại bằng ?pending=)
+    if msg.attachment and msg.attachment_status == Message.AttachmentStatus.READY:
+        file_url = msg.attachment.url
+        file_name = msg.attachment.name.rsplit('/', 1)[-1]
+        is_image = file_name.lower().endswith(IMAGE_EXTENSIONS)
+
+    return {
+        'id': msg.id,
+        'sender_id': msg.sender_id,
+        'sender_name': f"{msg.sender.last_name} {msg.sender.first_name}",
+        'avatar': msg.sender.username[0].upper(),
+        'content': msg.content,
+        'file_url': file_url,   # [MỚI]
+        'thumb_url': msg.thumbnail.url if msg.thumbnail else file_url,
+        'is_image': is_image,   # [MỚI]
+        'file_name': file_name, # [MỚI]
+        'attachment_status': msg.attachment_status,
+        'time': timezone.localtime(msg.timestamp).strftime('%H:%M %d/%m'),
+        'is_me': msg.sender_id == user_id,
+        'parent': parent_data
+    }
+
 @login_required
 def get_room_messages(request, room_id):
-    room = get_object_or_404(Room, id=room_id)
-    if request.user not in room.members.all():
+    if not _is_room_member(room_id, request.user):
         return JsonResponse({'error': 'Unauthorized'}, status=403)
 
-    messages = room.messages.select_related('sender', 'parent').order_by('timestamp')
-    
-    data = []
-    for msg in messages:
-        parent_data = None
-        if msg.parent:
-            parent_data = {
-                'id': msg.parent.id,
-                'content': msg.parent.content[:50] + "..." if msg.parent.content else "Tin nhắn đính kèm",
-                'sender': msg.parent.sender.last_name or msg.parent.sender.username
-            }
-
-        # Xử lý File/Ảnh
-        file_url = None
-        is_image = False
-        file_name = ""
-        
-        if msg.attachment:
-            file_url = msg.attachment.url
-            file_name = os.path.basename(msg.attachment.name)
-            ext = os.path.splitext(file_name)[1].lower()
-            if ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-                is_image = True
-
-        data.append({
-            'id': msg.id,
-            'sender_id': msg.sender.id,
-            'sender_name': f"{msg.sender.last_name} {msg.sender.first_name}",
-            'avatar': msg.sender.username[0].upper(),
-            'content': msg.content,
-            'file_url': file_url,   # [MỚI]
-            'is_image': is_image,   # [MỚI]
-            'file_name': file_name, # [MỚI]
-            'time': msg.timestamp.strftime('%H:%M %d/%m'),
-            'is_me': msg.sender == request.user,
-            'parent': parent_data
-        })
-    return JsonResponse(data, safe=False)
+    messages = Message.objects.filter(room_id=room_id)
+
+    # ?pending=<id,id>: các tin ảnh client đang hiện "đang xử lý" -> trả lại những tin đã xử lý xong / lỗi
+    pending_ids = [i for i in map(_parse_int, request.GET.get('pending', '').split(',')) if i][:MESSAGE_PAGE_SIZE]
+    if pending_ids:
+        done = messages.filter(id__in=pending_ids).exclude(
+            attachment_status=Message.AttachmentStatus.PENDING
+        ).select_related('sender', 'parent__sender')
+        return JsonResponse({'updated': [_serialize_message(msg, request.user.id) for msg in done]})
+
+    after_id = _parse_int(request.GET.get('after_id'))
+    before_id = _parse_int(request.GET.get('before_id'))
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_datetime(request.GET['since'])
+        except ValueError:  # đúng định dạng nhưng không có thật, vd 2026-02-31T10:00
+            since = None
+        if since is None:
+            return JsonResponse({'error': 'since không hợp lệ'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+
+    # ETag = tin mới nhất của phòng: client gửi lại If-None-Match, phòng không đổi -> 304 (không body).
+    # Chỉ 304 khi truy vấn không thể có tin mới hơn (trang mới nhất / after_id đã tới tin cuối): đang lấy bù
+    # nhiều trang after_id thì ETag vẫn là tin cuối của phòng nhưng các trang sau vẫn phải trả về.
+    latest_id = messages.order_by('-timestamp', '-id').values_list('id', flat=True).first() or 0
+    etag = f'"room-{room_id}-{latest_id}"'
+    up_to_date = not before_id and not since and (after_id is None or after_id >= latest_id)
+    if up_to_date and etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    messages = messages.select_related('sender', 'parent__sender')
+    anchor_id = after_id or before_id
+    anchor_time = messages.filter(id=anchor_id).values_list('timestamp', flat=True).first() if anchor_id else None
+
+    if after_id or since:
+        if anchor_time:
+            messages = messages.filter(Q(timestamp__gt=anchor_time) | Q(timestamp=anchor_time, id__gt=after_id))
+        elif after_id:
+            messages = messages.filter(id__gt=after_id)
+        else:
+            messages = messages.filter(timestamp__gt=since)
+        page = list(messages.order_by('timestamp', 'id')[:MESSAGE_SYNC_LIMIT + 1])
+        has_more = len(page) > MESSAGE_SYNC_LIMIT
+        page = page[:MESSAGE_SYNC_LIMIT]
+    else:
+        if anchor_time:
+            messages = messages.filter(Q(timestamp__lt=anchor_time) | Q(timestamp=anchor_time, id__lt=before_id))
+        elif before_id:
+            messages = messages.filter(id__lt=before_id)
+        page = list(messages.order_by('-timestamp', '-id')[:MESSAGE_PAGE_SIZE + 1])
+        has_more = len(page) > MESSAGE_PAGE_SIZE
+        page = page[:MESSAGE_PAGE_SIZE][::-1]
+
+    # Đã xem tới tin mới nhất được trả về -> dời con trỏ đọc (chỉ tiến, không lùi)
+    if page and not before_id:
+        RoomMember.objects.filter(
+            room_id=room_id, user_id=request.user.id, last_read_message_id__lt=page[-1].id
+        ).update(last_read_message_id=page[-1].id)
+
+    response = JsonResponse({
+        'messages': [_serialize_message(msg, request.user.id) for msg in page],
+        'has_more': has_more,
+    })
+    response['ETag'] = etag
+    return response
+
+async def wait_for_messages(request):
+    """
+    [MỚI] Long-poll: giữ request tới khi có tin mới (id > after_id) ở BẤT KỲ phòng nào của user,
+    hoặc hết CHAT_LONG_POLL_TIMEOUT giây. Thay cho việc client hỏi từng phòng mỗi 3 giây.
+    View async -> chạy dưới ASGI, request đang chờ không chiếm worker/thread.
+    Chạy dưới WSGI thì mỗi request chờ giữ 1 worker suốt thời gian chờ -> trả ngay `long_poll: False`,
+    client quay về hỏi định kỳ phòng đang mở.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'long_poll': False})
+
+    after_id = _parse_int(request.GET.get('after_id')) or 0
+    timeout = getattr(settings, 'CHAT_LONG_POLL_TIMEOUT', 25)
+    room_ids = [rid async for rid in RoomMember.objects.filter(user_id=user.id).values_list('room_id', flat=True)]
+    if not room_ids:
+        return JsonResponse({'timeout': True, 'rooms': {}, 'latest_id': after_id})
+
+    new_messages = Message.objects.filter(room_id__in=room_ids, id__gt=after_id)
+    async with get_notifier().listen(room_ids, after_id) as waiter:
+        has_new = await new_messages.aexists() or await waiter.wait(timeout)
+
+    if not has_new:
+        return JsonResponse({'timeout': True, 'rooms': {}, 'latest_id': after_id})
+
+    rooms = {
+        str(row['room_id']): row['latest_id']
+        async for row in new_messages.order_by().values('room_id').annotate(latest_id=Max('id'))
+    }
+    return JsonResponse({'rooms': rooms, 'latest_id': max(rooms.values(), default=after_id)})
 
 # --- API GỬI TIN NHẮN (CẬP NHẬT GỬI FILE) ---
 @login_required
@@ -228,7 +321,7 @@ def send_message(request):
         
         if room_id:
             room = get_object_or_404(Room, id=room_id)
-            if request.user not in room.members.all():
+            if not _is_room_member(room.id, request.user):
                 return JsonResponse({'status': 'error', 'message': 'Not in room'}, status=403)
 
             parent_msg = None
@@ -238,30 +331,31 @@ def send_message(request):
                 except Message.DoesNotExist:
                     pass
 
-            processed_file = None
-            
-            # [CẬP NHẬT] Xử lý file nếu có
+            # [TỐI ƯU] Ảnh: chỉ kiểm tra header ở đây, giải mã/thu nhỏ/nén chạy trong worker pool.
+            # Tin nhắn (kèm nội dung) được lưu ngay ở trạng thái chờ xử lý ảnh; long-poll báo cho các client.
             if attachment:
                 # Chặn file > 10MB
                 if attachment.size > 10 * 1024 * 1024:
                     return JsonResponse({'status': 'error', 'message': 'File quá lớn (>10MB)'}, status=400)
 
-                # Gọi hàm nén ảnh
-                processed_file, error = process_image(attachment)
+                error = validate_image(attachment)
                 if error:
                     return JsonResponse({'status': 'error', 'message': error}, status=400)
 
-            # Chỉ tạo khi có nội dung hoặc file
-            if content or processed_file:
+                message = submit_image_message(room, request.user, content, parent_msg, attachment)
+                return JsonResponse({
+                    'status': 'ok', 'pending': message.attachment_status == Message.AttachmentStatus.PENDING,
+                })
+
+            # Chỉ tạo khi có nội dung
+            if content:
                 Message.objects.create(
                     room=room, 
                     sender=request.user, 
                     content=content, 
                     parent=parent_msg,
-                    attachment=processed_file # Lưu file đã nén
                 )
-                
-                room.save() # Update time
+                # updated_at / last_message của phòng được cập nhật trong signal post_save của Message
                 return JsonResponse({'status': 'ok'})
             
     return JsonResponse({'status': 'error'}, status=400)
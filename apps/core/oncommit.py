@@ -0,0 +1,38 @@
+"""
+Gom công việc phát sinh trong 1 transaction và xử lý 1 lần sau khi commit.
+
+Mỗi lần `add()` đăng ký 1 callback bằng transaction.on_commit (Django tự huỷ callback khi transaction /
+savepoint rollback); callback chạy đầu tiên xử lý cả lô, các callback sau thấy lô đã rỗng thì bỏ qua.
+Thứ được gom là các khoá cần tính lại từ DB (ngày, khách hàng...), nên khoá còn sót lại của
+1 transaction đã rollback chỉ làm tính lại thừa ở lần commit sau, không làm sai số liệu.
+Callback chạy ở chế độ robust: lỗi chỉ được ghi log, không biến 1 lần ghi đã commit thành lỗi 500
+(số liệu lệch sẽ được các lệnh đối soát định kỳ sửa lại).
+"""
+import threading
+
+from django.db import transaction
+
+
+class OnCommitBatch:
+    """Tập khoá chờ xử lý của luồng hiện tại; `handler(keys)` được gọi 1 lần cho mỗi lần commit."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._local = threading.local()
+
+    def add(self, keys):
+        keys = {key for key in keys if key is not None}
+        if not keys:
+            return
+        pending = getattr(self._local, 'keys', None)
+        if pending is None:
+            pending = self._local.keys = set()
+        pending.update(keys)
+        # Ngoài transaction thì on_commit chạy ngay
+        transaction.on_commit(self.flush, robust=True)
+
+    def flush(self):
+        keys = getattr(self._local, 'keys', None)
+        self._local.keys = None
+        if keys:
+            self.handler(keys)
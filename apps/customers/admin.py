@@ -4,14 +4,16 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django import forms
 from django.utils import timezone
-from datetime import datetime
-import csv
+from django.utils.html import format_html
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 import io
 
 from .models import Customer, Fanpage
+from .importer import import_customers, read_rows, write_errors
 
 class CsvImportForm(forms.Form):
-    csv_file = forms.FileField(label="Chọn file CSV")
+    csv_file = forms.FileField(label="Chọn file CSV / Excel (.xlsx)")
 
 # --- QUẢN LÝ FANPAGE: Cho phép tick chọn Marketer ---
 @admin.register(Fanpage)
@@ -50,13 +52,19 @@ class CustomerAdmin(admin.ModelAdmin):
             if form.is_valid():
                 csv_file = request.FILES["csv_file"]
                 try:
-                    data_set = csv_file.read().decode('utf-8-sig')
-                    io_string = io.StringIO(data_set)
-                    reader = csv.DictReader(io_string)
-                    for row in reader:
-                        # Logic xử lý row giữ nguyên như file cũ của bạn
-                        pass
-                    messages.success(request, "Import thành công!")
+                    # [TỐI ƯU] Dùng chung bộ nhập theo lô với lệnh import_customers
+                    result = import_customers(read_rows(csv_file.file, csv_file.name))
+                    messages.success(request, f"Import thành công! Mới thêm: {result.created}, đã có (bỏ qua): {result.existing}.")
+                    if result.errors:
+                        out = io.StringIO()
+                        write_errors(result.errors, out)
+                        path = default_storage.save(
+                            f"imports/customers_errors_{timezone.localtime():%Y%m%d_%H%M%S}.csv",
+                            ContentFile(out.getvalue().encode('utf-8-sig')),
+                        )
+                        messages.warning(request, format_html(
+                            'Có {} dòng lỗi - <a href="{}">tải file kết quả</a>.', len(result.errors), default_storage.url(path)
+                        ))
                     return redirect("..")
                 except Exception as e:
                     messages.error(request, f"Lỗi: {str(e)}")
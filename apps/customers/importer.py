@@ -0,0 +1,207 @@
+"""
+Nhập khách hàng hàng loạt từ CSV / Excel (dùng chung cho lệnh `import_customers` và trang Import của Admin).
+
+[TỐI ƯU] Thay cho get_or_create từng dòng (2 truy vấn / dòng):
+- đọc file theo dạng stream (csv.DictReader / openpyxl read_only), không nạp cả file vào bộ nhớ;
+- chuẩn hoá SĐT 1 lần, bỏ dòng trùng ngay trong file;
+- mỗi lô BATCH_SIZE dòng: 1 truy vấn lấy các SĐT đã có + bulk_create(ignore_conflicts=True);
+- dòng lỗi được trả về (dòng, SĐT, lỗi) để ghi ra file kết quả thay vì dừng cả lần nhập.
+"""
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import lru_cache
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.analytics.rollups import as_day, mark_days_dirty
+from apps.customers.models import Customer
+
+BATCH_SIZE = 2000
+
+PHONE_KEYS = ('SĐT', 'SDT', 'PHONE')
+NAME_KEYS = ('TÊN KHÁCH HÀNG', 'TÊN FB', 'HỌ TÊN', 'NAME')
+ADDRESS_KEYS = ('VỊ TRÍ', 'ĐỊA CHỈ', 'TỈNH THÀNH')
+DATE_KEYS = ('NGÀY', 'DATE', 'CREATED_AT')
+
+ERROR_HEADER = ['Dòng', 'SĐT', 'Lỗi']
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    existing: int = 0
+    errors: list = field(default_factory=list)  # [(dòng, SĐT gốc, lỗi)]
+
+
+def normalize_phone(raw):
+    """'+84 912.345.678' / '84912345678' / 912345678 (Excel mất số 0) -> '0912345678'."""
+    if isinstance(raw, float) and raw.is_integer():
+        raw = int(raw)
+    digits = re.sub(r'\D', '', str(raw or ''))
+    if len(digits) == 11 and digits.startswith('84'):
+        digits = '0' + digits[2:]
+    elif len(digits) == 9 and not digits.startswith('0'):
+        digits = '0' + digits
+    return digits
+
+
+def _first(row, keys):
+    for key in keys:
+        if row.get(key):
+            return row[key]
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_day(value):
+    """Ngày từ file: 26/11/2025, 2025-11-26 hoặc ô ngày của Excel. Không đọc được -> None."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    try:
+        if '/' in text:
+            return datetime.strptime(text, '%d/%m/%Y').date()
+        if '-' in text:
+            return datetime.strptime(text[:10], '%Y-%m-%d').date()
+    except ValueError:
+        pass
+    return None
+
+
+def _timestamps(now):
+    """Ngày (hoặc None) -> created_at. Giờ lấy theo lúc nhập để tránh tất cả đều là 00:00:00."""
+    clock = timezone.localtime(now).time()
+    cache = {None: now}  # Không có / sai định dạng ngày -> lấy thời điểm nhập (giữ cách xử lý cũ)
+
+    def created_at(day):
+        if day not in cache:
+            cache[day] = timezone.make_aware(datetime.combine(day, clock))
+        return cache[day]
+    return created_at
+
+
+def parse_phone(row):
+    """SĐT đã chuẩn hoá của 1 dòng; dòng không dùng được -> ValueError."""
+    raw_phone = _first(row, PHONE_KEYS)
+    if not raw_phone:
+        raise ValueError("Thiếu số điện thoại")
+    phone = normalize_phone(raw_phone)
+    if not 8 <= len(phone) <= 15:
+        raise ValueError("Số điện thoại không hợp lệ")
+    return phone
+
+
+def build_customer(phone, row, created_at, source=Customer.Source.FACEBOOK):
+    """1 dòng (key đã strip + viết hoa) -> Customer chưa lưu."""
+    address = str(_first(row, ADDRESS_KEYS) or '')
+
+    notes = []
+    if row.get('LINK FB'): notes.append(f"FB: {row['LINK FB']}")
+    if row.get('DV QUAN TÂM'): notes.append(f"Quan tâm: {row['DV QUAN TÂM']}")
+    if row.get('TRẠNG THÁI'): notes.append(f"TT cũ: {row['TRẠNG THÁI']}")
+    if row.get('TELESALE'): notes.append(f"Sale cũ: {row['TELESALE']}")
+    for key in row:
+        if 'GỌI LẦN' in key:
+            notes.append(f"{key}: {row[key]}")
+
+    return Customer(
+        phone=phone,
+        name=str(_first(row, NAME_KEYS) or "Khách hàng")[:100],
+        city=address[:50],
+        address=address,
+        note_telesale=" | ".join(notes),
+        source=source,
+        created_at=created_at(_parse_day(_first(row, DATE_KEYS))),
+    )
+
+
+def _clean(row):
+    clean_row = {}
+    for k, v in row.items():
+        if isinstance(v, str):
+            v = v.strip()
+        if k and v not in (None, ''):
+            clean_row[str(k).strip().upper()] = v
+    return clean_row
+
+
+def read_csv_rows(binary_file):
+    """Sinh (số dòng, dict) từ file CSV nhị phân (UTF-8, tự nhận dấu phân cách ; hoặc ,)."""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    first_line = text.readline()
+    text.seek(0)
+    reader = csv.DictReader(text, delimiter=';' if ';' in first_line else ',')
+    for row in reader:
+        yield reader.line_num, _clean(row)
+    text.detach()
+
+
+def read_xlsx_rows(binary_file):
+    """Sinh (số dòng, dict) từ sheet đầu tiên của file .xlsx (openpyxl read_only - đọc từng dòng)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(binary_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        for line, values in enumerate(rows, start=2):
+            yield line, _clean(dict(zip(header, values)))
+    finally:
+        workbook.close()
+
+
+def read_rows(binary_file, filename):
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        return read_xlsx_rows(binary_file)
+    return read_csv_rows(binary_file)
+
+
+def _flush(batch, result, created_at, source, days):
+    """batch: {SĐT: dòng}. Chỉ dựng Customer cho các SĐT chưa có trong DB."""
+    with transaction.atomic():
+        existing = set(Customer.objects.filter(phone__in=list(batch)).values_list('phone', flat=True))
+        new = [build_customer(phone, row, created_at, source) for phone, row in batch.items() if phone not in existing]
+        Customer.objects.bulk_create(new, ignore_conflicts=True)
+    days.update(customer.created_at for customer in new)
+    result.created += len(new)
+    result.existing += len(existing)
+
+
+def import_customers(rows, batch_size=BATCH_SIZE, source=Customer.Source.FACEBOOK):
+    """Nhập các dòng (số dòng, dict) theo lô. Khách đã có (theo SĐT) được giữ nguyên."""
+    result = ImportResult()
+    created_at = _timestamps(timezone.now())
+    seen = {}
+    batch = {}
+    days = set()
+    for line, row in rows:
+        try:
+            phone = parse_phone(row)
+        except ValueError as e:
+            result.errors.append((line, _first(row, PHONE_KEYS) or '', str(e)))
+            continue
+        if phone in seen:
+            result.errors.append((line, phone, f"Trùng SĐT với dòng {seen[phone]}"))
+            continue
+        seen[phone] = line
+        batch[phone] = row
+        if len(batch) >= batch_size:
+            _flush(batch, result, created_at, source, days)
+            batch = {}
+    if batch:
+        _flush(batch, result, created_at, source, days)
+    # bulk_create không phát post_save -> tự đánh dấu ngày rollup của lead mới, 1 lần cho cả file
+    mark_days_dirty({as_day(value) for value in days})
+    return result
+
+
+def write_errors(errors, text_file):
+    writer = csv.writer(text_file)
+    writer.writerow(ERROR_HEADER)
+    writer.writerows(errors)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.customers.ranking import recompute_rankings
+
+
+class Command(BaseCommand):
+    help = 'Tính lại Tổng chi tiêu & Hạng thành viên của toàn bộ khách hàng từ bảng đơn hàng (1 truy vấn gom nhóm + bulk_update)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Số khách đọc / ghi mỗi lô')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Bắt đầu tính lại hạng thành viên..."))
+        changed = recompute_rankings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã cập nhật {changed} khách hàng! ==="))
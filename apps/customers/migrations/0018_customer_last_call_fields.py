@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0017_customer_fb_lead_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_call_status',
+            field=models.CharField(blank=True, editable=False, max_length=50, null=True, verbose_name='Kết quả cuộc gọi gần nhất'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_call_time',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Thời gian gọi gần nhất'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_callback_time',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Lịch gọi lại gần nhất'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_call_status', 'last_callback_time'], name='customers_last_call_idx'),
+        ),
+    ]
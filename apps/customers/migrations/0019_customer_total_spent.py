@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_total_spent(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    Order = apps.get_model('sales', 'Order')
+
+    spent = (
+        Order.objects.filter(customer=models.OuterRef('pk'), is_paid=True)
+        .order_by().values('customer').annotate(s=models.Sum('total_amount')).values('s')
+    )
+    Customer.objects.update(total_spent=Coalesce(models.Subquery(spent), 0, output_field=models.DecimalField(max_digits=15, decimal_places=0)))
+    # Cùng ngưỡng với Customer.ranking_for
+    Customer.objects.update(ranking=models.Case(
+        models.When(total_spent__gt=70000000, then=models.Value('DIAMOND')),
+        models.When(total_spent__gte=20000000, then=models.Value('GOLD')),
+        models.When(total_spent__gte=10000000, then=models.Value('SILVER')),
+        default=models.Value('MEMBER'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0018_customer_last_call_fields'),
+        ('sales', '0011_order_amount_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='total_spent',
+            field=models.DecimalField(decimal_places=0, default=0, editable=False, max_digits=15, verbose_name='Tổng chi tiêu'),
+        ),
+        migrations.RunPython(backfill_total_spent, migrations.RunPython.noop),
+    ]
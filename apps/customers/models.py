@@ -95,6 +95,16 @@ class Customer(models.Model):
     note_telesale = models.TextField(blank=True, verbose_name="Ghi chú ban đầu")
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Ngày tạo")
     ranking = models.CharField(max_length=20, choices=Ranking.choices, default=Ranking.MEMBER, verbose_name="Hạng thành viên")
+    # [TỐI ƯU] Tổng giá trị các đơn đã thanh toán - lưu sẵn, chỉ tính lại (SUM từ DB) cho đúng các khách có đơn
+    # thay đổi, 1 lần khi commit (xem apps.customers.ranking), thay cho SUM + save() từng khách mỗi lần lưu đơn.
+    total_spent = models.DecimalField(max_digits=15, decimal_places=0, default=0, editable=False, verbose_name="Tổng chi tiêu")
+
+    # [TỐI ƯU] Kết quả cuộc gọi gần nhất - phi chuẩn hoá từ CallLog, được đồng bộ ở luồng ghi
+    # CallLog (xem apps.telesales.models). Thay cho Subquery "log mới nhất" chạy trên từng dòng.
+    # NULL = chưa có cuộc gọi nào (tương đương trạng thái NEW).
+    last_call_status = models.CharField(max_length=50, null=True, blank=True, editable=False, verbose_name="Kết quả cuộc gọi gần nhất")
+    last_call_time = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Thời gian gọi gần nhất")
+    last_callback_time = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Lịch gọi lại gần nhất")
 
     @property
     def age(self):
@@ -103,17 +113,36 @@ class Customer(models.Model):
             return today.year - self.dob.year - ((today.month, today.day) < (self.dob.month, self.dob.day))
         return None
 
+    @classmethod
+    def ranking_for(cls, total_spent):
+        if total_spent > 70000000: return cls.Ranking.DIAMOND
+        elif total_spent >= 20000000: return cls.Ranking.GOLD
+        elif total_spent >= 10000000: return cls.Ranking.SILVER
+        return cls.Ranking.MEMBER
+
+    @classmethod
+    def ranking_expression(cls):
+        """Cùng ngưỡng với ranking_for, dạng biểu thức SQL theo cột total_spent (dùng trong UPDATE)."""
+        return models.Case(
+            models.When(total_spent__gt=70000000, then=models.Value(cls.Ranking.DIAMOND)),
+            models.When(total_spent__gte=20000000, then=models.Value(cls.Ranking.GOLD)),
+            models.When(total_spent__gte=10000000, then=models.Value(cls.Ranking.SILVER)),
+            default=models.Value(cls.Ranking.MEMBER),
+        )
+
     def update_ranking(self):
-        total_spent = self.order_set.filter(is_paid=True).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        if total_spent > 70000000: self.ranking = self.Ranking.DIAMOND
-        elif total_spent >= 20000000: self.ranking = self.Ranking.GOLD
-        elif total_spent >= 10000000: self.ranking = self.Ranking.SILVER
-        else: self.ranking = self.Ranking.MEMBER
-        self.save()
+        """Tính lại đầy đủ từ bảng đơn hàng (đối soát); luồng lưu đơn dùng apps.customers.ranking."""
+        self.total_spent = self.order_set.filter(is_paid=True).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+        self.ranking = self.ranking_for(self.total_spent)
+        self.save(update_fields=['total_spent', 'ranking'])
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
     class Meta:
         verbose_name = "Khách hàng"
-        verbose_name_plural = "Danh sách Khách hàng"
\ No newline at end of file
+        verbose_name_plural = "Danh sách Khách hàng"
+        indexes = [
+            models.Index(fields=['last_call_status', 'last_callback_time'], name='customers_last_call_idx'),
+            models.Index(fields=['created_at'], name='customers_created_idx'),
+        ]
\ No newline at end of file
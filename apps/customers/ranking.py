@@ -0,0 +1,56 @@
+"""
+Hạng thành viên theo tổng chi tiêu.
+
+Mỗi lần lưu / xoá Order làm đổi số tiền đã thanh toán của khách thì khách được đánh dấu; các khách
+đánh dấu trong cùng 1 transaction được tính lại 1 lần khi commit (apps.core.oncommit): 2 câu UPDATE
+cho cả lô, chỉ SUM đơn đã thanh toán của đúng các khách đó, thay vì SUM + Customer.save() cho từng đơn.
+Tổng được tính lại từ DB chứ không cộng dồn chênh lệch trong bộ nhớ, nên transaction bị rollback
+không làm lệch số liệu.
+Lệnh `recompute_rankings` tính lại toàn bảng để đối soát (vd sau khi sửa đơn bằng queryset.update()).
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.core.oncommit import OnCommitBatch
+from apps.customers.models import Customer
+from apps.sales.models import Order
+
+
+def refresh_spent(customer_ids):
+    """Tính lại total_spent + ranking của các khách chỉ định (2 câu UPDATE)."""
+    paid = Order.objects.filter(customer=OuterRef('pk'), is_paid=True).order_by().values('customer').annotate(
+        total=Sum('total_amount')
+    ).values('total')
+    customers = Customer.objects.filter(id__in=list(customer_ids))
+    customers.update(total_spent=Coalesce(
+        Subquery(paid), Value(Decimal(0)), output_field=DecimalField(max_digits=15, decimal_places=0),
+    ))
+    # Câu thứ 2 để đọc total_spent mới (Postgres tính mọi SET theo giá trị cũ của dòng)
+    customers.update(ranking=Customer.ranking_expression())
+
+
+_dirty_customers = OnCommitBatch(refresh_spent)
+
+
+def mark_spent_dirty(customer_ids):
+    """Đánh dấu các khách cần tính lại tổng chi tiêu (tính lại 1 lần khi transaction commit)."""
+    _dirty_customers.add(customer_ids)
+
+
+def recompute_rankings(batch_size=2000):
+    """Tính lại total_spent + ranking của toàn bộ khách: 1 truy vấn gom nhóm + bulk_update phần thay đổi."""
+    rows = Customer.objects.annotate(
+        spent=Sum('order__total_amount', filter=Q(order__is_paid=True))
+    ).values_list('id', 'total_spent', 'ranking', 'spent').order_by('id')
+
+    changed = []
+    for customer_id, total_spent, ranking, spent in rows.iterator(chunk_size=batch_size):
+        spent = spent or Decimal(0)
+        new_ranking = Customer.ranking_for(spent)
+        if spent != total_spent or new_ranking != ranking:
+            changed.append(Customer(id=customer_id, total_spent=spent, ranking=new_ranking))
+
+    Customer.objects.bulk_update(changed, ['total_spent', 'ranking'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,49 @@
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.customers.importer import import_customers, normalize_phone, read_rows
+from apps.customers.models import Customer
+
+
+class CustomerImportTests(TestCase):
+    def rows(self, text):
+        return read_rows(io.BytesIO(text.encode('utf-8-sig')), 'leads.csv')
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('+84 912.345.678'), '0912345678')
+        self.assertEqual(normalize_phone(912345678.0), '0912345678')
+        self.assertEqual(normalize_phone('0912-345-678'), '0912345678')
+
+    def test_batches_skip_existing_and_report_bad_rows(self):
+        Customer.objects.create(name='Cũ', phone='0911111111')
+        csv_text = (
+            "SĐT;Tên FB;Vị trí;Ngày\n"
+            "84911111111;Đã có;HN;01/02/2024\n"
+            "0922222222;Mới 1;HCM;2024-03-05\n"
+            "abc;Lỗi;;\n"
+            "0922 222 222;Trùng;;\n"
+            "933333333;Mới 2;;\n"
+        )
+        with self.assertNumQueries(8):  # 2 lô x (SELECT SĐT đã có + INSERT + savepoint đầu/cuối)
+            result = import_customers(self.rows(csv_text), batch_size=2)
+
+        self.assertEqual((result.created, result.existing), (2, 1))
+        self.assertEqual([(line, err) for line, _, err in result.errors],
+                         [(4, "Số điện thoại không hợp lệ"), (5, "Trùng SĐT với dòng 3")])
+        new = Customer.objects.get(phone='0922222222')
+        self.assertEqual((new.name, new.city, new.created_at.date().isoformat()), ('Mới 1', 'HCM', '2024-03-05'))
+        self.assertTrue(Customer.objects.filter(phone='0933333333').exists())
+
+    def test_command_writes_errors_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'leads.csv')
+            with open(path, 'w', encoding='utf-8-sig') as f:
+                f.write("PHONE,NAME\n0944444444,A\n,B\n")
+            call_command('import_customers', path, stdout=io.StringIO())
+            with open(os.path.join(tmp, 'leads.errors.csv'), encoding='utf-8-sig') as f:
+                self.assertEqual(f.read().splitlines(), ['Dòng,SĐT,Lỗi', '3,,Thiếu số điện thoại'])
+        self.assertTrue(Customer.objects.filter(phone='0944444444').exists())
@@ -11,6 +11,7 @@ from apps.telesales.models import CallLog
 from apps.bookings.models import Appointment
 from apps.sales.models import Order
 from apps.authentication.decorators import allowed_users
+from apps.analytics.dates import day_range
 
 User = get_user_model() 
 
@@ -88,7 +89,12 @@ def customer_list(request):
     if source_filter: customers = customers.filter(source=source_filter)
     if skin_filter: customers = customers.filter(skin_condition=skin_filter)
     if city_filter: customers = customers.filter(city__icontains=city_filter)
-    if date_from and date_to: customers = customers.filter(created_at__date__range=[date_from, date_to])
+    if date_from and date_to:
+        try:
+            customers = customers.filter(day_range('created_at', date_from, date_to))
+        except ValueError as e:
+            messages.error(request, f"{e} - bỏ lọc theo ngày tạo.")
+            date_from = date_to = ''
 
     source_choices = Customer.Source.choices
     skin_choices = Customer.SkinIssue.choices
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.hr.payroll import run_payroll
+
+
+class Command(BaseCommand):
+    help = 'Tính bảng lương & hoa hồng của 1 tháng cho toàn bộ nhân viên có hợp đồng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=str, help='Tháng cần tính, dạng YYYY-MM (mặc định: tháng hiện tại)')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ tính và in ra, không lưu phiếu lương')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                month = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--month phải có dạng YYYY-MM")
+        else:
+            month = timezone.localdate().replace(day=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Bắt đầu tính lương tháng {month:%m/%Y}..."))
+        slips = run_payroll(month, dry_run=options['dry_run'])
+        for slip in slips:
+            self.stdout.write(
+                f"--- {slip.user.username}: {slip.actual_work_days:g} công, doanh số {slip.sales_revenue:,.0f}, "
+                f"thực lĩnh {slip.total_salary:,.0f}"
+            )
+
+        action = "Xem trước" if options['dry_run'] else "Đã lưu"
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: {action} {len(slips)} phiếu lương! ==="))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_slips(apps, schema_editor):
+    # get_or_create cũ không có ràng buộc -> giữ phiếu mới nhất của mỗi nhân viên / tháng
+    SalarySlip = apps.get_model('hr', 'SalarySlip')
+    latest = (
+        SalarySlip.objects.values('user', 'month')
+        .annotate(keep=models.Max('id'), n=models.Count('id')).filter(n__gt=1)
+    )
+    for row in latest:
+        SalarySlip.objects.filter(user=row['user'], month=row['month']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0004_leaverequest_leave_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slips, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='salaryslip',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='hr_salaryslip_user_month_uniq'),
+        ),
+    ]
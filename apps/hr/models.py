@@ -63,6 +63,10 @@ class SalarySlip(models.Model):
     class Meta:
         verbose_name = "Phiếu lương"
         verbose_name_plural = "Quản lý Bảng lương"
+        # Mỗi nhân viên 1 phiếu / tháng - khoá cho upsert của apps.hr.payroll
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='hr_salaryslip_user_month_uniq'),
+        ]
 
 # 4. Quản lý Đơn xin nghỉ phép
 class LeaveRequest(models.Model):
@@ -0,0 +1,92 @@
+"""
+Tính lương tháng cho toàn bộ nhân viên có hợp đồng.
+
+[TỐI ƯU] Thay cho vòng lặp COUNT chấm công + SUM doanh số + get_or_create/save từng nhân viên:
+- 1 truy vấn GROUP BY đếm công, 1 truy vấn GROUP BY cộng doanh số tư vấn của tháng;
+- 1 truy vấn đọc Thưởng/Phạt đã nhập tay trên phiếu cũ (không bị ghi đè khi tính lại);
+- ghi tất cả phiếu bằng 1 lệnh bulk_create(update_conflicts=True) trong 1 transaction.
+dry_run=True chỉ tính và trả về các phiếu (chưa lưu) để xem trước.
+"""
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from apps.sales.models import Order
+from .models import Attendance, EmployeeContract, SalarySlip
+
+STANDARD_WORK_DAYS = 26
+
+# Cột được tính lại mỗi lần chạy; bonus / deduction do kế toán nhập tay nên giữ nguyên
+UPDATE_FIELDS = [
+    'standard_work_days', 'actual_work_days', 'base_salary_lock', 'allowance_lock',
+    'sales_revenue', 'commission_rate_lock', 'commission_amount', 'total_salary',
+]
+
+
+def _vnd(amount):
+    return amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+
+
+def _month_range(month):
+    """[ngày 1 của tháng, ngày 1 tháng sau)."""
+    start = month.replace(day=1)
+    end = date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+    return start, end
+
+
+def compute_slips(month):
+    """Phiếu lương (chưa lưu) của tháng chứa ngày `month`, mỗi nhân viên có hợp đồng 1 phiếu."""
+    start, end = _month_range(month)
+
+    work_days = dict(
+        Attendance.objects.filter(date__gte=start, date__lt=end, is_present=True)
+        .values('user').annotate(days=Count('id')).values_list('user', 'days')
+    )
+    revenues = dict(
+        Order.objects.filter(order_date__gte=start, order_date__lt=end, assigned_consultant__isnull=False)
+        .values('assigned_consultant').annotate(revenue=Sum('total_amount')).values_list('assigned_consultant', 'revenue')
+    )
+    adjustments = {
+        user_id: (bonus, deduction)
+        for user_id, bonus, deduction in SalarySlip.objects.filter(month=start).values_list('user', 'bonus', 'deduction')
+    }
+
+    slips = []
+    for contract in EmployeeContract.objects.select_related('user').order_by('user_id'):
+        days = work_days.get(contract.user_id, 0)
+        revenue = revenues.get(contract.user_id) or Decimal(0)
+        bonus, deduction = adjustments.get(contract.user_id, (Decimal(0), Decimal(0)))
+
+        salary_by_days = contract.base_salary / STANDARD_WORK_DAYS * days
+        commission = _vnd(revenue * Decimal(str(contract.commission_rate)) / 100)
+        slips.append(SalarySlip(
+            user=contract.user,
+            month=start,
+            standard_work_days=STANDARD_WORK_DAYS,
+            actual_work_days=days,
+            base_salary_lock=contract.base_salary,
+            allowance_lock=contract.allowance,
+            sales_revenue=revenue,
+            commission_rate_lock=contract.commission_rate,
+            commission_amount=commission,
+            bonus=bonus,
+            deduction=deduction,
+            total_salary=_vnd(salary_by_days + contract.allowance + commission + bonus - deduction),
+        ))
+    return slips
+
+
+def run_payroll(month, dry_run=False):
+    """Tính và ghi (upsert theo nhân viên + tháng) bảng lương. Trả về danh sách phiếu."""
+    options = {'update_conflicts': True, 'update_fields': UPDATE_FIELDS}
+    # MySQL (ON DUPLICATE KEY UPDATE) không cho chỉ định cột unique, tự dựa vào ràng buộc (user, month)
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['user', 'month']
+
+    with transaction.atomic():
+        slips = compute_slips(month)
+        if slips and not dry_run:
+            SalarySlip.objects.bulk_create(slips, **options)
+    return slips
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from apps.customers.models import Customer
+from apps.hr.models import Attendance, EmployeeContract, SalarySlip
+from apps.hr.payroll import run_payroll
+from apps.sales.models import Order, Service
+
+User = get_user_model()
+
+
+class PayrollTests(TestCase):
+    def setUp(self):
+        self.sale = User.objects.create_user(username='sale', password='x', role='CONSULTANT')
+        EmployeeContract.objects.create(user=self.sale, base_salary=2600000, allowance=500000, commission_rate=2.5)
+        for i in range(10):
+            Attendance.objects.create(user=self.sale, date=date(2026, 3, 1) + timedelta(days=i))
+        Attendance.objects.create(user=self.sale, date=date(2026, 4, 1))  # tháng sau - không tính
+
+        service = Service.objects.create(name='Rejuran', base_price=5000000)
+        customer = Customer.objects.create(name='Nguyễn Văn A', phone='0912345678', source='OTHER')
+        for day, amount in ((date(2026, 3, 5), 4000000), (date(2026, 3, 31), 2000000), (date(2026, 2, 28), 9000000)):
+            Order.objects.create(customer=customer, service=service, assigned_consultant=self.sale,
+                                 order_date=day, total_amount=amount, actual_revenue=amount)
+
+    def test_computes_and_upserts_slip(self):
+        # 2.600.000 / 26 * 10 công + 500.000 phụ cấp + 2,5% x 6.000.000 doanh số
+        slip, = run_payroll(date(2026, 3, 15))
+        self.assertEqual(slip.actual_work_days, 10)
+        self.assertEqual(slip.sales_revenue, Decimal(6000000))
+        self.assertEqual(slip.commission_amount, Decimal(150000))
+        self.assertEqual(slip.total_salary, Decimal(1650000))
+
+        SalarySlip.objects.filter(user=self.sale).update(bonus=100000, deduction=30000)
+        run_payroll(date(2026, 3, 1))
+        saved = SalarySlip.objects.get()
+        self.assertEqual(saved.month, date(2026, 3, 1))
+        self.assertEqual((saved.bonus, saved.deduction), (100000, 30000))
+        self.assertEqual(saved.total_salary, 1720000)
+
+    def test_dry_run_does_not_save(self):
+        slips = run_payroll(date(2026, 3, 1), dry_run=True)
+        self.assertEqual(slips[0].total_salary, Decimal(1650000))
+        self.assertFalse(SalarySlip.objects.exists())
+
+    def test_query_count_does_not_grow_with_staff(self):
+        for i in range(20):
+            user = User.objects.create_user(username=f'nv{i}', password='x', role='CONSULTANT')
+            EmployeeContract.objects.create(user=user, base_salary=5000000)
+        # savepoint + 4 truy vấn đọc + 1 upsert + release
+        with self.assertNumQueries(7):
+            slips = run_payroll(date(2026, 3, 1))
+        self.assertEqual(len(slips), 21)
+        self.assertEqual(SalarySlip.objects.count(), 21)
+
+    def test_dashboard_preview(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='x', role='ADMIN'))
+        response = self.client.post('/hr/payroll/?month=2026-03', {'preview': '1'})
+        self.assertContains(response, 'chưa được lưu')
+        self.assertContains(response, '1.650.000')
+        self.assertFalse(SalarySlip.objects.exists())
+
+        response = self.client.post('/hr/payroll/?month=2026-03')
+        self.assertRedirects(response, '/hr/payroll/?month=2026-03', fetch_redirect_response=False)
+        self.assertEqual(SalarySlip.objects.get().total_salary, 1650000)
@@ -3,11 +3,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
 from datetime import datetime, timedelta
 
 from .models import Attendance, SalarySlip, EmployeeContract, LeaveRequest
-from apps.sales.models import Order
+from .payroll import run_payroll
 from apps.authentication.decorators import allowed_users
 
 User = get_user_model()
@@ -67,60 +66,25 @@ def payroll_dashboard(request):
     except ValueError:
         selected_date = today
 
+    # [TỐI ƯU] Tính lương cả công ty bằng vài truy vấn gộp + 1 lệnh upsert (apps.hr.payroll)
+    preview = False
     if request.method == 'POST':
-        contracts = EmployeeContract.objects.select_related('user').all()
-        count = 0
-        
-        for contract in contracts:
-            user = contract.user
-            actual_work_days = Attendance.objects.filter(
-                user=user, 
-                date__year=selected_date.year, 
-                date__month=selected_date.month,
-                is_present=True
-            ).count()
-
-            standard_days = 26
-            salary_by_days = (contract.base_salary / standard_days) * actual_work_days
-
-            monthly_revenue = Order.objects.filter(
-                sale_consultant=user,
-                created_at__year=selected_date.year,
-                created_at__month=selected_date.month
-            ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            commission_amt = monthly_revenue * (contract.commission_rate / 100)
-            total_salary = salary_by_days + contract.allowance + commission_amt
-
-            slip, created = SalarySlip.objects.get_or_create(
-                user=user,
-                month=selected_date.replace(day=1),
-                defaults={'base_salary_lock': contract.base_salary}
-            )
-            
-            slip.standard_work_days = standard_days
-            slip.actual_work_days = actual_work_days
-            slip.base_salary_lock = contract.base_salary
-            slip.allowance_lock = contract.allowance
-            
-            slip.sales_revenue = monthly_revenue
-            slip.commission_rate_lock = contract.commission_rate
-            slip.commission_amount = commission_amt
-            
-            slip.total_salary = total_salary + slip.bonus - slip.deduction
-            slip.save()
-            count += 1
-        
-        messages.success(request, f"Đã tính lương cho {count} nhân viên.")
-        return redirect(f'/hr/payroll/?month={selected_month_str}')
-
-    slips = SalarySlip.objects.filter(month__year=selected_date.year, month__month=selected_date.month)
+        if 'preview' in request.POST:
+            slips = run_payroll(selected_date, dry_run=True)
+            preview = True
+        else:
+            slips = run_payroll(selected_date)
+            messages.success(request, f"Đã tính lương cho {len(slips)} nhân viên.")
+            return redirect(f'/hr/payroll/?month={selected_month_str}')
+    else:
+        slips = SalarySlip.objects.filter(month=selected_date.replace(day=1)).select_related('user')
     total_payout = sum(slip.total_salary for slip in slips)
 
     context = {
         'slips': slips,
         'selected_month': selected_month_str,
-        'total_payout': total_payout
+        'total_payout': total_payout,
+        'preview': preview,
     }
     return render(request, 'hr/payroll_dashboard.html', context)
 
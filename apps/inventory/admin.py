@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, InventoryLog
+from .models import Product, InventoryLog, InventoryImport, InventorySnapshot
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -9,4 +9,19 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(InventoryLog)
 class InventoryLogAdmin(admin.ModelAdmin):
     list_display = ('product', 'change_type', 'quantity', 'stock_after', 'user', 'created_at')
-    list_filter = ('change_type', 'created_at')
\ No newline at end of file
+    list_filter = ('change_type', 'created_at')
+
+@admin.register(InventoryImport)
+class InventoryImportAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'status', 'created_count', 'existing_count', 'user', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+
+@admin.register(InventorySnapshot)
+class InventorySnapshotAdmin(admin.ModelAdmin):
+    list_display = ('product', 'period', 'closing_stock', 'created_at')
+    list_filter = ('period',)
+
+    # Snapshot đã chốt là bất biến
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,223 @@
+"""
+Nhập kho từ file Excel (.xlsx) ngoài request.
+
+[TỐI ƯU] Thay cho pd.read_excel + iterrows + get_or_create từng dòng:
+- đọc file bằng openpyxl read_only (từng dòng, không nạp cả sheet / không cần pandas);
+- mỗi lô BATCH_SIZE dòng: 1 truy vấn tìm SP đã có theo Mã SP hoặc Tên, bulk_create SP mới
+  và bulk_create log "Tồn đầu kỳ";
+- chạy trong thread pool, kết quả ghi vào InventoryImport để trang Kho hiển thị;
+- file được lưu vào storage cùng InventoryImport: tiến trình web bị tắt khi job còn PENDING / RUNNING
+  thì lệnh `process_inventory_imports` nhập lại (SP đã tạo ở lần trước được bỏ qua như SP đã có).
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product, InventoryLog, InventoryImport
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+# Job chờ / đang chạy lâu hơn chừng này (phút) coi như tiến trình web đã mất việc
+STALE_MINUTES = 30
+
+# Cột trong file mẫu
+NAME_COLUMN = 'Ten'
+CODE_COLUMN = 'MaSP'
+UNIT_COLUMN = 'DonVi'
+STOCK_COLUMN = 'TonDau'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def read_rows(data):
+    """Sinh (số dòng, dict theo tên cột) từ sheet đầu tiên của file .xlsx (bytes)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, None) or ()]
+        for line, values in enumerate(rows, start=2):
+            yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() if value is not None else ''
+
+
+def _stock(value):
+    """Tồn đầu: ô trống -> 0; không phải số nguyên không âm -> ValueError."""
+    if value in (None, ''):
+        return 0
+    try:
+        amount = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError(f"Tồn đầu không hợp lệ: {value}")
+    if amount < 0 or amount != amount.to_integral_value():
+        raise ValueError(f"Tồn đầu không hợp lệ: {value}")
+    return int(amount)
+
+
+def _flush(batch, user_id, result):
+    """batch: [Product chưa lưu]. SP đã có (trùng Mã SP, hoặc trùng Tên khi dòng không có mã) được bỏ qua."""
+    codes = {p.code for p in batch if p.code}
+    names = {p.name for p in batch if not p.code}
+    with transaction.atomic():
+        existing_codes, existing_names = set(), set()
+        for name, code in Product.objects.filter(Q(code__in=codes) | Q(name__in=names)).values_list('name', 'code'):
+            existing_names.add(name)
+            if code:
+                existing_codes.add(code)
+        new = [p for p in batch if not (p.code in existing_codes if p.code else p.name in existing_names)]
+        Product.objects.bulk_create(new)
+
+        stocked = [p for p in new if p.stock > 0]
+        if stocked and stocked[0].pk is None:
+            # MySQL không trả ID sau bulk_create -> đọc lại các SP vừa tạo theo đúng khoá đã dùng để chống trùng:
+            # Mã SP (unique) cho dòng có mã, Tên cho dòng không mã (tên có thể trùng với SP có mã trong cùng lô)
+            by_code = dict(Product.objects.filter(
+                code__in={p.code for p in stocked if p.code}
+            ).values_list('code', 'id'))
+            by_name = dict(Product.objects.filter(
+                code__isnull=True, name__in={p.name for p in stocked if not p.code}
+            ).order_by('id').values_list('name', 'id'))
+            for p in stocked:
+                p.pk = by_code[p.code] if p.code else by_name[p.name]
+        InventoryLog.objects.bulk_create([
+            InventoryLog(
+                product_id=p.pk, change_type='ADJUST', quantity=p.stock,
+                stock_after=p.stock, user_id=user_id, note="Import Excel"
+            )
+            for p in stocked
+        ])
+    result['created'] += len(new)
+    result['existing'] += len(batch) - len(new)
+
+
+def import_products(rows, user_id=None, batch_size=BATCH_SIZE):
+    """Nhập các dòng (số dòng, dict). Trả về {'created', 'existing', 'errors': [chuỗi lỗi theo dòng]}."""
+    result = {'created': 0, 'existing': 0, 'errors': []}
+    seen = set()
+    batch = []
+    for line, row in rows:
+        name = _text(row.get(NAME_COLUMN))
+        if not name:
+            continue
+        code = _text(row.get(CODE_COLUMN)) or None
+        try:
+            stock = _stock(row.get(STOCK_COLUMN))
+        except ValueError as e:
+            result['errors'].append(f"Dòng {line}: {e}")
+            continue
+        key = ('code', code) if code else ('name', name)
+        if key in seen:
+            result['existing'] += 1
+            continue
+        seen.add(key)
+        batch.append(Product(name=name[:200], code=code, unit=_text(row.get(UNIT_COLUMN)) or 'Hộp', stock=stock))
+        if len(batch) >= batch_size:
+            _flush(batch, user_id, result)
+            batch = []
+    if batch:
+        _flush(batch, user_id, result)
+    return result
+
+
+def _claim(jobs):
+    """Nhận job bằng UPDATE có điều kiện (worker trong tiến trình web và lệnh nhập lại không chạy trùng)."""
+    return jobs.update(status=InventoryImport.Status.RUNNING, started_at=timezone.now()) == 1
+
+
+def run_import(job_id):
+    """Xử lý 1 InventoryImport đã nhận (RUNNING): đọc file đã lưu, nhập kho, ghi lại kết quả rồi xoá file."""
+    job = InventoryImport.objects.get(pk=job_id)
+    try:
+        if not job.file:
+            raise ValueError("Không còn file đã tải lên")
+        with job.file.open('rb') as f:
+            data = f.read()
+        result = import_products(read_rows(data), user_id=job.user_id)
+    except Exception as e:
+        logger.exception("Lỗi nhập kho từ file %s", job.file_name)
+        job.status = InventoryImport.Status.FAILED
+        job.errors = f"Lỗi file: {e}"
+    else:
+        job.status = InventoryImport.Status.DONE
+        job.created_count = result['created']
+        job.existing_count = result['existing']
+        errors = result['errors']
+        job.errors = "\n".join(errors[:MAX_REPORTED_ERRORS])
+        if len(errors) > MAX_REPORTED_ERRORS:
+            job.errors += f"\n... và {len(errors) - MAX_REPORTED_ERRORS} dòng lỗi khác"
+    if job.file:
+        job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def resume_stale_imports(older_than=STALE_MINUTES):
+    """Nhập lại các job PENDING / RUNNING quá `older_than` phút. Trả về [InventoryImport đã xử lý]."""
+    cutoff = timezone.now() - timedelta(minutes=older_than)
+    stale = (
+        Q(status=InventoryImport.Status.PENDING, created_at__lt=cutoff)
+        | Q(status=InventoryImport.Status.RUNNING, started_at__lt=cutoff)
+    )
+    done = []
+    for job_id in InventoryImport.objects.filter(stale).order_by('created_at').values_list('id', flat=True):
+        if _claim(InventoryImport.objects.filter(stale, pk=job_id)):
+            done.append(run_import(job_id))
+    return done
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'INVENTORY_IMPORT_WORKERS', 1), thread_name_prefix='inventory-import'
+                )
+    return _executor
+
+
+def _run_in_worker(job_id):
+    # Thread của pool không đi qua request_started/finished -> tự dọn kết nối DB
+    close_old_connections()
+    try:
+        if _claim(InventoryImport.objects.filter(pk=job_id, status=InventoryImport.Status.PENDING)):
+            run_import(job_id)
+    except Exception:
+        logger.exception("Lỗi nhập kho (InventoryImport #%s)", job_id)
+    finally:
+        close_old_connections()
+
+
+def submit_import(uploaded_file, user):
+    """
+    Lưu file vào storage cùng 1 InventoryImport rồi giao cho worker pool (sau khi commit để worker thấy bản ghi).
+    INVENTORY_IMPORT_WORKERS = 0 -> xử lý ngay trong request (môi trường dev/test).
+    """
+    if not uploaded_file.name.lower().endswith(('.xlsx', '.xlsm')):
+        raise ValueError("Chỉ hỗ trợ file Excel .xlsx")
+    job = InventoryImport.objects.create(file_name=uploaded_file.name[:255], file=uploaded_file, user=user)
+    if getattr(settings, 'INVENTORY_IMPORT_WORKERS', 1) == 0:
+        _claim(InventoryImport.objects.filter(pk=job.pk))
+        return run_import(job.pk)
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.pk))
+    return job
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.inventory.periods import check_consistency, close_pending_periods
+
+
+class Command(BaseCommand):
+    help = 'Chốt tồn kho cuối tháng cho các tháng đã qua (InventorySnapshot) và đối chiếu với tồn hiện tại'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Đối chiếu snapshot + log với Product.stock')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Bắt đầu chốt tồn kho cuối tháng..."))
+        closed = close_pending_periods()
+        for period in closed:
+            self.stdout.write(f"--- Đã chốt tháng {period:%m/%Y}")
+
+        if options['check']:
+            mismatches = check_consistency()
+            for product, ledger, stock in mismatches:
+                self.stdout.write(self.style.WARNING(f"--- LỆCH: {product} - theo sổ {ledger}, tồn hiện tại {stock}"))
+            if not mismatches:
+                self.stdout.write("--- Tồn kho khớp với sổ nhập xuất")
+
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã chốt {len(closed)} tháng! ==="))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.inventory.importer import STALE_MINUTES, resume_stale_imports
+
+
+class Command(BaseCommand):
+    help = 'Nhập lại các lần nhập Excel bị bỏ dở (PENDING / RUNNING quá lâu) khi tiến trình web bị tắt giữa chừng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=STALE_MINUTES, help='Chỉ lấy job chờ / chạy lâu hơn số phút này')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Bắt đầu nhập lại các file Excel bị bỏ dở..."))
+        jobs = resume_stale_imports(options['older_than'])
+        for job in jobs:
+            self.stdout.write(f"--- {job}: {job.created_count} SP mới, {job.existing_count} SP đã có")
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã xử lý {len(jobs)} file! ==="))
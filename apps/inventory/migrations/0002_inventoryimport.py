@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255, verbose_name='Tên file')),
+                ('status', models.CharField(choices=[('PENDING', 'Chờ xử lý'), ('RUNNING', 'Đang nhập'), ('DONE', 'Hoàn thành'), ('FAILED', 'Lỗi')], default='PENDING', max_length=10, verbose_name='Trạng thái')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='SP mới')),
+                ('existing_count', models.PositiveIntegerField(default=0, verbose_name='SP đã có (bỏ qua)')),
+                ('errors', models.TextField(blank=True, verbose_name='Dòng lỗi / Lỗi file')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Xong lúc')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Người thực hiện')),
+            ],
+            options={
+                'verbose_name': 'Lần nhập Excel',
+                'verbose_name_plural': 'Lịch sử nhập Excel',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
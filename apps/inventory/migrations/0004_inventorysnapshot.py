@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_inventorylog_product_time_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='Tháng (ngày đầu tháng)')),
+                ('closing_stock', models.IntegerField(verbose_name='Tồn cuối tháng')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Chốt tồn cuối tháng',
+                'verbose_name_plural': 'Chốt tồn cuối tháng',
+                'constraints': [models.UniqueConstraint(fields=('period', 'product'), name='inventory_snapshot_period_product_uniq')],
+            },
+        ),
+    ]
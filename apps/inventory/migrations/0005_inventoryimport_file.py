@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_inventorysnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryimport',
+            name='file',
+            field=models.FileField(blank=True, upload_to='inventory_imports/%Y/%m/', verbose_name='File đã tải lên'),
+        ),
+        migrations.AddField(
+            model_name='inventoryimport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Bắt đầu lúc'),
+        ),
+    ]
@@ -34,4 +34,62 @@ class InventoryLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Báo cáo nhập xuất tồn: cộng dồn log theo sản phẩm trong/trước 1 khoảng thời gian
+            models.Index(fields=['product', 'created_at'], name='inventory_log_product_time_idx'),
+        ]
+
+class InventoryImport(models.Model):
+    """Lần nhập kho từ file Excel - chạy nền (apps.inventory.importer), trang Kho hiển thị kết quả."""
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Chờ xử lý'
+        RUNNING = 'RUNNING', 'Đang nhập'
+        DONE = 'DONE', 'Hoàn thành'
+        FAILED = 'FAILED', 'Lỗi'
+
+    file_name = models.CharField(max_length=255, verbose_name="Tên file")
+    # File được lưu lại (default_storage) để lệnh process_inventory_imports nhập lại khi tiến trình web bị tắt giữa chừng
+    file = models.FileField(upload_to='inventory_imports/%Y/%m/', blank=True, verbose_name="File đã tải lên")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, verbose_name="Trạng thái")
+    created_count = models.PositiveIntegerField(default=0, verbose_name="SP mới")
+    existing_count = models.PositiveIntegerField(default=0, verbose_name="SP đã có (bỏ qua)")
+    errors = models.TextField(blank=True, verbose_name="Dòng lỗi / Lỗi file")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name="Người thực hiện")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Bắt đầu lúc")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Xong lúc")
+
+    def __str__(self):
+        return f"{self.file_name} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Lần nhập Excel"
+        verbose_name_plural = "Lịch sử nhập Excel"
+        ordering = ['-created_at']
+
+
+class InventorySnapshot(models.Model):
+    """
+    Tồn cuối tháng đã chốt của từng sản phẩm (apps.inventory.periods). Bất biến sau khi ghi:
+    tồn đầu kỳ của tháng sau = 1 lần tra bảng này thay cho cộng dồn toàn bộ lịch sử InventoryLog.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    period = models.DateField(verbose_name="Tháng (ngày đầu tháng)")
+    closing_stock = models.IntegerField(verbose_name="Tồn cuối tháng")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Snapshot tồn kho đã chốt, không được sửa")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.product} - {self.period:%m/%Y}: {self.closing_stock}"
+
+    class Meta:
+        verbose_name = "Chốt tồn cuối tháng"
+        verbose_name_plural = "Chốt tồn cuối tháng"
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'product'], name='inventory_snapshot_period_product_uniq'),
+        ]
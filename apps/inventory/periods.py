@@ -0,0 +1,115 @@
+"""
+Chốt kỳ tồn kho theo tháng.
+
+Mỗi tháng đã qua được chốt 1 lần: InventorySnapshot lưu tồn cuối tháng của từng sản phẩm,
+tính bằng tồn cuối tháng trước (snapshot) + biến động trong tháng. Tồn đầu kỳ ở trang Kho / báo cáo
+vì vậy chỉ là 1 lần tra snapshot cộng biến động của tháng đang xem.
+Các tháng chưa chốt được chốt bù ở lần truy cập đầu tiên (close_pending_periods) hoặc bằng lệnh
+`close_inventory_period`; `check_consistency` đối chiếu snapshot + log với Product.stock.
+"""
+from datetime import date, datetime
+
+from django.db.models import IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, InventoryLog, InventorySnapshot
+
+
+def month_bounds(year, month):
+    """[đầu tháng, đầu tháng sau) theo múi giờ hệ thống (aware datetime)."""
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1))
+    return start, end
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(period):
+    return date(period.year + 1, 1, 1) if period.month == 12 else date(period.year, period.month + 1, 1)
+
+
+def previous_month(period):
+    return date(period.year - 1, 12, 1) if period.month == 1 else date(period.year, period.month - 1, 1)
+
+
+def _snapshot_of(period):
+    """Tồn đã chốt của tháng `period` cho sản phẩm ở dòng ngoài (OuterRef)."""
+    return Subquery(
+        InventorySnapshot.objects.filter(product=OuterRef('pk'), period=period).values('closing_stock')[:1],
+        output_field=IntegerField(),
+    )
+
+
+def opening_balance(start):
+    """
+    Biểu thức tồn đầu kỳ (tại thời điểm `start` = đầu tháng) cho queryset Product:
+    tháng trước đã chốt -> tra snapshot, chưa chốt -> cộng dồn log trước `start`.
+    """
+    previous = previous_month(timezone.localtime(start).date())
+    if InventorySnapshot.objects.filter(period=previous).exists():
+        return Coalesce(_snapshot_of(previous), Value(0))
+    return Coalesce(Sum('logs__quantity', filter=Q(logs__created_at__lt=start)), Value(0))
+
+
+def close_period(period):
+    """Chốt tồn cuối tháng `period` cho mọi sản phẩm (đã chốt thì bỏ qua). Trả về số snapshot đã ghi."""
+    if InventorySnapshot.objects.filter(period=period).exists():
+        return 0
+    start, end = month_bounds(period.year, period.month)
+    previous = previous_month(period)
+    if InventorySnapshot.objects.filter(period=previous).exists():
+        closing = Product.objects.annotate(
+            closing=Coalesce(_snapshot_of(previous), Value(0))
+            + Coalesce(Sum('logs__quantity', filter=Q(logs__created_at__gte=start, logs__created_at__lt=end)), Value(0))
+        )
+    else:
+        closing = Product.objects.annotate(
+            closing=Coalesce(Sum('logs__quantity', filter=Q(logs__created_at__lt=end)), Value(0))
+        )
+    snapshots = [
+        InventorySnapshot(product_id=product_id, period=period, closing_stock=stock)
+        for product_id, stock in closing.values_list('id', 'closing')
+    ]
+    # ignore_conflicts: 2 request cùng chốt bù 1 tháng thì bản ghi sau bị bỏ qua
+    InventorySnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+    return len(snapshots)
+
+
+def close_pending_periods(today=None):
+    """Chốt mọi tháng đã qua (trước tháng hiện tại) chưa có snapshot. Trả về danh sách tháng vừa chốt."""
+    current = month_start(today or timezone.localdate())
+    last = InventorySnapshot.objects.aggregate(m=Max('period'))['m']
+    if last:
+        period = next_month(last)
+    else:
+        first_log = InventoryLog.objects.aggregate(m=Min('created_at'))['m']
+        if first_log is None:
+            return []
+        period = month_start(timezone.localtime(first_log).date())
+
+    closed = []
+    while period < current:
+        close_period(period)
+        closed.append(period)
+        period = next_month(period)
+    return closed
+
+
+def check_consistency():
+    """
+    Đối chiếu tồn tính từ snapshot gần nhất + log sau đó với Product.stock.
+    Trả về [(product, tồn theo sổ, Product.stock)] cho các sản phẩm lệch.
+    """
+    last = InventorySnapshot.objects.aggregate(m=Max('period'))['m']
+    if last:
+        _, since = month_bounds(last.year, last.month)
+        products = Product.objects.annotate(
+            ledger=Coalesce(_snapshot_of(last), Value(0))
+            + Coalesce(Sum('logs__quantity', filter=Q(logs__created_at__gte=since)), Value(0))
+        )
+    else:
+        products = Product.objects.annotate(ledger=Coalesce(Sum('logs__quantity'), Value(0)))
+    return [(p, p.ledger, p.stock) for p in products.order_by('name') if p.ledger != p.stock]
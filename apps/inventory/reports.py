@@ -0,0 +1,44 @@
+"""
+Báo cáo nhập - xuất - tồn theo tháng.
+
+[TỐI ƯU] Tồn đầu / nhập / xuất / điều chỉnh của mọi sản phẩm được tính trong 1 truy vấn GROUP BY
+(Sum có điều kiện theo kỳ và loại giao dịch) thay cho 3 truy vấn aggregate cho từng sản phẩm.
+Index (product, created_at) trên InventoryLog phục vụ các điều kiện theo thời gian; tồn đầu kỳ
+lấy từ snapshot chốt tháng trước (apps.inventory.periods) nên không quét lại toàn bộ lịch sử.
+"""
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Product
+from .periods import close_pending_periods, month_bounds, opening_balance
+
+
+def _period_sum(start, end, change_type):
+    return Coalesce(Sum('logs__quantity', filter=Q(
+        logs__created_at__gte=start, logs__created_at__lt=end, logs__change_type=change_type,
+    )), 0)
+
+
+def movement_report(year, month):
+    """Danh sách dict {name, unit, begin, import, export, adjust, end} theo tên sản phẩm."""
+    close_pending_periods()
+    start, end = month_bounds(year, month)
+    rows = Product.objects.annotate(
+        begin_qty=opening_balance(start),
+        import_qty=_period_sum(start, end, 'IMPORT'),
+        export_qty=_period_sum(start, end, 'EXPORT'),
+        adjust_qty=_period_sum(start, end, 'ADJUST'),
+    ).order_by('name').values('name', 'unit', 'begin_qty', 'import_qty', 'export_qty', 'adjust_qty')
+
+    return [
+        {
+            'name': row['name'],
+            'unit': row['unit'],
+            'begin': row['begin_qty'],
+            'import': row['import_qty'],
+            'export': abs(row['export_qty']),
+            'adjust': row['adjust_qty'],
+            'end': row['begin_qty'] + row['import_qty'] + row['export_qty'] + row['adjust_qty'],
+        }
+        for row in rows
+    ]
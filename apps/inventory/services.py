@@ -0,0 +1,70 @@
+"""
+Nhập / xuất / điều chỉnh tồn kho an toàn khi nhiều người thao tác cùng lúc.
+
+[TỐI ƯU] Không đọc product.stock rồi ghi lại giá trị tính trong Python (2 lễ tân xuất cùng lúc sẽ mất
+1 lượt trừ kho): mỗi biến động là 1 lệnh UPDATE stock = stock + delta có điều kiện stock >= lượng xuất,
+log được ghi trong cùng transaction với stock_after đọc lại ngay sau UPDATE (dòng đang bị khoá ghi).
+Nhiều sản phẩm trong 1 lần gọi: hoặc tất cả thành công, hoặc không có gì thay đổi.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, InventoryLog
+
+
+class InsufficientStockError(ValueError):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(f"Kho không đủ! {product.name} hiện còn {product.stock} {product.unit}")
+
+
+@dataclass
+class StockMovement:
+    product_id: int
+    change_type: str  # IMPORT / EXPORT: số lượng dương; ADJUST: chênh lệch có dấu
+    quantity: int
+    note: str = ''
+
+    @property
+    def delta(self):
+        return -self.quantity if self.change_type == 'EXPORT' else self.quantity
+
+
+def move_stock(movements, user=None):
+    """Áp dụng các biến động trong 1 transaction, trả về các InventoryLog đã ghi. Thiếu hàng -> InsufficientStockError."""
+    # Khoá các dòng theo thứ tự ID cố định để 2 phiếu nhiều sản phẩm không khoá chéo nhau
+    movements = sorted(movements, key=lambda m: m.product_id)
+    logs = []
+    with transaction.atomic():
+        for movement in movements:
+            delta = movement.delta
+            rows = Product.objects.filter(pk=movement.product_id)
+            if delta < 0:
+                rows = rows.filter(stock__gte=-delta)
+            if not rows.update(stock=F('stock') + delta, updated_at=timezone.now()):
+                product = Product.objects.get(pk=movement.product_id)
+                raise InsufficientStockError(product, movement.quantity)
+            stock_after = Product.objects.filter(pk=movement.product_id).values_list('stock', flat=True).get()
+            logs.append(InventoryLog(
+                product_id=movement.product_id, change_type=movement.change_type, quantity=delta,
+                stock_after=stock_after, user=user, note=movement.note,
+            ))
+        InventoryLog.objects.bulk_create(logs)
+    return logs
+
+
+def set_stock(product_id, new_stock, user=None, note=''):
+    """Kiểm kê: đặt tồn về `new_stock`, ghi log ADJUST phần chênh lệch (None nếu không đổi)."""
+    with transaction.atomic():
+        old_stock = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=product_id)
+        if new_stock == old_stock:
+            return None
+        Product.objects.filter(pk=product_id).update(stock=new_stock, updated_at=timezone.now())
+        return InventoryLog.objects.create(
+            product_id=product_id, change_type='ADJUST', quantity=new_stock - old_stock,
+            stock_after=new_stock, user=user, note=note.format(old=old_stock, new=new_stock),
+        )
@@ -0,0 +1,223 @@
+import io
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .importer import resume_stale_imports
+from .models import Product, InventoryLog, InventoryImport, InventorySnapshot
+from .periods import check_consistency, close_pending_periods
+from .services import InsufficientStockError, StockMovement, move_stock, set_stock
+
+User = get_user_model()
+
+
+def make_xlsx(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Ten', 'MaSP', 'DonVi', 'TonDau'])
+    for row in rows:
+        sheet.append(row)
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+class InventoryImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='kho', password='x', role='ADMIN')
+        self.client.force_login(self.user)
+        Product.objects.create(name='Botox', unit='Lọ', stock=3)
+        Product.objects.create(name='Kim 30G', code='K30', unit='Hộp', stock=1)
+        # File tải lên được lưu vào storage -> MEDIA_ROOT tạm
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = self.settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def upload(self, rows):
+        data = make_xlsx(rows)
+        with self.settings(INVENTORY_IMPORT_WORKERS=0):
+            return self.client.post('/inventory/', {
+                'import_file': SimpleUploadedFile('kho.xlsx', data),
+            })
+
+    def test_import_skips_existing_and_logs_opening_stock_in_batches(self):
+        rows = [
+            ['Botox', None, 'Lọ', 10],          # trùng tên -> bỏ qua
+            ['Kim 30G mới', 'K30', 'Hộp', 5],   # trùng mã -> bỏ qua
+            ['Filler', 'F1', 'Ống', 4],
+            ['Gạc', None, None, None],
+            ['Gạc', None, 'Gói', 2],            # trùng trong file
+            ['Bông', None, 'Gói', 'abc'],       # tồn đầu lỗi
+            [None, None, None, None],
+        ]
+        with self.assertNumQueries(11):  # số truy vấn nhập kho không phụ thuộc số dòng
+            self.upload(rows)
+
+        job = InventoryImport.objects.get()
+        self.assertEqual((job.status, job.created_count, job.existing_count), ('DONE', 2, 3))
+        self.assertEqual(job.errors, 'Dòng 7: Tồn đầu không hợp lệ: abc')
+        filler = Product.objects.get(code='F1')
+        self.assertEqual((filler.unit, filler.stock), ('Ống', 4))
+        self.assertEqual(Product.objects.get(name='Gạc').unit, 'Hộp')
+        self.assertEqual(list(InventoryLog.objects.values_list('product__name', 'quantity')), [('Filler', 4)])
+
+    def test_opening_stock_ids_without_bulk_insert_returning(self):
+        # MySQL: bulk_create không gán ID -> phải đọc lại theo Mã SP / Tên, không nhầm SP cùng tên
+        rows = [['Filler', 'F1', 'Ống', 4], ['Filler', None, 'Ống', 7]]
+        no_returning = mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock, return_value=False
+        )
+        with no_returning:
+            self.upload(rows)
+        self.assertEqual(
+            sorted(InventoryLog.objects.values_list('product__code', 'quantity'), key=lambda r: r[1]),
+            [('F1', 4), (None, 7)],
+        )
+
+    def test_job_left_pending_is_resumed_from_stored_file(self):
+        with self.settings(INVENTORY_IMPORT_WORKERS=1), mock.patch('apps.inventory.importer._get_executor'):
+            # Tiến trình web tắt trước khi worker kịp chạy -> job còn PENDING, file đã nằm trong storage
+            self.client.post('/inventory/', {'import_file': SimpleUploadedFile('kho.xlsx', make_xlsx([['Filler', 'F1', 'Ống', 4]]))})
+            job = InventoryImport.objects.get()
+            self.assertEqual(job.status, 'PENDING')
+            self.assertTrue(job.file)
+
+            self.assertEqual(resume_stale_imports(older_than=30), [])
+            call_command('process_inventory_imports', older_than=0, stdout=io.StringIO())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.created_count, job.file.name), ('DONE', 1, ''))
+            self.assertEqual(Product.objects.get(code='F1').stock, 4)
+
+    def test_rejects_non_xlsx(self):
+        self.client.post('/inventory/', {'import_file': SimpleUploadedFile('kho.xls', b'x')})
+        self.assertFalse(InventoryImport.objects.exists())
+
+
+class InventoryReportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='kho', password='x', role='ADMIN'))
+
+    def log(self, product, change_type, quantity, when):
+        entry = InventoryLog.objects.create(product=product, change_type=change_type, quantity=quantity)
+        InventoryLog.objects.filter(pk=entry.pk).update(created_at=timezone.make_aware(when))
+
+    def test_report_is_one_query_and_splits_periods(self):
+        for i in range(5):
+            Product.objects.create(name=f'SP {i}', unit='Hộp')
+        botox = Product.objects.create(name='Botox', unit='Lọ')
+        self.log(botox, 'ADJUST', 10, datetime(2025, 5, 20))
+        self.log(botox, 'IMPORT', 5, datetime(2025, 6, 1, 0, 0))
+        self.log(botox, 'EXPORT', -3, datetime(2025, 6, 30, 23, 59))
+        self.log(botox, 'ADJUST', -1, datetime(2025, 6, 15))
+        self.log(botox, 'IMPORT', 100, datetime(2025, 7, 1, 0, 0))  # tháng sau
+
+        close_pending_periods()  # chốt các tháng đã qua (lần truy cập đầu)
+        with self.assertNumQueries(5):  # session + user + chốt bù (đã chốt) + tra snapshot + báo cáo
+            resp = self.client.get('/inventory/report/', {'month': 6, 'year': 2025})
+        row = resp.context['report_data'][0]
+        self.assertEqual(len(resp.context['report_data']), 6)
+        self.assertEqual(
+            (row['name'], row['begin'], row['import'], row['export'], row['adjust'], row['end']),
+            ('Botox', 10, 5, 3, -1, 11),
+        )
+
+
+class InventoryPeriodTests(TestCase):
+    def log(self, product, quantity, when):
+        entry = InventoryLog.objects.create(product=product, change_type='IMPORT', quantity=quantity)
+        InventoryLog.objects.filter(pk=entry.pk).update(created_at=timezone.make_aware(when))
+
+    def test_closes_each_past_month_once_from_previous_snapshot(self):
+        botox = Product.objects.create(name='Botox', unit='Lọ', stock=9)
+        self.log(botox, 5, datetime(2025, 5, 10))
+        self.log(botox, 3, datetime(2025, 7, 31, 23, 59))
+        self.log(botox, 1, datetime(2025, 8, 1))
+
+        self.assertEqual(close_pending_periods(date(2025, 8, 20)), [date(2025, 5, 1), date(2025, 6, 1), date(2025, 7, 1)])
+        self.assertEqual(
+            list(InventorySnapshot.objects.order_by('period').values_list('period', 'closing_stock')),
+            [(date(2025, 5, 1), 5), (date(2025, 6, 1), 5), (date(2025, 7, 1), 8)],
+        )
+        self.assertEqual(close_pending_periods(date(2025, 8, 25)), [])
+        with self.assertRaises(ValueError):
+            InventorySnapshot.objects.first().save()
+
+        self.assertEqual(check_consistency(), [])
+        Product.objects.filter(pk=botox.pk).update(stock=7)
+        self.assertEqual([(p.name, ledger, stock) for p, ledger, stock in check_consistency()], [('Botox', 9, 7)])
+
+
+class StockMovementTests(TestCase):
+    def test_multi_item_movement_is_all_or_nothing(self):
+        botox = Product.objects.create(name='Botox', unit='Lọ', stock=5)
+        kim = Product.objects.create(name='Kim', unit='Cây', stock=1)
+        with self.assertRaises(InsufficientStockError):
+            move_stock([StockMovement(botox.id, 'EXPORT', 2), StockMovement(kim.id, 'EXPORT', 3)])
+        self.assertEqual(sorted(Product.objects.values_list('stock', flat=True)), [1, 5])
+        self.assertFalse(InventoryLog.objects.exists())
+
+        logs = move_stock([StockMovement(kim.id, 'IMPORT', 4), StockMovement(botox.id, 'EXPORT', 2)])
+        self.assertEqual([(l.product_id, l.quantity, l.stock_after) for l in logs], [(botox.id, -2, 3), (kim.id, 4, 5)])
+
+        log = set_stock(botox.id, 10, note="Kiểm kê: {old} -> {new}")
+        self.assertEqual((log.quantity, log.stock_after, log.note), (7, 10, "Kiểm kê: 3 -> 10"))
+        self.assertIsNone(set_stock(botox.id, 10))
+
+    def test_voucher_posts_all_lines_or_none(self):
+        self.client.force_login(User.objects.create_user(username='kho', password='x', role='ADMIN'))
+        botox = Product.objects.create(name='Botox', unit='Lọ', stock=5)
+        kim = Product.objects.create(name='Kim', unit='Cây', stock=1)
+        url = '/inventory/voucher/'
+
+        self.client.post(url, {'type': 'EXPORT', 'product_id': [botox.id, kim.id], 'quantity': [2, 3]})
+        self.assertEqual(sorted(Product.objects.values_list('stock', flat=True)), [1, 5])
+        self.assertFalse(InventoryLog.objects.exists())
+
+        # 2 dòng cùng sản phẩm được cộng dồn, dòng trống bị bỏ qua
+        self.client.post(url, {'type': 'EXPORT', 'product_id': [botox.id, kim.id, botox.id, ''], 'quantity': [2, 1, 1, '']})
+        self.assertEqual(Product.objects.get(pk=botox.id).stock, 2)
+        self.assertEqual(Product.objects.get(pk=kim.id).stock, 0)
+        self.assertEqual(InventoryLog.objects.count(), 2)
+
+
+class StockMovementConcurrencyTests(TransactionTestCase):
+    def test_parallel_exports_never_oversell_or_lose_updates(self):
+        product = Product.objects.create(name='Gạc', unit='Gói', stock=10)
+
+        def export_one():
+            try:
+                while True:
+                    try:
+                        move_stock([StockMovement(product.id, 'EXPORT', 1)])
+                        return True
+                    except InsufficientStockError:
+                        return False
+                    except OperationalError as e:
+                        # DB test SQLite in-memory (shared cache) báo "locked" ngay thay vì chờ như file DB -> thử lại
+                        if 'locked' not in str(e):
+                            raise
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: export_one(), range(25)))
+
+        self.assertEqual(results.count(True), 10)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(
+            sorted(InventoryLog.objects.values_list('stock_after', flat=True)), list(range(10)),
+        )
@@ -5,49 +5,18 @@ from django.db import models
 from django.db.models import Q, Sum, F
 from django.db.models.functions import Coalesce, Abs
 from django.utils import timezone
-from datetime import datetime
-import pandas as pd 
 
 from apps.authentication.decorators import allowed_users
-from .models import Product, InventoryLog
+from .models import Product, InventoryLog, InventoryImport
+from .importer import submit_import
+from .periods import close_pending_periods, month_bounds, opening_balance
+from .reports import movement_report
+from .services import InsufficientStockError, StockMovement, move_stock, set_stock
 
 @login_required(login_url='/auth/login/')
 @allowed_users(allowed_roles=['ADMIN', 'RECEPTIONIST'])
 def inventory_list(request):
-    # --- 1. TÍNH TOÁN SỐ LIỆU ---
-    today = timezone.now()
-    start_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    products = Product.objects.annotate(
-        import_period=Coalesce(
-            Sum('logs__quantity', filter=Q(logs__change_type='IMPORT', logs__created_at__gte=start_month)), 
-            0
-        ),
-        export_period=Abs(Coalesce(
-            Sum('logs__quantity', filter=Q(logs__change_type='EXPORT', logs__created_at__gte=start_month)), 
-            0
-        ))
-    ).annotate(
-        beginning_stock=F('stock') - F('import_period') + F('export_period')
-    ).order_by('name')
-    
-    # --- 2. LỌC & TÌM KIẾM ---
-    q = request.GET.get('q')
-    if q:
-        products = products.filter(Q(name__icontains=q) | Q(code__icontains=q))
-
-    status_filter = request.GET.get('status')
-    if status_filter == 'out_of_stock':
-        products = products.filter(stock=0)
-    elif status_filter == 'low_stock':
-        products = products.filter(stock__lte=F('min_stock'), stock__gt=0)
-    elif status_filter == 'in_stock':
-        products = products.filter(stock__gt=F('min_stock'))
-
-    total_count = Product.objects.count()
-    low_stock_count = Product.objects.filter(stock__lte=F('min_stock')).count()
-
-    # --- 3. XỬ LÝ THÊM MỚI (POST) ---
+    # --- 1. XỬ LÝ THÊM MỚI (POST) ---
     if request.method == 'POST':
         if 'add_product' in request.POST:
             name = request.POST.get('name')
@@ -70,37 +39,63 @@ def inventory_list(request):
             return redirect('inventory_list')
             
         if 'import_file' in request.FILES:
+            # [TỐI ƯU] Đọc & ghi theo lô ở thread nền (apps.inventory.importer), request trả về ngay
             excel_file = request.FILES['import_file']
             try:
-                df = pd.read_excel(excel_file)
-                count = 0
-                for index, row in df.iterrows():
-                    name = str(row.get('Ten', '')).strip()
-                    if name:
-                        unit = str(row.get('DonVi', 'Hộp')).strip()
-                        stock = int(row.get('TonDau', 0))
-                        obj, created = Product.objects.get_or_create(
-                            name=name,
-                            defaults={'unit': unit, 'stock': stock}
-                        )
-                        if created and stock > 0:
-                             InventoryLog.objects.create(
-                                product=obj, change_type='ADJUST', quantity=stock,
-                                stock_after=stock, user=request.user, note="Import Excel"
-                            )
-                        count += 1
-                messages.success(request, f"Đã nhập {count} sản phẩm!")
+                job = submit_import(excel_file, request.user)
+                if job.status == InventoryImport.Status.DONE:
+                    messages.success(request, f"Đã nhập {job.created_count} sản phẩm mới!")
+                elif job.status == InventoryImport.Status.FAILED:
+                    messages.error(request, job.errors)
+                else:
+                    messages.info(request, f"Đang nhập file {job.file_name} trong nền, kết quả sẽ hiện ở trang Kho.")
             except Exception as e:
                 messages.error(request, f"Lỗi file: {str(e)}")
             return redirect('inventory_list')
 
+    # --- 2. TÍNH TOÁN SỐ LIỆU ---
+    # [TỐI ƯU] Tồn đầu kỳ tra từ tồn đã chốt tháng trước (InventorySnapshot), không cộng dồn lại lịch sử log
+    today = timezone.localdate()
+    close_pending_periods(today)
+    start_month, _ = month_bounds(today.year, today.month)
+
+    products = Product.objects.annotate(
+        import_period=Coalesce(
+            Sum('logs__quantity', filter=Q(logs__change_type='IMPORT', logs__created_at__gte=start_month)), 
+            0
+        ),
+        export_period=Abs(Coalesce(
+            Sum('logs__quantity', filter=Q(logs__change_type='EXPORT', logs__created_at__gte=start_month)), 
+            0
+        )),
+        beginning_stock=opening_balance(start_month),
+    ).order_by('name')
+    
+    # --- 3. LỌC & TÌM KIẾM ---
+    q = request.GET.get('q')
+    if q:
+        products = products.filter(Q(name__icontains=q) | Q(code__icontains=q))
+
+    status_filter = request.GET.get('status')
+    if status_filter == 'out_of_stock':
+        products = products.filter(stock=0)
+    elif status_filter == 'low_stock':
+        products = products.filter(stock__lte=F('min_stock'), stock__gt=0)
+    elif status_filter == 'in_stock':
+        products = products.filter(stock__gt=F('min_stock'))
+
+    total_count = Product.objects.count()
+    low_stock_count = Product.objects.filter(stock__lte=F('min_stock')).count()
+
     context = {
         'products': products,
         'low_stock_count': low_stock_count,
         'total_count': total_count,
         'current_filter': status_filter,
         'search_query': q,
-        'current_month': today.month
+        'current_month': today.month,
+        'last_import': InventoryImport.objects.first(),
+        'product_choices': Product.objects.order_by('name').values('id', 'name', 'unit'),
     }
     return render(request, 'inventory/inventory_list.html', context)
 
@@ -111,32 +106,17 @@ def edit_product(request, pk):
     product = get_object_or_404(Product, pk=pk)
 
     if request.method == 'POST':
-        old_stock = product.stock
-        
-        # Cập nhật thông tin cơ bản
+        # Cập nhật thông tin cơ bản (không ghi đè cột tồn kho)
         product.name = request.POST.get('name')
         product.unit = request.POST.get('unit')
         product.min_stock = int(request.POST.get('min_stock', 0))
+        product.save(update_fields=['name', 'unit', 'min_stock', 'updated_at'])
         
-        # Xử lý sửa tồn kho (Nếu có thay đổi số lượng)
+        # Xử lý sửa tồn kho (Nếu có thay đổi số lượng) - ghi log điều chỉnh để báo cáo vẫn đúng
         new_stock_str = request.POST.get('stock')
         if new_stock_str:
-            new_stock = int(new_stock_str)
-            if new_stock != old_stock:
-                diff = new_stock - old_stock
-                product.stock = new_stock
-                
-                # Ghi log điều chỉnh (Để báo cáo vẫn đúng)
-                InventoryLog.objects.create(
-                    product=product,
-                    change_type='ADJUST',
-                    quantity=diff,
-                    stock_after=new_stock,
-                    user=request.user,
-                    note=f"Sửa sai sót: {old_stock} -> {new_stock}"
-                )
+            set_stock(product.pk, int(new_stock_str), user=request.user, note="Sửa sai sót: {old} -> {new}")
         
-        product.save()
         messages.success(request, f"Đã cập nhật thông tin: {product.name}")
         return redirect('inventory_list')
         
@@ -161,66 +141,70 @@ def inventory_transaction(request, product_id):
             messages.error(request, "Số lượng phải lớn hơn 0")
             return redirect('inventory_list')
 
-        if trans_type == 'EXPORT':
-            if product.stock < qty:
-                messages.error(request, f"Kho không đủ! Hiện còn {product.stock} {product.unit}")
-                return redirect('inventory_list')
-            product.stock -= qty
-            final_qty = -qty
-        else: 
-            product.stock += qty
-            final_qty = qty
-
-        product.save()
-
-        InventoryLog.objects.create(
-            product=product, change_type=trans_type, quantity=final_qty,
-            stock_after=product.stock, user=request.user, note=note
-        )
+        # [TỐI ƯU] Cộng/trừ kho bằng UPDATE có điều kiện (apps.inventory.services) - không mất lượt khi 2 người xuất cùng lúc
+        change_type = 'EXPORT' if trans_type == 'EXPORT' else 'IMPORT'
+        try:
+            move_stock([StockMovement(product.id, change_type, qty, note)], user=request.user)
+        except InsufficientStockError as e:
+            messages.error(request, str(e))
+            return redirect('inventory_list')
+
         messages.success(request, "Giao dịch thành công!")
         
     return redirect('inventory_list')
 
+@login_required(login_url='/auth/login/')
+@allowed_users(allowed_roles=['ADMIN', 'RECEPTIONIST'])
+def inventory_voucher(request):
+    """
+    [MỚI] Phiếu nhập / xuất nhiều sản phẩm (product_id[] + quantity[]): 1 lần move_stock cho cả phiếu,
+    thiếu hàng ở bất kỳ dòng nào -> không dòng nào được ghi.
+    """
+    if request.method != 'POST':
+        return redirect('inventory_list')
+
+    change_type = 'EXPORT' if request.POST.get('type') == 'EXPORT' else 'IMPORT'
+    note = request.POST.get('note', '')
+    quantities = {}
+    for product_id, qty_str in zip(request.POST.getlist('product_id'), request.POST.getlist('quantity')):
+        if not product_id and not qty_str:
+            continue  # dòng trống trên form
+        try:
+            product_id, qty = int(product_id), int(qty_str)
+        except ValueError:
+            qty = 0
+        if qty <= 0:
+            messages.error(request, "Mỗi dòng cần chọn sản phẩm và số lượng lớn hơn 0")
+            return redirect('inventory_list')
+        # Cùng 1 sản phẩm nhập ở nhiều dòng -> cộng dồn
+        quantities[product_id] = quantities.get(product_id, 0) + qty
+
+    if not quantities:
+        messages.error(request, "Phiếu chưa có sản phẩm nào")
+        return redirect('inventory_list')
+    if Product.objects.filter(pk__in=quantities).count() != len(quantities):
+        messages.error(request, "Có sản phẩm không tồn tại")
+        return redirect('inventory_list')
+
+    movements = [StockMovement(product_id, change_type, qty, note) for product_id, qty in quantities.items()]
+    try:
+        move_stock(movements, user=request.user)
+    except InsufficientStockError as e:
+        messages.error(request, str(e))
+        return redirect('inventory_list')
+
+    messages.success(request, f"Đã {'xuất' if change_type == 'EXPORT' else 'nhập'} {len(movements)} sản phẩm!")
+    return redirect('inventory_list')
+
 @login_required(login_url='/auth/login/')
 @allowed_users(allowed_roles=['ADMIN', 'RECEPTIONIST'])
 def inventory_report(request):
-    today = timezone.now()
+    today = timezone.localdate()
     month = int(request.GET.get('month', today.month))
     year = int(request.GET.get('year', today.year))
 
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        end_date = datetime(year, month + 1, 1)
-
-    products = Product.objects.all().order_by('name')
-    report_data = []
-
-    for p in products:
-        begin_stock = InventoryLog.objects.filter(
-            product=p, created_at__lt=start_date
-        ).aggregate(total=Coalesce(Sum('quantity'), 0))['total']
-
-        import_stock = InventoryLog.objects.filter(
-            product=p, created_at__range=[start_date, end_date], change_type='IMPORT'
-        ).aggregate(total=Coalesce(Sum('quantity'), 0))['total']
-
-        export_stock = InventoryLog.objects.filter(
-            product=p, created_at__range=[start_date, end_date], change_type='EXPORT'
-        ).aggregate(total=Coalesce(Sum('quantity'), 0))['total']
-        export_stock = abs(export_stock)
-
-        end_stock = begin_stock + import_stock - export_stock
-
-        report_data.append({
-            'name': p.name,
-            'unit': p.unit,
-            'begin': begin_stock,
-            'import': import_stock,
-            'export': export_stock,
-            'end': end_stock
-        })
+    # [TỐI ƯU] 1 truy vấn GROUP BY cho cả báo cáo (apps.inventory.reports)
+    report_data = movement_report(year, month)
 
     context = {
         'report_data': report_data,
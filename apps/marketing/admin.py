@@ -1,11 +1,11 @@
 from django.contrib import admin
 from django.utils import timezone
-from .models import DailyCampaignStat, MarketingTask, ContentAd
+from .models import DailyCampaignStat, MarketingTask, ContentAd, MetaEventOutbox, MetaOfflineExport
 
 @admin.register(DailyCampaignStat)
 class DailyCampaignStatAdmin(admin.ModelAdmin):
     list_display = ('report_date', 'marketer', 'service', 'spend_amount', 'leads', 'cost_per_lead')
-    list_filter = ('report_date', 'marketer', 'service')
+    list_filter = ('report_date', 'marketer_user', 'fanpage', 'service')
     search_fields = ('marketer', 'service')
     date_hierarchy = 'report_date'
 
@@ -28,4 +28,23 @@ class ContentAdAdmin(admin.ModelAdmin):
     list_display = ('title', 'ad_headline', 'content_creator', 'editor', 'marketer', 'created_at')
     list_filter = ('content_creator', 'editor', 'marketer', 'created_at')
     search_fields = ('title', 'ad_headline', 'post_content')
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    date_hierarchy = 'created_at'
+
+
+@admin.register(MetaEventOutbox)
+class MetaEventOutboxAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'order', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('event_id',)
+    readonly_fields = ('payload', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    @admin.action(description='Gửi lại ngay')
+    def retry_now(self, request, queryset):
+        queryset.update(status=MetaEventOutbox.Status.PENDING, next_attempt_at=timezone.now())
+
+
+@admin.register(MetaOfflineExport)
+class MetaOfflineExportAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'mode', 'date_start', 'date_end', 'row_count', 'last_event_id', 'created_by')
+    list_filter = ('mode',)
@@ -0,0 +1,65 @@
+"""
+Phân bổ lead / lịch hẹn / đơn hàng / doanh thu cho các Fanpage nguồn của khách.
+
+Khách tick nhiều Fanpage được chia đều 1/n cho từng Fanpage.
+[TỐI ƯU] Bảng nối Customer.fanpages được đọc 1 lần cho cả báo cáo thành map khách -> Fanpage
+(không gọi fanpages.all() / .count() theo từng dòng), sau đó cộng dồn tỉ trọng trong 1 vòng lặp.
+Dùng chung cho rollup DailyFact (marketing_report), marketing_dashboard và Order.allocated_marketing_revenue.
+"""
+from collections import defaultdict
+
+from apps.customers.models import Customer
+
+# Giới hạn số tham số trong mệnh đề IN khi đọc bảng nối
+ID_CHUNK_SIZE = 900
+
+
+def customer_pages(customer_ids, field='fanpage__code'):
+    """{customer_id: [giá trị `field` của từng Fanpage đã tick]} - khách không tick Fanpage nào không có trong map."""
+    pages = defaultdict(list)
+    ids = [cid for cid in set(customer_ids) if cid is not None]
+    through = Customer.fanpages.through
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        rows = through.objects.filter(customer_id__in=ids[i:i + ID_CHUNK_SIZE]).values_list('customer_id', field)
+        for customer_id, value in rows:
+            pages[customer_id].append(value)
+    return dict(pages)
+
+
+def fanpage_shares(customer_ids, field='fanpage__code'):
+    """{customer_id: [(Fanpage, tỉ trọng 1/n)]}."""
+    return {
+        cid: [(value, 1 / len(values)) for value in values]
+        for cid, values in customer_pages(customer_ids, field).items()
+    }
+
+
+def attribute(events, shares, unassigned=''):
+    """
+    Cộng dồn các sự kiện (customer_id, {chỉ số: giá trị}) theo Fanpage: {Fanpage: {chỉ số: tổng}}.
+    Khách chưa tick Fanpage nào được ghi trọn vẹn vào `unassigned`.
+    """
+    totals = defaultdict(lambda: defaultdict(float))
+    fallback = [(unassigned, 1.0)]
+    for customer_id, values in events:
+        for page, weight in shares.get(customer_id) or fallback:
+            row = totals[page]
+            for measure, value in values.items():
+                row[measure] += value * weight
+    return totals
+
+
+def allocated_revenue(orders):
+    """
+    {order.pk: doanh thu ghi nhận cho mỗi Fanpage của khách} cho cả danh sách đơn (1 lần đọc bảng nối).
+    Khách chưa tick Fanpage: nguồn Facebook nhận trọn doanh thu, nguồn khác 0.
+    """
+    counts = {cid: len(pages) for cid, pages in customer_pages(o.customer_id for o in orders).items()}
+    result = {}
+    for order in orders:
+        num_pages = counts.get(order.customer_id)
+        if num_pages:
+            result[order.pk] = order.actual_revenue / num_pages
+        else:
+            result[order.pk] = order.actual_revenue if order.customer.source == Customer.Source.FACEBOOK else 0
+    return result
@@ -9,8 +9,8 @@ class ContentAdForm(forms.ModelForm):
 class DailyStatForm(forms.ModelForm):
     class Meta:
         model = DailyCampaignStat
-        # Loại trừ revenue_ads và created_at
-        exclude = ['revenue_ads', 'created_at'] 
+        # Loại trừ revenue_ads và created_at; tên người chạy (marketer) tự lấy theo nhân sự đã chọn
+        exclude = ['revenue_ads', 'created_at', 'marketer']
         
         widgets = {
             'report_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'}),
@@ -18,7 +18,8 @@ class DailyStatForm(forms.ModelForm):
             # --- THÊM WIDGET CHO PLATFORM ---
             'platform': forms.Select(attrs={'class': 'form-select form-select-sm fw-bold'}),
             
-            'marketer': forms.TextInput(attrs={'class': 'form-control form-control-sm'}),
+            'marketer_user': forms.Select(attrs={'class': 'form-select form-select-sm'}),
+            'fanpage': forms.Select(attrs={'class': 'form-select form-select-sm'}),
             'service': forms.TextInput(attrs={'class': 'form-control form-control-sm'}),
             'spend_amount': forms.NumberInput(attrs={'class': 'form-control form-control-sm fw-bold'}),
             
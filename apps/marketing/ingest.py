@@ -0,0 +1,318 @@
+"""
+Nhập số liệu Ads hàng loạt vào DailyCampaignStat từ file xuất của Facebook / Google / TikTok.
+
+- Nhận CSV (kể cả bản UTF-16 / tab của Google Ads, có dòng tiêu đề báo cáo phía trên) hoặc JSON
+  (danh sách dòng, {"data": [...]} của Graph API, {"data": {"list": [...]}} của TikTok API),
+  giữ nguyên tên cột gốc của từng nền tảng (tiếng Anh / tiếng Việt / tên trường API).
+- Khoá mỗi dòng là ID: (ngày, nền tảng, nhân sự, Fanpage, chiến dịch) - `marketer` chỉ là tên hiển thị.
+  Các dòng cùng khoá - VD file xuất theo nhóm QC / QC - được cộng dồn.
+  Tên người chạy trong file (nếu không truyền `marketer`) được ghép với nhân sự theo Họ Tên / username,
+  chỉ khi tên trỏ đúng 1 người; không ghép được thì báo lỗi dòng đó.
+- [TỐI ƯU] Mỗi lô BATCH_SIZE khoá: 1 truy vấn đọc dòng đã có (để trả về diff từng dòng) +
+  1 lệnh bulk_create(update_conflicts=True), tất cả trong 1 transaction.
+  Chỉ ghi đè các chỉ số có trong file (VD file Google không có Bình luận thì giữ số đã nhập tay).
+"""
+import csv
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from .models import DailyCampaignStat, marketer_name
+
+BATCH_SIZE = 500
+
+Platform = DailyCampaignStat.Platform
+
+KEY_FIELDS = ['report_date', 'platform', 'marketer_key', 'fanpage_key', 'service']
+METRIC_FIELDS = ('spend_amount', 'impressions', 'clicks', 'views', 'inboxes', 'comments', 'leads')
+
+# Cột trong file xuất gốc -> trường DailyCampaignStat (so khớp không phân biệt hoa thường)
+COMMON_COLUMNS = {
+    'marketer': ('Marketer', 'Người chạy Ads'),
+}
+PLATFORM_COLUMNS = {
+    Platform.FACEBOOK: {
+        'report_date': ('Day', 'Reporting starts', 'Ngày', 'Bắt đầu báo cáo', 'date_start'),
+        'service': ('Campaign name', 'Tên chiến dịch', 'campaign_name'),
+        'spend_amount': ('Amount spent (VND)', 'Số tiền đã chi tiêu (VND)', 'spend'),
+        'impressions': ('Impressions', 'Lượt hiển thị', 'impressions'),
+        'clicks': ('Link clicks', 'Lượt click vào liên kết', 'inline_link_clicks'),
+        'views': ('ThruPlays', 'Lượt ThruPlay', 'video_thruplay_watched_actions:video_view'),
+        'inboxes': (
+            'Messaging conversations started', 'Số cuộc trò chuyện qua tin nhắn được bắt đầu',
+            'actions:onsite_conversion.messaging_conversation_started_7d',
+        ),
+        'comments': ('Post comments', 'Bình luận về bài viết', 'actions:comment'),
+        'leads': ('Leads', 'On-Facebook leads', 'Khách hàng tiềm năng', 'actions:lead'),
+    },
+    Platform.GOOGLE: {
+        'report_date': ('Day', 'Ngày', 'segments.date'),
+        'service': ('Campaign', 'Chiến dịch', 'campaign.name'),
+        'spend_amount': ('Cost', 'Chi phí', 'metrics.cost'),
+        'impressions': ('Impr.', 'Impressions', 'Số lượt hiển thị', 'metrics.impressions'),
+        'clicks': ('Clicks', 'Số lượt nhấp', 'metrics.clicks'),
+        'views': ('Views', 'Video views', 'Lượt xem', 'metrics.video_views'),
+        'leads': ('Conversions', 'Lượt chuyển đổi', 'metrics.conversions'),
+    },
+    Platform.TIKTOK: {
+        'report_date': ('By Day', 'Date', 'Ngày', 'stat_time_day'),
+        'service': ('Campaign name', 'Tên chiến dịch', 'campaign_name'),
+        'spend_amount': ('Cost', 'Chi phí', 'spend'),
+        'impressions': ('Impressions', 'Lượt hiển thị', 'impressions'),
+        'clicks': ('Clicks (Destination)', 'Clicks', 'Lượt nhấp', 'clicks'),
+        'views': ('Video views', 'Lượt xem video', 'video_play_actions'),
+        'comments': ('Comments', 'Bình luận', 'comments'),
+        'leads': ('Conversions', 'Results', 'Chuyển đổi', 'conversion'),
+    },
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%b %d, %Y', '%Y/%m/%d')
+
+
+@dataclass
+class IngestResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)  # [(dòng, lỗi)]
+    rows: list = field(default_factory=list)  # diff từng dòng: {'line', 'action', khoá..., 'changes'}
+
+
+def _norm(header):
+    return ' '.join(str(header or '').split()).casefold()
+
+
+def column_map(platform):
+    """{tên cột đã chuẩn hoá: trường} của 1 nền tảng."""
+    columns = dict(COMMON_COLUMNS, **PLATFORM_COLUMNS[platform])
+    return {_norm(alias): name for name, aliases in columns.items() for alias in aliases}
+
+
+def _flatten(item):
+    """Dòng JSON của API -> dict phẳng: gộp dimensions/metrics (TikTok), actions[] -> 'actions:<loại>' (Graph API)."""
+    flat = {}
+    for key, value in item.items():
+        if isinstance(value, dict) and key in ('dimensions', 'metrics'):
+            flat.update(value)
+        elif isinstance(value, list):
+            for action in value:
+                if isinstance(action, dict) and 'action_type' in action:
+                    flat[f"{key}:{action['action_type']}"] = action.get('value')
+        else:
+            flat[key] = value
+    return flat
+
+
+def read_json_rows(data):
+    """Sinh (số dòng, dict) từ JSON; phần tử không phải object -> (số dòng, None) để ghi lỗi dòng đó."""
+    payload = json.loads(data.decode('utf-8-sig'))
+    if isinstance(payload, dict):
+        payload = payload.get('data', [])
+        if isinstance(payload, dict):
+            payload = payload.get('list', [])
+    if not isinstance(payload, list):
+        raise ValueError("JSON không có danh sách dòng số liệu")
+    for line, item in enumerate(payload, start=1):
+        yield line, _flatten(item) if isinstance(item, dict) else None
+
+
+def read_csv_rows(data, date_headers):
+    """Sinh (số dòng, dict) từ CSV. Dòng tiêu đề là dòng đầu tiên có cột ngày (bỏ qua phần mô tả báo cáo phía trên)."""
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        text = data.decode('utf-16')
+    else:
+        text = data.decode('utf-8-sig')
+    lines = text.splitlines()
+    sample = next((l for l in lines if l.strip()), '')
+    delimiter = max('\t;,', key=sample.count)
+    reader = csv.reader(lines, delimiter=delimiter)
+    header = None
+    for values in reader:
+        if header is None:
+            if date_headers & {_norm(v) for v in values}:
+                header = values
+            continue
+        if any(v.strip() for v in values):
+            yield reader.line_num, dict(zip(header, values))
+    if header is None:
+        raise ValueError("Không tìm thấy dòng tiêu đề (cột Ngày) trong file")
+
+
+def read_rows(data, filename, platform):
+    """data: nội dung file (bytes). File .json hoặc nội dung bắt đầu bằng [ / { được đọc như JSON."""
+    if filename.lower().endswith('.json') or data.lstrip()[:1] in (b'[', b'{'):
+        return read_json_rows(data)
+    mapping = column_map(platform)
+    return read_csv_rows(data, {alias for alias, name in mapping.items() if name == 'report_date'})
+
+
+def parse_number(value):
+    """'1,234,567' / '1.234.567 ₫' / '1,234.50' / 12.5 -> Decimal; ô trống / '--' -> 0."""
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    text = ''.join(ch for ch in str(value or '') if ch.isdigit() or ch in ',.-')
+    if not text.strip('-.,'):
+        return Decimal(0)
+    if ',' in text and '.' in text:
+        # Dấu xuất hiện sau cùng là dấu thập phân
+        thousands = ',' if text.rfind(',') < text.rfind('.') else '.'
+        text = text.replace(thousands, '').replace(',', '.')
+    else:
+        for sep in ',.':
+            parts = text.split(sep)
+            if len(parts) > 2 or (len(parts) == 2 and len(parts[1]) == 3):
+                text = text.replace(sep, '')  # dấu phân cách hàng nghìn
+            elif len(parts) == 2:
+                text = text.replace(sep, '.')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Số không hợp lệ: {value}")
+
+
+def parse_date(value):
+    text = str(value or '').strip()
+    for candidate in (text, text[:10]):  # '2026-03-10 00:00:00' (TikTok API) -> lấy phần ngày
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).date()
+            except ValueError:
+                continue
+    raise ValueError(f"Ngày không hợp lệ: {value}")
+
+
+def _marketer_lookup():
+    """{Họ Tên / username đã chuẩn hoá: User} của nhân sự chạy Ads - tên trỏ tới nhiều người thì bỏ (không đoán)."""
+    found = {}
+    for user in get_user_model().objects.filter(role__in=['ADMIN', 'MARKETING']):
+        for name in {marketer_name(user), user.username}:
+            found.setdefault(_norm(name), []).append(user)
+    return {name: users[0] for name, users in found.items() if len(users) == 1}
+
+
+def _collect(rows, platform, marketer, fanpage, result):
+    """
+    Đọc & cộng dồn các dòng theo khoá (ngày, nền tảng, ID nhân sự, ID Fanpage, chiến dịch).
+    Trả về ({khoá: [dòng đầu, {chỉ số}, tên hiển thị]}, các chỉ số có trong file).
+    """
+    mapping = column_map(platform)
+    grouped = OrderedDict()
+    present = set()
+    lookup = None
+    fanpage_id = fanpage.pk if fanpage else 0
+    for line, raw in rows:
+        if raw is None:
+            result.errors.append((line, "Dòng không đúng định dạng (cần object JSON)"))
+            continue
+        values = {}
+        for column, value in raw.items():
+            name = mapping.get(_norm(column))
+            if name:
+                values[name] = value
+        day = str(values.get('report_date') or '').strip()
+        if not any(ch.isdigit() for ch in day):
+            continue  # dòng tổng cuối file (Google: "Total: Account" / ngày "--") - không tính là lỗi
+        try:
+            report_date = parse_date(day)
+            metrics = {name: parse_number(values[name]) for name in METRIC_FIELDS if name in values}
+        except ValueError as e:
+            result.errors.append((line, str(e)))
+            continue
+
+        user = marketer
+        label = str(values.get('marketer') or '').strip()
+        if user is None and label:
+            if lookup is None:
+                lookup = _marketer_lookup()
+            user = lookup.get(_norm(label))
+            if user is None:
+                result.errors.append((line, f"Không xác định được nhân sự chạy Ads: {label}"))
+                continue
+        present.update(metrics)
+        key = (report_date, platform, user.pk if user else 0, fanpage_id, str(values.get('service') or '').strip()[:200])
+        if key in grouped:
+            totals = grouped[key][1]
+            for name, amount in metrics.items():
+                totals[name] = totals.get(name, 0) + amount
+        else:
+            grouped[key] = [line, metrics, marketer_name(user) if user else '']
+    return grouped, [name for name in METRIC_FIELDS if name in present]
+
+
+def _whole(amount):
+    """Tiền VNĐ & số đếm đều lưu số nguyên."""
+    return int(Decimal(amount).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def _existing(keys):
+    """{khoá: DailyCampaignStat} cho 1 lô khoá (1 truy vấn)."""
+    dates, platforms, marketers, fanpages, services = (set(part) for part in zip(*keys))
+    rows = DailyCampaignStat.objects.filter(
+        report_date__in=dates, platform__in=platforms, marketer_key__in=marketers,
+        fanpage_key__in=fanpages, service__in=services,
+    )
+    wanted = set(keys)
+    found = {}
+    for stat in rows:
+        key = (stat.report_date, stat.platform, stat.marketer_key, stat.fanpage_key, stat.service)
+        if key in wanted:
+            found[key] = stat
+    return found
+
+
+def ingest_stats(rows, platform, marketer=None, fanpage=None, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Upsert các dòng (số dòng, dict) vào DailyCampaignStat theo (ngày, nền tảng, nhân sự, Fanpage, chiến dịch).
+    marketer: User chạy các chiến dịch trong file (file xuất của nền tảng không có cột này).
+    fanpage: Fanpage của các chiến dịch trong file (không bắt buộc).
+    dry_run=True: chỉ trả về diff, không ghi.
+    """
+    if platform not in PLATFORM_COLUMNS:
+        raise ValueError(f"Chưa hỗ trợ nền tảng: {platform}")
+    result = IngestResult()
+    grouped, fields = _collect(rows, platform, marketer, fanpage, result)
+    if not fields:
+        if grouped:
+            result.errors.append((0, "File không có cột chỉ số nào của nền tảng này"))
+        return result
+
+    # Tên hiển thị luôn theo tên hiện tại của nhân sự
+    options = {'update_conflicts': True, 'update_fields': fields + ['marketer']}
+    # MySQL (ON DUPLICATE KEY UPDATE) không cho chỉ định cột unique, tự dựa vào ràng buộc khoá
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = KEY_FIELDS
+
+    items = list(grouped.items())
+    with transaction.atomic():
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            existing = _existing([key for key, _ in batch])
+            objs = []
+            for key, (line, metrics, label) in batch:
+                new = {name: _whole(metrics.get(name, 0)) for name in fields}
+                report_date, _, marketer_id, fanpage_id, service = key
+                old = existing.get(key)
+                if old is None:
+                    action, changes = 'created', {name: [None, value] for name, value in new.items()}
+                else:
+                    changes = {name: [_whole(getattr(old, name)), value] for name, value in new.items() if getattr(old, name) != value}
+                    action = 'updated' if changes else 'unchanged'
+                setattr(result, action, getattr(result, action) + 1)
+                result.rows.append({
+                    'line': line, 'action': action, 'report_date': report_date.isoformat(),
+                    'marketer': label, 'service': service, 'changes': changes,
+                })
+                if action != 'unchanged':
+                    objs.append(DailyCampaignStat(
+                        report_date=report_date, platform=platform, service=service, marketer=label,
+                        marketer_user_id=marketer_id or None, fanpage_id=fanpage_id or None,
+                        marketer_key=marketer_id, fanpage_key=fanpage_id, **new
+                    ))
+            if objs and not dry_run:
+                DailyCampaignStat.objects.bulk_create(objs, **options)
+    return result
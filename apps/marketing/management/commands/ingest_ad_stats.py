@@ -0,0 +1,61 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.customers.models import Fanpage
+from apps.marketing.ingest import BATCH_SIZE, PLATFORM_COLUMNS, ingest_stats, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Nhập số liệu Ads (DailyCampaignStat) từ file CSV / JSON xuất từ Facebook, Google hoặc TikTok'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Đường dẫn file CSV / JSON')
+        parser.add_argument('--platform', required=True, choices=[str(p) for p in PLATFORM_COLUMNS], help='Nền tảng của file')
+        parser.add_argument('--marketer', type=str, help='Username người chạy các chiến dịch trong file')
+        parser.add_argument('--fanpage', type=str, help='Mã Fanpage của các chiến dịch trong file')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Số dòng mỗi lô upsert')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ in diff, không ghi')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        marketer = None
+        if options['marketer']:
+            marketer = get_user_model().objects.filter(username=options['marketer']).first()
+            if marketer is None:
+                raise CommandError(f"Không tìm thấy nhân sự: {options['marketer']}")
+
+        fanpage = None
+        if options['fanpage']:
+            fanpage = Fanpage.objects.filter(code=options['fanpage']).first()
+            if fanpage is None:
+                raise CommandError(f"Không tìm thấy Fanpage: {options['fanpage']}")
+
+        self.stdout.write(self.style.SUCCESS(f"Bắt đầu nhập số liệu {options['platform']} từ {path}..."))
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            result = ingest_stats(
+                read_rows(data, path, options['platform']), options['platform'], marketer=marketer, fanpage=fanpage,
+                batch_size=options['batch_size'], dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for row in result.rows:
+            if row['action'] == 'unchanged':
+                continue
+            changes = ', '.join(f"{name}: {old} -> {new}" for name, (old, new) in row['changes'].items())
+            self.stdout.write(f"--- [{row['action']}] {row['report_date']} | {row['marketer']} | {row['service']}: {changes}")
+        for line, message in result.errors:
+            self.stdout.write(self.style.WARNING(f"--- Dòng {line}: {message}"))
+
+        action = "Xem trước" if options['dry_run'] else "Đã nhập"
+        self.stdout.write(self.style.SUCCESS(
+            f"=== HOÀN THÀNH: {action} - mới {result.created}, cập nhật {result.updated}, "
+            f"không đổi {result.unchanged}, lỗi {len(result.errors)} ==="
+        ))
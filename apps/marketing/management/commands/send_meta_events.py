@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.marketing.meta_capi import MAX_EVENTS_PER_REQUEST, deliver_outbox_batch, get_session
+
+
+class Command(BaseCommand):
+    help = 'Gửi các sự kiện trong hàng đợi MetaEventOutbox lên Meta CAPI theo lô (chạy qua cron hoặc --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help=f'Số sự kiện mỗi request (tối đa {MAX_EVENTS_PER_REQUEST})')
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục như 1 worker')
+        parser.add_argument('--sleep', type=int, default=10, help='Số giây nghỉ khi hàng đợi trống (chế độ --loop)')
+
+    def handle(self, *args, **options):
+        session = get_session()
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = deliver_outbox_batch(options['batch_size'], session=session)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"--- Lô: gửi {sent}, lỗi {failed}")
+            if sent:
+                continue
+            # Hàng đợi trống, hoặc Graph API đang lỗi -> không dồn thêm request, chờ lượt sau
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã gửi {total_sent} sự kiện, lỗi {total_failed}! ==="))
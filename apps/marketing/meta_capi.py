@@ -4,7 +4,14 @@ import time
 import re
 import unicodedata
 import logging
+from datetime import timedelta
+
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.marketing.models import MetaEventOutbox
 
 logger = logging.getLogger(__name__)
 
@@ -51,11 +58,33 @@ def split_vietnamese_name(full_name):
     last_name = " ".join(parts[:-1])
     return first_name, last_name
 
-def send_purchase_event_to_meta(customer, amount, order_id=None, event_time=None):
+# CAPI nhận tối đa 1000 sự kiện trong mảng `data` của 1 request
+MAX_EVENTS_PER_REQUEST = 1000
+
+# Thử lại theo cấp số nhân: 1 phút, 2 phút, 4 phút... tối đa 6 giờ; quá MAX_ATTEMPTS lần -> FAILED
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 3600
+MAX_ATTEMPTS = 10
+# Thời gian "giữ chỗ" lô đang gửi để worker khác không lấy trùng
+CLAIM_SECONDS = 300
+
+_session = None
+
+
+def get_session():
+    """Session HTTP dùng chung (giữ kết nối keep-alive tới Graph API giữa các lô)."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def build_purchase_event(customer, amount, order_id=None, event_time=None):
     """
-    Hàm gửi Purchase tối ưu cho dữ liệu SĐT + Tên khách hàng
+    Dựng 1 sự kiện Purchase (phần tử của mảng `data`) tối ưu cho dữ liệu SĐT + Tên khách hàng
     """
-    url = f"https://graph.facebook.com/v25.0/{settings.META_DATASET_ID}/events"
     user_data = {}
 
     # 1. Số điện thoại (ph) - Trường quan trọng nhất của bạn
@@ -92,24 +121,130 @@ def send_purchase_event_to_meta(customer, amount, order_id=None, event_time=None
     # Thời gian sự kiện
     event_time_ts = int(event_time.timestamp()) if event_time and hasattr(event_time, 'timestamp') else int(time.time())
 
-    payload = {
-        "data": [{
-            "event_name": "Purchase",
-            "event_time": event_time_ts,
-            "action_source": "system_generated",
-            "event_id": str(order_id) if order_id else f"order_{int(time.time())}",
-            "user_data": user_data,
-            "custom_data": {
-                "currency": "VND",
-                "value": float(amount)
-            }
-        }],
-        "access_token": settings.META_ACCESS_TOKEN
+    return {
+        "event_name": "Purchase",
+        "event_time": event_time_ts,
+        "action_source": "system_generated",
+        "event_id": str(order_id) if order_id else f"order_{int(time.time())}",
+        "user_data": user_data,
+        "custom_data": {
+            "currency": "VND",
+            "value": float(amount)
+        }
     }
-    
+
+
+def send_events_batch(events, session=None):
+    """
+    Gửi 1 lô sự kiện (tối đa MAX_EVENTS_PER_REQUEST) trong 1 request.
+    Trả về JSON phản hồi; ném requests.RequestException nếu lỗi mạng / HTTP lỗi.
+    """
+    url = f"https://graph.facebook.com/v25.0/{settings.META_DATASET_ID}/events"
+    payload = {"data": list(events), "access_token": settings.META_ACCESS_TOKEN}
+    response = (session or get_session()).post(url, json=payload, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def send_purchase_event_to_meta(customer, amount, order_id=None, event_time=None):
+    """
+    Gửi ngay 1 sự kiện Purchase (đồng bộ). Luồng checkout KHÔNG gọi hàm này nữa mà ghi vào
+    hàng đợi MetaEventOutbox (xem enqueue_purchase_event) để worker `send_meta_events` gửi theo lô.
+    """
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        return response.json()
+        return send_events_batch([build_purchase_event(customer, amount, order_id, event_time)])
     except Exception as e:
         logger.error(f"Lỗi gửi CAPI: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def enqueue_purchase_event(order, amount=None, event_id=None):
+    """
+    Ghi sự kiện Purchase của đơn hàng vào hàng đợi (cùng transaction với đơn hàng).
+    event_id = ID đơn hàng nên mỗi đơn chỉ có 1 sự kiện; lưu lại nhiều lần chỉ cập nhật payload khi chưa gửi.
+    Checkout nhiều dịch vụ (apps.sales.checkout) gửi 1 sự kiện cho cả lần chốt: truyền tổng tiền + event_id riêng.
+    """
+    event = build_purchase_event(order.customer, order.total_amount if amount is None else amount, order_id=event_id or order.id)
+    outbox, created = MetaEventOutbox.objects.get_or_create(
+        event_id=event["event_id"], defaults={'order': order, 'payload': event}
+    )
+    if created or outbox.status != MetaEventOutbox.Status.PENDING:
+        return outbox
+    # Giữ nguyên thời điểm phát sinh sự kiện ban đầu, chỉ cập nhật giá trị mới nhất
+    event["event_time"] = outbox.payload.get("event_time", event["event_time"])
+    if outbox.payload != event:
+        outbox.payload = event
+        outbox.save(update_fields=['payload'])
+    return outbox
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def claim_due_events(limit):
+    """Lấy & giữ chỗ 1 lô sự kiện đến hạn gửi. Trả về [(id, payload, attempts)]."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = MetaEventOutbox.objects.filter(
+            status=MetaEventOutbox.Status.PENDING, next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        rows = list(due.values_list('id', 'payload', 'attempts')[:limit])
+        if rows:
+            MetaEventOutbox.objects.filter(id__in=[r[0] for r in rows]).update(next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS))
+    return rows
+
+
+def _send_rows(rows, session, sent, failures):
+    """
+    Gửi các dòng hàng đợi. Meta từ chối cả lô khi chỉ 1 sự kiện sai dữ liệu (4xx) -> chia đôi lô và gửi lại
+    từng nửa để chỉ sự kiện lỗi bị đánh dấu. Lỗi mạng / 5xx / 429 -> cả lô được thử lại sau.
+    sent: [id đã gửi]; failures: [(các dòng, lỗi, có thử lại không)].
+    """
+    try:
+        send_events_batch([payload for _, payload, _ in rows], session=session)
+    except requests.RequestException as e:
+        response = getattr(e, 'response', None)
+        error = str(e) if response is None else f"{e} | {response.text[:1000]}"
+        retryable = response is None or response.status_code >= 500 or response.status_code == 429
+        if not retryable and len(rows) > 1:
+            middle = len(rows) // 2
+            _send_rows(rows[:middle], session, sent, failures)
+            _send_rows(rows[middle:], session, sent, failures)
+            return
+        logger.error(f"Lỗi gửi lô CAPI ({len(rows)} sự kiện): {error}")
+        failures.append((rows, error, retryable))
+        return
+    sent.extend(event_pk for event_pk, _, _ in rows)
+
+
+def deliver_outbox_batch(batch_size=MAX_EVENTS_PER_REQUEST, session=None):
+    """
+    Gửi 1 lô sự kiện đến hạn trong hàng đợi bằng 1 request (chia nhỏ lô khi Meta từ chối dữ liệu, xem _send_rows).
+    Trả về (số sự kiện đã gửi, số sự kiện lỗi); (0, 0) khi hàng đợi trống.
+    """
+    rows = claim_due_events(min(batch_size, MAX_EVENTS_PER_REQUEST))
+    if not rows:
+        return 0, 0
+
+    sent, failures = [], []
+    _send_rows(rows, session, sent, failures)
+
+    now = timezone.now()
+    if sent:
+        MetaEventOutbox.objects.filter(id__in=sent).update(
+            status=MetaEventOutbox.Status.SENT, sent_at=now, attempts=F('attempts') + 1, last_error=''
+        )
+    for failed_rows, error, retryable in failures:
+        by_attempts = {}
+        for event_pk, _, attempts in failed_rows:
+            by_attempts.setdefault(attempts + 1, []).append(event_pk)
+        for attempts, ids in by_attempts.items():
+            # Dữ liệu bị từ chối (4xx) thì gửi lại cũng lỗi -> dừng luôn
+            status = MetaEventOutbox.Status.PENDING if retryable and attempts < MAX_ATTEMPTS else MetaEventOutbox.Status.FAILED
+            MetaEventOutbox.objects.filter(id__in=ids).update(
+                attempts=attempts, status=status, last_error=error, next_attempt_at=now + retry_delay(attempts)
+            )
+    return len(sent), len(rows) - len(sent)
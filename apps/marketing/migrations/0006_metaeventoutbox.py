@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0005_dailycampaignstat_clicks_and_more'),
+        ('sales', '0009_merge_0003_order_order_date_index_0008_order_digitals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaEventOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True, verbose_name='Event ID (chống trùng)')),
+                ('payload', models.JSONField(verbose_name='Dữ liệu sự kiện')),
+                ('status', models.CharField(choices=[('PENDING', 'Chờ gửi'), ('SENT', 'Đã gửi'), ('FAILED', 'Lỗi (hết lượt thử)')], default='PENDING', max_length=10, verbose_name='Trạng thái')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Số lần đã thử')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Thử lại lúc')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Gửi thành công lúc')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='meta_events', to='sales.order', verbose_name='Đơn hàng')),
+            ],
+            options={
+                'verbose_name': 'Sự kiện Meta CAPI',
+                'verbose_name_plural': 'Hàng đợi Meta CAPI',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='marketing_capi_due_idx')],
+            },
+        ),
+    ]
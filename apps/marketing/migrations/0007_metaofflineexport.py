@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0006_metaeventoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaOfflineExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('ALL', 'Toàn bộ'), ('RANGE', 'Theo khoảng ngày'), ('SINCE_LAST', 'Từ lần xuất trước')], default='ALL', max_length=10, verbose_name='Kiểu xuất')),
+                ('date_start', models.DateField(blank=True, null=True, verbose_name='Từ ngày')),
+                ('date_end', models.DateField(blank=True, null=True, verbose_name='Đến ngày')),
+                ('last_event_id', models.BigIntegerField(default=0, verbose_name='Mốc sự kiện CAPI')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Số dòng')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Người xuất')),
+            ],
+            options={
+                'verbose_name': 'Lần xuất CSV Meta Offline',
+                'verbose_name_plural': 'Lịch sử xuất CSV Meta Offline',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
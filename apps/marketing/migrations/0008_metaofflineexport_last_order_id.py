@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0007_metaofflineexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metaofflineexport',
+            name='last_order_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Mốc đơn hàng'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _normalize(name):
+    return ' '.join(str(name).split()).casefold()
+
+
+def link_marketers(apps, schema_editor):
+    # Ghép tên "Người chạy Ads" đã nhập tay với nhân sự Ads (ADMIN/MARKETING) 1 lần: Họ Tên / Tên Họ / username.
+    # Không ghép theo riêng Tên (vd "Hoa") - dễ trùng người; chỉ ghép khi tên trỏ đúng 1 người,
+    # còn lại để trống cho Marketing chọn lại.
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    DailyCampaignStat = apps.get_model('marketing', 'DailyCampaignStat')
+
+    candidates = {}
+    users = User.objects.filter(role__in=['ADMIN', 'MARKETING']).values_list('id', 'username', 'first_name', 'last_name')
+    for user_id, username, first_name, last_name in users:
+        for key in {f"{last_name} {first_name}", f"{first_name} {last_name}", username}:
+            key = _normalize(key)
+            if key:
+                candidates.setdefault(key, set()).add(user_id)
+
+    names = DailyCampaignStat.objects.exclude(marketer__isnull=True).exclude(marketer='').values_list('marketer', flat=True).distinct()
+    for name in list(names):
+        user_ids = candidates.get(_normalize(name), set())
+        if len(user_ids) == 1:
+            DailyCampaignStat.objects.filter(marketer=name).update(marketer_user_id=user_ids.pop())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0019_customer_total_spent'),
+        ('marketing', '0008_metaofflineexport_last_order_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailycampaignstat',
+            name='fanpage',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaign_stats', to='customers.fanpage', verbose_name='Fanpage'),
+        ),
+        migrations.AddField(
+            model_name='dailycampaignstat',
+            name='marketer_user',
+            field=models.ForeignKey(blank=True, limit_choices_to={'role__in': ['ADMIN', 'MARKETING']}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaign_stats', to=settings.AUTH_USER_MODEL, verbose_name='Marketer (Nhân sự)'),
+        ),
+        migrations.RunPython(link_marketers, migrations.RunPython.noop),
+    ]
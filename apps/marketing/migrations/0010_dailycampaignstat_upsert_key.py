@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+METRICS = (
+    'spend_amount', 'impressions', 'clicks', 'views', 'inboxes', 'comments',
+    'leads', 'appointments', 'revenue_ads',
+)
+
+
+def merge_duplicate_stats(apps, schema_editor):
+    # Dòng nhập tay trùng (ngày, nền tảng, người chạy, chiến dịch) được cộng dồn vào dòng mới nhất
+    DailyCampaignStat = apps.get_model('marketing', 'DailyCampaignStat')
+    DailyCampaignStat.objects.filter(marketer__isnull=True).update(marketer='')
+    DailyCampaignStat.objects.filter(service__isnull=True).update(service='')
+
+    key = ('report_date', 'platform', 'marketer', 'service')
+    duplicates = DailyCampaignStat.objects.values(*key).annotate(n=models.Count('id')).filter(n__gt=1)
+    for group in duplicates:
+        rows = list(DailyCampaignStat.objects.filter(**{k: group[k] for k in key}).order_by('-id'))
+        keep, others = rows[0], rows[1:]
+        for row in others:
+            for name in METRICS:
+                setattr(keep, name, getattr(keep, name) + getattr(row, name))
+            keep.marketer_user_id = keep.marketer_user_id or row.marketer_user_id
+            keep.fanpage_id = keep.fanpage_id or row.fanpage_id
+        keep.save()
+        DailyCampaignStat.objects.filter(id__in=[row.id for row in others]).delete()
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0019_customer_total_spent'),
+        ('marketing', '0009_dailycampaignstat_marketer_fanpage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_stats, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailycampaignstat',
+            name='marketer',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Người chạy Ads'),
+        ),
+        migrations.AlterField(
+            model_name='dailycampaignstat',
+            name='service',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='Dịch vụ/Chiến dịch'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycampaignstat',
+            constraint=models.UniqueConstraint(fields=('report_date', 'platform', 'marketer', 'service'), name='marketing_dailystat_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+METRICS = (
+    'spend_amount', 'impressions', 'clicks', 'views', 'inboxes', 'comments',
+    'leads', 'appointments', 'revenue_ads',
+)
+
+
+def fill_id_keys(apps, schema_editor):
+    # Khoá = ID nhân sự / Fanpage (0 khi chưa gán); dòng trùng khoá mới được cộng dồn vào dòng mới nhất
+    DailyCampaignStat = apps.get_model('marketing', 'DailyCampaignStat')
+    DailyCampaignStat.objects.update(
+        marketer_key=Coalesce(F('marketer_user_id'), 0), fanpage_key=Coalesce(F('fanpage_id'), 0)
+    )
+
+    key = ('report_date', 'platform', 'marketer_key', 'fanpage_key', 'service')
+    duplicates = DailyCampaignStat.objects.values(*key).annotate(n=models.Count('id')).filter(n__gt=1)
+    for group in duplicates:
+        rows = list(DailyCampaignStat.objects.filter(**{k: group[k] for k in key}).order_by('-id'))
+        keep, others = rows[0], rows[1:]
+        labels = []
+        for row in rows:
+            if row.marketer and row.marketer not in labels:
+                labels.append(row.marketer)
+        for row in others:
+            for name in METRICS:
+                setattr(keep, name, getattr(keep, name) + getattr(row, name))
+        # Tên cũ chưa ghép được nhân sự: giữ lại đủ các tên đã gộp
+        keep.marketer = ', '.join(labels)[:100]
+        keep.save()
+        DailyCampaignStat.objects.filter(id__in=[row.id for row in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0020_customer_customers_created_idx'),
+        ('marketing', '0010_dailycampaignstat_upsert_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailycampaignstat',
+            name='marketing_dailystat_key_uniq',
+        ),
+        migrations.AddField(
+            model_name='dailycampaignstat',
+            name='fanpage_key',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dailycampaignstat',
+            name='marketer_key',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_id_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailycampaignstat',
+            constraint=models.UniqueConstraint(fields=('report_date', 'platform', 'marketer_key', 'fanpage_key', 'service'), name='marketing_dailystat_id_key_uniq'),
+        ),
+    ]
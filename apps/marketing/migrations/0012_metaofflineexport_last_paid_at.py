@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0011_dailycampaignstat_id_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metaofflineexport',
+            name='last_paid_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Mốc thời điểm thanh toán'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from apps.sales.models import Service
 
 # 1. QUẢN LÝ CÔNG VIỆC & CONTENT
@@ -58,6 +59,11 @@ class TaskFeedback(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+def marketer_name(user):
+    """Họ Tên nhân sự như trên bảng ROAS (không có thì dùng username)."""
+    return f"{user.last_name} {user.first_name}".strip() or user.username
+
+
 # 2. BÁO CÁO SỐ LIỆU ADS (ĐÃ NÂNG CẤP)
 class DailyCampaignStat(models.Model):
     # --- ĐỊNH NGHĨA CÁC NỀN TẢNG ---
@@ -74,8 +80,22 @@ class DailyCampaignStat(models.Model):
     # --- THÊM TRƯỜNG PLATFORM ---
     platform = models.CharField(max_length=20, choices=Platform.choices, default=Platform.FACEBOOK, verbose_name="Nền tảng")
 
-    marketer = models.CharField(max_length=100, blank=True, null=True, verbose_name="Người chạy Ads")
-    service = models.CharField(max_length=200, blank=True, null=True, verbose_name="Dịch vụ/Chiến dịch")
+    marketer = models.CharField(max_length=100, blank=True, default='', verbose_name="Người chạy Ads")
+    # [MỚI] Liên kết theo ID để ghép doanh thu (thay cho so khớp tên gần đúng); `marketer` giữ làm tên hiển thị
+    marketer_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='campaign_stats', limit_choices_to={'role__in': ['ADMIN', 'MARKETING']},
+        verbose_name="Marketer (Nhân sự)"
+    )
+    fanpage = models.ForeignKey(
+        'customers.Fanpage', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='campaign_stats', verbose_name="Fanpage"
+    )
+    service = models.CharField(max_length=200, blank=True, default='', verbose_name="Dịch vụ/Chiến dịch")
+    # Khoá upsert theo ID (= marketer_user_id / fanpage_id, 0 khi chưa gán): NULL không so trùng được trong
+    # ràng buộc unique trên MySQL/SQLite nên không đặt ràng buộc thẳng lên 2 khoá ngoại
+    marketer_key = models.PositiveBigIntegerField(default=0, editable=False)
+    fanpage_key = models.PositiveBigIntegerField(default=0, editable=False)
     spend_amount = models.DecimalField(max_digits=15, decimal_places=0, default=0, verbose_name="Chi tiêu (VNĐ)")
     
     # --- CÁC CHỈ SỐ MỚI (GOOGLE/TIKTOK/ZALO) ---
@@ -95,6 +115,17 @@ class DailyCampaignStat(models.Model):
     def __str__(self):
         return f"{self.get_platform_display()} - {self.report_date}: {self.spend_amount:,.0f}đ"
 
+    def save(self, *args, **kwargs):
+        # Tên hiển thị / ô tìm kiếm theo người chạy luôn khớp với nhân sự đã chọn
+        if self.marketer_user_id:
+            self.marketer = marketer_name(self.marketer_user)
+        self.marketer_key = self.marketer_user_id or 0
+        self.fanpage_key = self.fanpage_id or 0
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'marketer_key', 'fanpage_key'}
+        super().save(*args, **kwargs)
+
     # --- TÍNH TOÁN TỰ ĐỘNG (Properties) ---
     @property
     def cost_per_lead(self):
@@ -118,6 +149,13 @@ class DailyCampaignStat(models.Model):
     class Meta:
         verbose_name = "Số liệu Ads hàng ngày"
         verbose_name_plural = "Báo cáo Ads"
+        # 1 dòng / ngày / nền tảng / nhân sự / Fanpage / chiến dịch - khoá upsert của apps.marketing.ingest.
+        # `marketer` chỉ là tên hiển thị, không nằm trong khoá (đổi tên nhân sự không sinh dòng trùng)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['report_date', 'platform', 'marketer_key', 'fanpage_key', 'service'], name='marketing_dailystat_id_key_uniq'
+            ),
+        ]
 
 # 3. CONTENT ADS
 class ContentAd(models.Model):
@@ -136,4 +174,66 @@ class ContentAd(models.Model):
 
     class Meta:
         verbose_name = "Bài Content Ads"
-        verbose_name_plural = "Kho Content Quảng Cáo"
\ No newline at end of file
+        verbose_name_plural = "Kho Content Quảng Cáo"
+
+# 4. HÀNG ĐỢI SỰ KIỆN META CONVERSIONS API (OUTBOX)
+class MetaEventOutbox(models.Model):
+    """
+    Sự kiện chờ gửi lên Meta CAPI. Được ghi cùng transaction với đơn hàng,
+    worker `python manage.py send_meta_events` gửi theo lô và tự thử lại khi lỗi.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Chờ gửi'
+        SENT = 'SENT', 'Đã gửi'
+        FAILED = 'FAILED', 'Lỗi (hết lượt thử)'
+
+    event_id = models.CharField(max_length=100, unique=True, verbose_name="Event ID (chống trùng)")
+    order = models.ForeignKey('sales.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='meta_events', verbose_name="Đơn hàng")
+    payload = models.JSONField(verbose_name="Dữ liệu sự kiện")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, verbose_name="Trạng thái")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Số lần đã thử")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Thử lại lúc")
+    last_error = models.TextField(blank=True, verbose_name="Lỗi gần nhất")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Gửi thành công lúc")
+
+    def __str__(self):
+        return f"{self.payload.get('event_name', 'Event')} #{self.event_id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Sự kiện Meta CAPI"
+        verbose_name_plural = "Hàng đợi Meta CAPI"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='marketing_capi_due_idx'),
+        ]
+
+
+class MetaOfflineExport(models.Model):
+    """
+    Nhật ký các lần xuất CSV Offline Events cho Meta. Chỉ ghi khi file đã tải xong,
+    `last_event_id` là mốc (id MetaEventOutbox lớn nhất) để lần xuất "từ lần trước" chỉ lấy đơn mới thanh toán.
+    """
+    class Mode(models.TextChoices):
+        ALL = 'ALL', 'Toàn bộ'
+        RANGE = 'RANGE', 'Theo khoảng ngày'
+        SINCE_LAST = 'SINCE_LAST', 'Từ lần xuất trước'
+
+    mode = models.CharField(max_length=10, choices=Mode.choices, default=Mode.ALL, verbose_name="Kiểu xuất")
+    date_start = models.DateField(null=True, blank=True, verbose_name="Từ ngày")
+    date_end = models.DateField(null=True, blank=True, verbose_name="Đến ngày")
+    last_event_id = models.BigIntegerField(default=0, verbose_name="Mốc sự kiện CAPI")
+    # Đơn chốt theo combo chỉ có 1 sự kiện CAPI chung -> cần thêm mốc ID đơn hàng (null: log cũ trước khi có mốc này)
+    last_order_id = models.BigIntegerField(null=True, blank=True, verbose_name="Mốc đơn hàng")
+    # Đơn của khách không đến từ Facebook không có sự kiện CAPI -> mốc theo Order.paid_at (null: log cũ)
+    last_paid_at = models.DateTimeField(null=True, blank=True, verbose_name="Mốc thời điểm thanh toán")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="Số dòng")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Người xuất")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_mode_display()} - {self.row_count} dòng ({self.created_at:%d/%m/%Y %H:%M})"
+
+    class Meta:
+        verbose_name = "Lần xuất CSV Meta Offline"
+        verbose_name_plural = "Lịch sử xuất CSV Meta Offline"
+        ordering = ['-created_at']
@@ -0,0 +1,305 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+import requests
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.customers.models import Customer, Fanpage
+from apps.marketing.attribution import allocated_revenue, attribute, fanpage_shares
+from apps.marketing.ingest import ingest_stats, parse_number, read_rows
+from apps.marketing.meta_capi import deliver_outbox_batch
+from apps.marketing.models import DailyCampaignStat, MetaEventOutbox, MetaOfflineExport
+from apps.sales.models import Order, Service
+
+
+class MetaEventOutboxTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Rejuran', base_price=5000000)
+        self.customer = Customer.objects.create(name='Nguyễn Văn A', phone='0912345678', source='FACEBOOK')
+
+    def fake_session(self, status=200):
+        session = mock.Mock()
+        response = mock.Mock(status_code=status, text='{"error": "x"}')
+        response.json.return_value = {'events_received': 1}
+        if status >= 400:
+            response.raise_for_status.side_effect = requests.HTTPError(f'{status} Error', response=response)
+        session.post.return_value = response
+        return session
+
+    def test_paid_order_is_queued_once_without_http_call(self):
+        with mock.patch('apps.marketing.meta_capi.get_session') as get_session:
+            order = Order.objects.create(customer=self.customer, service=self.service, total_amount=5000000, actual_revenue=5000000)
+            order.note = 'Lưu lại lần 2'
+            order.save()
+        get_session.assert_not_called()
+
+        event = MetaEventOutbox.objects.get()
+        self.assertEqual(event.event_id, str(order.id))
+        self.assertEqual(event.payload['custom_data']['value'], 5000000.0)
+
+    def test_worker_sends_batch_and_backs_off_on_error(self):
+        for i in range(3):
+            customer = Customer.objects.create(name=f'Khách {i}', phone=f'09000000{i}', source='FACEBOOK')
+            Order.objects.create(customer=customer, service=self.service, total_amount=1000, actual_revenue=1000)
+
+        failing = self.fake_session(status=503)
+        self.assertEqual(deliver_outbox_batch(session=failing), (0, 3))
+        self.assertEqual(failing.post.call_count, 1)
+        self.assertFalse(MetaEventOutbox.objects.filter(next_attempt_at__lte=timezone.now()).exists())
+        self.assertEqual(deliver_outbox_batch(session=failing), (0, 0))
+
+        MetaEventOutbox.objects.update(next_attempt_at=timezone.now())
+        ok = self.fake_session()
+        self.assertEqual(deliver_outbox_batch(session=ok), (3, 0))
+        self.assertEqual(len(ok.post.call_args.kwargs['json']['data']), 3)
+        self.assertEqual(MetaEventOutbox.objects.filter(status='SENT', attempts=2).count(), 3)
+
+    def test_rejected_batch_is_split_so_only_bad_event_fails(self):
+        orders = []
+        for i in range(4):
+            customer = Customer.objects.create(name=f'Khách {i}', phone=f'09000000{i}', source='FACEBOOK')
+            orders.append(Order.objects.create(customer=customer, service=self.service, total_amount=1000, actual_revenue=1000))
+        bad_id = str(orders[2].id)
+
+        def post(url, json, timeout):
+            # Meta trả 400 cho cả lô nếu lô có sự kiện sai
+            bad = any(event['event_id'] == bad_id for event in json['data'])
+            return self.fake_session(status=400 if bad else 200).post.return_value
+
+        session = mock.Mock()
+        session.post.side_effect = post
+        self.assertEqual(deliver_outbox_batch(session=session), (3, 1))
+        self.assertEqual(MetaEventOutbox.objects.get(status='FAILED').event_id, bad_id)
+        self.assertEqual(MetaEventOutbox.objects.filter(status='SENT').count(), 3)
+
+
+class MetaOfflineExportTests(TestCase):
+    url = '/sales/report/export-meta-offline/'
+
+    def setUp(self):
+        admin = get_user_model().objects.create_user(username='admin', password='x', role='ADMIN')
+        self.client.force_login(admin)
+        self.service = Service.objects.create(name='Rejuran', base_price=5000000)
+        self.customer = Customer.objects.create(name='Nguyễn Thị Bích', phone='0912345678', city='Hà Nội', gender='FEMALE', source='FACEBOOK')
+
+    def order(self, day, paid=True):
+        return Order.objects.create(
+            customer=self.customer, service=self.service, order_date=day,
+            total_amount=1000, actual_revenue=1000 if paid else 0,
+        )
+
+    def export(self, **params):
+        resp = self.client.get(self.url, params)
+        self.assertTrue(resp.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(resp.streaming_content).decode('utf-8-sig'))))
+        return rows[0], rows[1:]
+
+    def test_streams_normalized_rows_and_filters_by_range(self):
+        old = self.order(date(2023, 1, 5))
+        self.order(date(2025, 6, 1))
+        self.order(date(2025, 6, 2), paid=False)
+
+        header, rows = self.export()
+        self.assertEqual(header[:5], ['event_name', 'event_time', 'value', 'currency', 'order_id'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][4:10], [str(old.id), '', '84912345678', 'bich', 'nguyen thi', 'ha noi'])
+        self.assertEqual(rows[0][1], '2023-01-05T00:00:00Z')
+
+        _, rows = self.export(mode='RANGE', date_start='2025-01-01', date_end='2025-12-31')
+        self.assertEqual(len(rows), 1)
+
+    def test_since_last_only_exports_newly_paid_orders(self):
+        self.order(date(2025, 6, 1))
+        unpaid = self.order(date(2025, 6, 2), paid=False)
+        _, rows = self.export(mode='SINCE_LAST')
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(MetaOfflineExport.objects.get().row_count, 1)
+
+        self.assertEqual(self.export(mode='SINCE_LAST')[1], [])
+
+        # Đơn cũ trả nốt nợ -> có sự kiện Purchase mới -> vào lần xuất sau
+        unpaid.actual_revenue = 1000
+        unpaid.save()
+        _, rows = self.export(mode='SINCE_LAST')
+        self.assertEqual([r[4] for r in rows], [str(unpaid.id)])
+
+    def test_since_last_includes_non_facebook_order_paid_later(self):
+        self.customer.source = 'REFERRAL'
+        self.customer.save()
+        unpaid = self.order(date(2025, 6, 2), paid=False)
+        self.assertEqual(self.export(mode='SINCE_LAST')[1], [])
+
+        # Khách không từ Facebook -> không có sự kiện CAPI, chỉ dựa vào mốc paid_at
+        unpaid.actual_revenue = 1000
+        unpaid.save()
+        self.assertFalse(unpaid.meta_events.exists())
+        _, rows = self.export(mode='SINCE_LAST')
+        self.assertEqual([r[4] for r in rows], [str(unpaid.id)])
+
+    def test_invalid_range_date_shows_error(self):
+        resp = self.client.get(self.url, {'mode': 'RANGE', 'date_start': '2026-02-31'})
+        self.assertRedirects(resp, '/sales/report/', fetch_redirect_response=False)
+        self.assertFalse(MetaOfflineExport.objects.exists())
+
+
+class AttributionTests(TestCase):
+    def setUp(self):
+        self.marketer = get_user_model().objects.create_user(username='mkt', password='x', first_name='Hoa', last_name='Lê', role='MARKETING')
+        self.page_a = Fanpage.objects.create(code='A', name='Page A', assigned_marketer=self.marketer)
+        self.page_b = Fanpage.objects.create(code='B', name='Page B')
+        self.service = Service.objects.create(name='Rejuran', base_price=5000000)
+
+        self.both = Customer.objects.create(name='Hai page', phone='0911111111', source='FACEBOOK')
+        self.both.fanpages.set([self.page_a, self.page_b])
+        self.none_fb = Customer.objects.create(name='Chưa tick', phone='0922222222', source='FACEBOOK')
+        self.none_other = Customer.objects.create(name='Giới thiệu', phone='0933333333', source='REFERRAL')
+
+    def order(self, customer, revenue):
+        return Order.objects.create(customer=customer, service=self.service, total_amount=revenue, actual_revenue=revenue,
+                                    order_date=date(2026, 3, 10))
+
+    def test_split_evenly_between_ticked_pages(self):
+        shares = fanpage_shares([self.both.pk, self.none_fb.pk])
+        self.assertEqual(sorted(shares[self.both.pk]), [('A', 0.5), ('B', 0.5)])
+        self.assertNotIn(self.none_fb.pk, shares)
+
+        totals = attribute([(self.both.pk, {'leads': 1, 'revenue': 1000}), (self.none_fb.pk, {'leads': 1})], shares)
+        self.assertEqual(totals['A'], {'leads': 0.5, 'revenue': 500})
+        self.assertEqual(totals[''], {'leads': 1})
+
+    def test_allocated_revenue_one_query_for_all_orders(self):
+        orders = [self.order(self.both, 1000), self.order(self.none_fb, 600), self.order(self.none_other, 400)]
+        orders = list(Order.objects.select_related('customer').filter(pk__in=[o.pk for o in orders]).order_by('pk'))
+        with self.assertNumQueries(1):
+            amounts = allocated_revenue(orders)
+        self.assertEqual([amounts[o.pk] for o in orders], [500, 600, 0])
+        self.assertEqual(orders[0].allocated_marketing_revenue, 500)
+
+    def test_dashboard_roas_joined_on_marketer_id(self):
+        self.order(self.both, 1000)
+        self.order(self.none_fb, 600)
+        # Nhập theo nhân sự và theo Fanpage (Marketer phụ trách) được gộp về cùng 1 người
+        DailyCampaignStat.objects.create(report_date=date(2026, 3, 10), marketer_user=self.marketer, spend_amount=100, leads=2)
+        DailyCampaignStat.objects.create(report_date=date(2026, 3, 11), fanpage=self.page_a, spend_amount=300, leads=2)
+        # Tên cũ chưa ghép được nhân sự: vẫn hiện chi tiêu, không nhận nhầm doanh thu của "Lê Hoa"
+        DailyCampaignStat.objects.create(report_date=date(2026, 3, 10), marketer='Hoa', spend_amount=50)
+
+        self.client.force_login(get_user_model().objects.create_user(username='admin', password='x', role='ADMIN'))
+        response = self.client.get('/marketing/', {'date_start': '2026-03-01', 'date_end': '2026-03-31'})
+        linked, legacy = response.context['report_marketers']
+        self.assertEqual((linked['name'], linked['spend'], linked['leads'], linked['revenue']), ('Lê Hoa', 440, 4, 500))
+        self.assertEqual((legacy['name'], legacy['revenue']), ('Hoa', 0))
+        self.assertEqual(DailyCampaignStat.objects.get(leads=2, fanpage=None).marketer, 'Lê Hoa')
+
+
+class AdStatIngestTests(TestCase):
+    FACEBOOK_CSV = (
+        "Campaign name,Day,Amount spent (VND),Impressions,Link clicks,Leads,Post comments\n"
+        "Rejuran T3,2026-03-10,\"1,200,000\",10000,300,12,4\n"
+        "Rejuran T3,2026-03-10,800000,5000,100,3,1\n"
+        "Botox,2026-03-10,500000,2000,50,,\n"
+        "Botox,31/02/2026,1,1,1,1,1\n"
+    )
+
+    def setUp(self):
+        self.marketer = get_user_model().objects.create_user(username='mkt', password='x', first_name='Hoa', last_name='Lê', role='MARKETING')
+
+    def ingest(self, text, platform='FACEBOOK', **kwargs):
+        data = text.encode('utf-16') if kwargs.pop('utf16', False) else text.encode('utf-8')
+        return ingest_stats(read_rows(data, 'export.csv', platform), platform, marketer=self.marketer, **kwargs)
+
+    def test_parse_number(self):
+        self.assertEqual(parse_number('1,234,567'), 1234567)
+        self.assertEqual(parse_number('1.234.567 ₫'), 1234567)
+        self.assertEqual(parse_number('1,234.50'), Decimal('1234.50'))
+        self.assertEqual(parse_number('--'), 0)
+
+    def test_upsert_with_row_diff(self):
+        # 2 dòng cùng chiến dịch/ngày (xuất theo nhóm QC) được cộng dồn; dòng sai ngày báo lỗi
+        result = self.ingest(self.FACEBOOK_CSV)
+        self.assertEqual((result.created, result.updated, len(result.errors)), (2, 0, 1))
+        self.assertEqual(result.errors[0][0], 5)
+        stat = DailyCampaignStat.objects.get(service='Rejuran T3')
+        self.assertEqual((stat.spend_amount, stat.impressions, stat.leads, stat.comments), (2000000, 15000, 15, 5))
+        self.assertEqual((stat.marketer, stat.marketer_user), ('Lê Hoa', self.marketer))
+
+        # Lịch hẹn nhập tay không bị file ghi đè; chạy lại file đã sửa -> chỉ dòng đổi số được cập nhật
+        DailyCampaignStat.objects.filter(service='Botox').update(appointments=2)
+        result = self.ingest(self.FACEBOOK_CSV.replace('500000,2000', '650000,2000'))
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 1, 1))
+        updated, = [row for row in result.rows if row['action'] == 'updated']
+        self.assertEqual(updated['changes'], {'spend_amount': [500000, 650000]})
+        botox = DailyCampaignStat.objects.get(service='Botox')
+        self.assertEqual((botox.spend_amount, botox.appointments), (650000, 2))
+        self.assertEqual(DailyCampaignStat.objects.count(), 2)
+
+    def test_key_is_marketer_and_fanpage_id_not_label(self):
+        # Cùng ngày / nền tảng / chiến dịch nhưng khác Fanpage -> 2 dòng riêng
+        page_a = Fanpage.objects.create(code='A', name='Page A')
+        page_b = Fanpage.objects.create(code='B', name='Page B')
+        DailyCampaignStat.objects.create(report_date=date(2026, 3, 10), fanpage=page_a, service='Botox', spend_amount=100)
+        DailyCampaignStat.objects.create(report_date=date(2026, 3, 10), fanpage=page_b, service='Botox', spend_amount=200)
+
+        # Đổi tên nhân sự rồi nhập lại file -> cập nhật đúng dòng cũ (kèm tên mới), không sinh dòng trùng
+        self.ingest(self.FACEBOOK_CSV)
+        self.marketer.first_name = 'Hoà'
+        self.marketer.save()
+        result = self.ingest(self.FACEBOOK_CSV.replace('500000,2000', '650000,2000'))
+        self.assertEqual((result.created, result.updated), (0, 1))
+        self.assertEqual(DailyCampaignStat.objects.filter(marketer_user=self.marketer).count(), 2)
+        self.assertEqual(DailyCampaignStat.objects.get(service='Botox', marketer_user=self.marketer).marketer, 'Lê Hoà')
+
+    def test_marketer_column_resolved_to_user(self):
+        text = (
+            "Campaign name,Day,Amount spent (VND),Marketer\n"
+            "Rejuran,2026-03-10,100000,lê hoa\n"
+            "Rejuran,2026-03-10,200000,Hoa\n"
+        )
+        result = ingest_stats(read_rows(text.encode(), 'export.csv', 'FACEBOOK'), 'FACEBOOK')
+        self.assertEqual(result.created, 1)
+        # Chỉ có Tên (không đủ Họ Tên / username) thì không đoán nhân sự
+        self.assertEqual(result.errors, [(3, 'Không xác định được nhân sự chạy Ads: Hoa')])
+        self.assertEqual(DailyCampaignStat.objects.get().marketer_user, self.marketer)
+
+    def test_google_utf16_export_and_dry_run(self):
+        text = (
+            "Campaign performance report\n"
+            "March 1, 2026 - March 31, 2026\n"
+            "Campaign\tDay\tCost\tImpr.\tClicks\tConversions\n"
+            "Search Filler\t2026-03-10\t1,500,000.00\t8000\t400\t7.00\n"
+            "Total: Account\t--\t1,500,000.00\t8000\t400\t7.00\n"
+        )
+        result = self.ingest(text, platform='GOOGLE', utf16=True, dry_run=True)
+        self.assertEqual((result.created, result.errors), (1, []))
+        self.assertEqual(result.rows[0]['changes']['leads'], [None, 7])
+        self.assertFalse(DailyCampaignStat.objects.exists())
+
+    def test_api_accepts_tiktok_json(self):
+        self.client.force_login(self.marketer)
+        payload = {'data': {'list': [
+            {'dimensions': {'stat_time_day': '2026-03-10 00:00:00', 'campaign_name': 'Filler'},
+             'metrics': {'spend': '350000.0', 'impressions': '9000', 'clicks': '120', 'conversion': '5'}},
+        ]}}
+        response = self.client.post('/marketing/api/ingest/?platform=TIKTOK&marketer=mkt',
+                                    data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.json()['created'], 1)
+        stat = DailyCampaignStat.objects.get()
+        self.assertEqual((stat.platform, stat.report_date, stat.spend_amount, stat.leads), ('TIKTOK', date(2026, 3, 10), 350000, 5))
+
+    def test_api_rejects_bad_platform_and_non_object_rows(self):
+        self.client.force_login(self.marketer)
+        response = self.client.post('/marketing/api/ingest/?marketer=mkt', data='[]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        rows = [1, {'date_start': '2026-03-10', 'campaign_name': 'Filler', 'spend': '1000'}]
+        response = self.client.post('/marketing/api/ingest/?platform=FACEBOOK&marketer=mkt',
+                                    data=json.dumps(rows), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([e['line'] for e in response.json()['errors']], [1])
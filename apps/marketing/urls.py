@@ -5,6 +5,7 @@ urlpatterns = [
     # Dashboard (Nhập liệu hàng ngày)
     path('', views.marketing_dashboard, name='marketing_dashboard'),
     path('delete/<int:pk>/', views.delete_report, name='delete_marketing_report'),
+    path('api/ingest/', views.ingest_stats_api, name='api_ingest_stats'),
     
     # [MỚI] Báo cáo hiệu quả ROI & Fanpage
     path('report/', views.marketing_report, name='marketing_report'),
@@ -1,17 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Q, Count
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Q
+from django.db.models.functions import Coalesce
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 import json
 
-from .models import MarketingTask, DailyCampaignStat, ContentAd, TaskFeedback
+from .models import MarketingTask, DailyCampaignStat, ContentAd, TaskFeedback, marketer_name
 from apps.sales.models import Service, Order
 from apps.customers.models import Customer, Fanpage
-from apps.bookings.models import Appointment
 from apps.authentication.decorators import allowed_users
+from apps.analytics.rollups import facts_between, pending_days_between
+from .attribution import attribute, fanpage_shares
+from .ingest import PLATFORM_COLUMNS, ingest_stats, read_rows
 from .forms import DailyStatForm, MarketingTaskForm, ContentAdForm
 from apps.authentication.models import User 
 
@@ -32,7 +37,12 @@ def marketing_dashboard(request):
         instance = get_object_or_404(DailyCampaignStat, id=stat_id) if stat_id else None
         form = DailyStatForm(request.POST, instance=instance)
         if form.is_valid():
-            form.save()
+            try:
+                with transaction.atomic():
+                    form.save()
+            except IntegrityError:
+                messages.error(request, "Đã có báo cáo cùng ngày, nền tảng, nhân sự, Fanpage và chiến dịch - hãy sửa dòng đó.")
+                return redirect('marketing_dashboard')
             messages.success(request, "Đã lưu dữ liệu báo cáo!")
             return redirect('marketing_dashboard')
         else:
@@ -55,53 +65,43 @@ def marketing_dashboard(request):
     for key in totals:
         if totals[key] is None: totals[key] = 0
 
-    # --- LOGIC CHIA DOANH THU THEO TỪNG FANPAGE THỰC TẾ ---
-    revenue_map = {} 
-    all_orders = Order.objects.filter(
-        order_date__range=[date_start, date_end]
-    ).select_related('customer').prefetch_related('customer__fanpages', 'customer__fanpages__assigned_marketer')
+    # --- BẢNG ROAS THEO MARKETER (GHÉP THEO ID NHÂN SỰ) ---
+    # [TỐI ƯU] Doanh thu: đọc thô đơn + map khách -> Marketer phụ trách Fanpage 1 lần, chia đều theo Fanpage
+    # (apps.marketing.attribution). Khoá: ID Marketer / None (Fanpage chưa gán) / '' (khách chưa tick Fanpage)
+    orders = Order.objects.filter(order_date__range=[date_start, date_end]).values_list('customer_id', 'actual_revenue')
+    events = [(customer_id, {'revenue': float(revenue or 0)}) for customer_id, revenue in orders]
+    shares = fanpage_shares((customer_id for customer_id, _ in events), field='fanpage__assigned_marketer')
+    revenue_by_marketer = {key: values['revenue'] for key, values in attribute(events, shares).items()}
 
-    for order in all_orders:
-        cus = order.customer
-        pages = cus.fanpages.all()
-        num_pages = pages.count()
-        rev = float(order.actual_revenue or 0)
-        
-        if num_pages > 0:
-            split_revenue = rev / num_pages
-            for fp in pages:
-                if fp.assigned_marketer:
-                    # Lấy Họ Tên để map với tên Marketer nhập trong Stats
-                    key = f"{fp.assigned_marketer.last_name} {fp.assigned_marketer.first_name}".strip()
-                    if not key: key = fp.assigned_marketer.username
-                else:
-                    key = "Chưa gán nhân sự"
-                revenue_map[key] = revenue_map.get(key, 0) + split_revenue
-        else:
-            revenue_map["Chưa tick Fanpage"] = revenue_map.get("Chưa tick Fanpage", 0) + rev
+    # Chi tiêu gộp bằng SQL theo nhân sự đã chọn, hoặc Marketer phụ trách Fanpage của dòng báo cáo.
+    # Dòng cũ chưa ghép được nhân sự vẫn hiện theo tên nhập tay (không có doanh thu).
+    marketer_stats_qs = stats.order_by().values(
+        'marketer', owner=Coalesce('marketer_user', 'fanpage__assigned_marketer')
+    ).annotate(total_spend=Sum('spend_amount'), total_leads=Sum('leads'), total_appts=Sum('appointments'))
 
-    marketer_stats_qs = stats.values('marketer').annotate(
-        total_spend=Sum('spend_amount'), total_leads=Sum('leads'), total_appts=Sum('appointments')
-    ).order_by('-total_spend')
+    grouped = {}
+    for item in marketer_stats_qs:
+        key = item['owner'] or item['marketer']
+        if not key: continue
+        row = grouped.setdefault(key, {'spend': 0, 'leads': 0, 'appts': 0})
+        row['spend'] += float(item['total_spend'] or 0)
+        row['leads'] += item['total_leads'] or 0
+        row['appts'] += item['total_appts'] or 0
 
+    marketer_names = {
+        u.pk: marketer_name(u) for u in User.objects.filter(pk__in=[k for k in grouped if isinstance(k, int)])
+    }
     report_marketers = []
-    for item in marketer_stats_qs:
-        m_name = item['marketer']
-        if not m_name: continue
-        sp = round(float(item['total_spend'] or 0) * 1.1)
-        
-        # So khớp doanh thu (Lấy tên gần đúng)
-        rev = 0
-        for k, v in revenue_map.items():
-            if m_name.lower() in k.lower() or k.lower() in m_name.lower():
-                rev = v
-                break
-        
+    for key, row in grouped.items():
+        sp = round(row['spend'] * 1.1)
+        rev = revenue_by_marketer.get(key, 0) if isinstance(key, int) else 0
         report_marketers.append({
-            'name': m_name, 'spend': sp, 'leads': item['total_leads'],
-            'appts': item['total_appts'], 'revenue': rev,
+            'name': marketer_names.get(key, key), 'spend': sp, 'leads': row['leads'],
+            'appts': row['appts'], 'revenue': rev,
+            'cpl': (sp / row['leads']) if row['leads'] > 0 else 0,
             'roas': (sp / float(rev) * 100) if rev > 0 else 0
         })
+    report_marketers.sort(key=lambda x: x['spend'], reverse=True)
 
     # Giữ nguyên logic chart và context cũ
     chart_data_qs = stats.values('report_date').annotate(daily_leads=Sum('leads'), daily_spend=Sum('spend_amount')).order_by('report_date')
@@ -134,6 +134,54 @@ def delete_report(request, pk):
     messages.success(request, "Đã xóa báo cáo.")
     return redirect('marketing_dashboard')
 
+# [MỚI] Nhập hàng loạt số liệu Ads từ file xuất của Facebook / Google / TikTok (CSV hoặc JSON)
+@login_required(login_url='/auth/login/')
+@allowed_users(allowed_roles=['ADMIN', 'MARKETING'])
+@require_POST
+def ingest_stats_api(request):
+    """
+    POST multipart (file=...) hoặc body JSON. Tham số (form hoặc query string):
+    platform=FACEBOOK|GOOGLE|TIKTOK, marketer=<ID hoặc username người chạy>, fanpage=<mã Fanpage>,
+    dry_run=1 để chỉ xem diff.
+    """
+    def param(name):
+        return request.POST.get(name) or request.GET.get(name) or ''
+
+    platform = param('platform').upper()
+    if platform not in PLATFORM_COLUMNS:
+        return JsonResponse({
+            'status': 'error', 'message': f"platform phải là một trong: {', '.join(PLATFORM_COLUMNS)}",
+        }, status=400)
+    upload = request.FILES.get('file')
+    data, filename = (upload.read(), upload.name) if upload else (request.body, 'body.json')
+
+    marketer = None
+    if param('marketer'):
+        lookup = {'pk': param('marketer')} if param('marketer').isdigit() else {'username': param('marketer')}
+        marketer = User.objects.filter(**lookup).first()
+        if marketer is None:
+            return JsonResponse({'status': 'error', 'message': 'Không tìm thấy nhân sự chạy Ads'}, status=400)
+
+    fanpage = None
+    if param('fanpage'):
+        fanpage = Fanpage.objects.filter(code=param('fanpage')).first()
+        if fanpage is None:
+            return JsonResponse({'status': 'error', 'message': 'Không tìm thấy Fanpage'}, status=400)
+
+    try:
+        result = ingest_stats(
+            read_rows(data, filename, platform), platform, marketer=marketer, fanpage=fanpage, dry_run=param('dry_run') == '1'
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'ok', 'dry_run': param('dry_run') == '1',
+        'created': result.created, 'updated': result.updated, 'unchanged': result.unchanged,
+        'errors': [{'line': line, 'message': message} for line, message in result.errors],
+        'rows': result.rows,
+    })
+
 @login_required(login_url='/auth/login/')
 @allowed_users(allowed_roles=['ADMIN', 'MARKETING', 'MANAGER'])
 def marketing_report(request):
@@ -149,53 +197,26 @@ def marketing_report(request):
 
     campaign_stats = DailyCampaignStat.objects.filter(report_date__range=[date_start, date_end])
     total_cost = campaign_stats.aggregate(Sum('spend_amount'))['spend_amount__sum'] or 0
-    customers = Customer.objects.filter(created_at__date__range=[date_start, date_end])
-    total_leads = customers.count()
-    
-    leads_by_page = {}
-    for cus in customers.prefetch_related('fanpages'):
-        pages = cus.fanpages.all()
-        n = pages.count()
-        if n > 0:
-            for fp in pages: leads_by_page[fp.code] = leads_by_page.get(fp.code, 0) + (1/n)
-        else:
-            fp = cus.fanpage
-            if fp: leads_by_page[fp] = leads_by_page.get(fp, 0) + 1
+    # [TỐI ƯU] Lead / Lịch hẹn / Đơn / Doanh thu theo Fanpage đọc từ bảng tổng hợp theo ngày
+    # (apps.analytics - đã chia 1/n cho khách nhiều Fanpage) thay vì duyệt từng khách/lịch hẹn/đơn.
+    facts = facts_between(date_start, date_end)
+    totals = facts.aggregate(leads=Sum('leads'), appts=Sum('appointments'), revenue=Sum('revenue'))
+    total_leads = round(totals['leads'] or 0)
+    total_appts = round(totals['appts'] or 0)
+    total_revenue = round(totals['revenue'] or 0)
 
-    appointments = Appointment.objects.filter(created_at__date__range=[date_start, date_end]).select_related('customer').prefetch_related('customer__fanpages')
-    appts_by_page, total_appts = {}, 0
-    for appt in appointments:
-        if appt.customer:
-            pages = appt.customer.fanpages.all()
-            n = pages.count()
-            if n > 0:
-                for fp in pages: appts_by_page[fp.code] = appts_by_page.get(fp.code, 0) + (1/n)
-            else:
-                fp = appt.customer.fanpage
-                if fp: appts_by_page[fp] = appts_by_page.get(fp, 0) + 1
-            total_appts += 1
-
-    orders = Order.objects.filter(order_date__range=[date_start, date_end]).select_related('customer').prefetch_related('customer__fanpages')
-    total_revenue = orders.aggregate(Sum('actual_revenue'))['actual_revenue__sum'] or 0
-    revenue_by_page, orders_count_by_page = {}, {}
-    for order in orders:
-        if order.customer:
-            pages = order.customer.fanpages.all()
-            n = pages.count()
-            if n > 0:
-                split_rev = float(order.actual_revenue) / n
-                for fp in pages:
-                    revenue_by_page[fp.code] = revenue_by_page.get(fp.code, 0) + split_rev
-                    orders_count_by_page[fp.code] = orders_count_by_page.get(fp.code, 0) + (1/n)
-            else:
-                fp = order.customer.fanpage
-                if fp:
-                    revenue_by_page[fp] = revenue_by_page.get(fp, 0) + float(order.actual_revenue)
-                    orders_count_by_page[fp] = orders_count_by_page.get(fp, 0) + 1
+    by_page = facts.exclude(fanpage_code='').values('fanpage_code').annotate(
+        leads=Sum('leads'), appts=Sum('appointments'), orders=Sum('orders'), revenue=Sum('revenue')
+    )
+    leads_by_page = {x['fanpage_code']: x['leads'] for x in by_page if x['leads']}
+    appts_by_page = {x['fanpage_code']: x['appts'] for x in by_page if x['appts']}
+    orders_count_by_page = {x['fanpage_code']: x['orders'] for x in by_page if x['orders']}
+    revenue_by_page = {x['fanpage_code']: x['revenue'] for x in by_page}
 
     report_data = []
     all_fanpages = set(list(leads_by_page.keys()) + list(appts_by_page.keys()) + list(orders_count_by_page.keys()))
     fanpage_choices = dict(Customer.FanpageChoices.choices)
+    fanpage_names = dict(Fanpage.objects.filter(code__in=all_fanpages).values_list('code', 'name'))
 
     for fp_code in all_fanpages:
         if not fp_code: continue
@@ -203,20 +224,18 @@ def marketing_report(request):
         revenue = revenue_by_page.get(fp_code, 0)
         rate_lead_to_appt = (appts / leads * 100) if leads > 0 else 0
         quality_tag = "🔥 Data xịn" if rate_lead_to_appt > 30 else "Bình thường"
-        fp_obj = Fanpage.objects.filter(code=fp_code).first()
         report_data.append({
-            'code': fp_code, 'name': fp_obj.name if fp_obj else fanpage_choices.get(fp_code, fp_code),
+            'code': fp_code, 'name': fanpage_names.get(fp_code) or fanpage_choices.get(fp_code, fp_code),
             'leads': round(leads, 1), 'appts': round(appts, 1), 'orders': round(orders_count, 1),
-            'revenue': revenue, 'aov': (revenue / orders_count) if orders_count > 0 else 0,
+            'revenue': revenue, 'aov': (float(revenue) / orders_count) if orders_count > 0 else 0,
             'rate_lead_to_appt': rate_lead_to_appt, 'rate_appt_to_order': (orders_count / appts * 100) if appts > 0 else 0,
-            'rpl': (revenue / leads) if leads > 0 else 0, 'quality': quality_tag
+            'rpl': (float(revenue) / leads) if leads > 0 else 0, 'quality': quality_tag
         })
 
     report_data.sort(key=lambda x: x['leads'], reverse=True)
-    daily_leads = customers.values('created_at__date').annotate(count=Count('id')).order_by('created_at__date')
-    leads_map = {item['created_at__date'].strftime('%Y-%m-%d'): item['count'] for item in daily_leads}
-    daily_revenue = orders.values('order_date').annotate(total=Sum('actual_revenue')).order_by('order_date')
-    rev_map = {item['order_date'].strftime('%Y-%m-%d'): float(item['total'] or 0) for item in daily_revenue}
+    daily = facts.values('day').annotate(leads=Sum('leads'), revenue=Sum('revenue')).order_by('day')
+    leads_map = {item['day'].strftime('%Y-%m-%d'): round(item['leads'] or 0) for item in daily}
+    rev_map = {item['day'].strftime('%Y-%m-%d'): float(item['revenue'] or 0) for item in daily}
 
     chart_labels, chart_data_leads, chart_data_revenue = [], [], []
     curr = date_start
@@ -235,6 +254,7 @@ def marketing_report(request):
         'report_data': report_data, 'chart_labels': json.dumps(chart_labels),
         'chart_data_leads': json.dumps(chart_data_leads), 'chart_data_revenue': json.dumps(chart_data_revenue),
         'fanpage_choices': Customer.FanpageChoices.choices,
+        'rollup_pending': pending_days_between(date_start, date_end),
     }
     return render(request, 'marketing/report.html', context)
 
@@ -0,0 +1,68 @@
+"""
+Kiểm tra & sửa các giá trị tiền của Đơn hàng bị lưu sai định dạng (vd '1,500,000', '', '1.5e6', số âm)
+- di sản của thời kỳ import Excel trên SQLite. Sau khi sửa, các màn hình đọc thẳng Decimal
+và cộng dồn trong SQL, không còn ép kiểu sang chuỗi rồi parse lại từng đơn.
+
+Các hàm nhận `order_model` (lệnh repair_order_amounts truyền Order). Migration 0011 có bản chép riêng.
+"""
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+AMOUNT_FIELDS = ('total_amount', 'actual_revenue', 'debt_amount')
+
+# Giá trị hợp lệ khi ép sang chuỗi: số nguyên không âm (SQLite có thể trả '1000.0')
+_CANONICAL = re.compile(r'^\d+(\.0*)?$')
+
+
+def parse_amount(value):
+    """Chuỗi/số bất kỳ -> Decimal nguyên không âm (giá trị không đọc được hoặc âm -> 0)."""
+    if value is None:
+        return Decimal(0)
+    text = str(value).replace(',', '').replace(' ', '').strip()
+    try:
+        amount = Decimal(text) if text else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+    if not amount.is_finite() or amount < 0:
+        return Decimal(0)
+    return amount.quantize(Decimal(1), rounding=ROUND_HALF_UP)
+
+
+def find_malformed_orders(order_model, batch_size=2000):
+    """Sinh (id, order_date, {field: chuỗi gốc}) cho các đơn có ít nhất 1 cột tiền sai định dạng."""
+    rows = order_model.objects.annotate(
+        **{f'txt_{field}': Cast(field, CharField()) for field in AMOUNT_FIELDS}
+    ).values_list('id', 'order_date', *[f'txt_{field}' for field in AMOUNT_FIELDS])
+
+    for order_id, order_date, *texts in rows.iterator(chunk_size=batch_size):
+        if not all(text is not None and _CANONICAL.match(text) for text in texts):
+            yield order_id, order_date, dict(zip(AMOUNT_FIELDS, texts))
+
+
+def repaired_values(raw):
+    """Giá trị mới cho 1 đơn lỗi, cùng quy tắc với Order.save (nợ = tổng - thực thu, không âm)."""
+    total = parse_amount(raw['total_amount'])
+    revenue = parse_amount(raw['actual_revenue'])
+    if not total and revenue:
+        total = revenue
+    debt = max(total - revenue, Decimal(0)) if total else Decimal(0)
+    return {
+        'total_amount': total,
+        'actual_revenue': revenue,
+        'debt_amount': debt,
+        'is_paid': debt <= 0 and total > 0,
+    }
+
+
+def repair_order_amounts(order_model, dry_run=False, batch_size=2000):
+    """Sửa mọi đơn lỗi bằng UPDATE theo ID (không phát signal). Trả về [(id, order_date, gốc, mới)]."""
+    repaired = []
+    for order_id, order_date, raw in list(find_malformed_orders(order_model, batch_size)):
+        values = repaired_values(raw)
+        if not dry_run:
+            order_model.objects.filter(id=order_id).update(**values)
+        repaired.append((order_id, order_date, raw, values))
+    return repaired
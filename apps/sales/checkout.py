@@ -0,0 +1,111 @@
+"""
+Chốt đơn tại quầy (combo nhiều dịch vụ) với số truy vấn không phụ thuộc số dịch vụ:
+- Lấy toàn bộ dịch vụ bằng 1 truy vấn (in_bulk).
+- Tạo đơn bằng bulk_create trong 1 transaction.
+- Tính lại tổng chi tiêu / xếp hạng khách 1 lần và ghi 1 sự kiện Purchase (Meta CAPI) cho cả lần chốt.
+
+bulk_create không phát signal, nên các việc mà signal của Order vẫn làm (ranking, rollup ngày,
+hàng đợi CAPI) được gọi trực tiếp ở đây.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.analytics.rollups import mark_days_dirty
+from apps.customers.ranking import mark_spent_dirty
+from apps.marketing.meta_capi import enqueue_purchase_event
+from apps.sales.amounts import parse_amount
+from apps.sales.models import Order, Service
+
+
+@dataclass
+class CheckoutItem:
+    service_id: int
+    original_price: Decimal = Decimal(0)
+    total_amount: Decimal = Decimal(0)
+    paid_amount: Decimal = Decimal(0)
+
+
+def checkout_event_id(appointment):
+    return f"checkout-{appointment.pk}"
+
+
+def _paid(order):
+    return order.total_amount if order.is_paid else Decimal(0)
+
+
+def checkout(appointment, items, consultant_id=None, note=''):
+    """
+    Tạo các đơn hàng của 1 lần chốt combo cho lịch hẹn. Trả về danh sách Order theo thứ tự `items`.
+    Order.appointment là OneToOne nên chỉ đơn đầu tiên gắn với lịch hẹn; nếu lịch hẹn đã có đơn
+    (tự tạo khi chuyển COMPLETED) thì đơn đó được dùng lại cho dịch vụ đầu tiên.
+    """
+    items = [item for item in items if item.service_id]
+    if not items:
+        return []
+
+    with transaction.atomic():
+        services = Service.objects.in_bulk({item.service_id for item in items})
+        missing = [str(item.service_id) for item in items if int(item.service_id) not in services]
+        if missing:
+            raise ValueError(f"Không tìm thấy dịch vụ #{', #'.join(missing)}")
+
+        today = timezone.localdate()
+        orders = []
+        for item in items:
+            order = Order(
+                customer_id=appointment.customer_id,
+                service=services[int(item.service_id)],
+                assigned_consultant_id=consultant_id,
+                actual_revenue=parse_amount(item.paid_amount),
+                total_amount=parse_amount(item.total_amount),
+                order_date=today,
+                note=note,
+            )
+            order.apply_amount_rules()
+            # Giá gốc nhập tại quầy (nếu có) thay cho giá niêm yết của dịch vụ
+            if item.original_price:
+                order.original_price = parse_amount(item.original_price)
+            orders.append(order)
+
+        days = {today}
+        existing = Order.objects.select_for_update().filter(appointment=appointment).first()
+        if existing:
+            first = orders[0]
+            if _paid(existing):
+                mark_spent_dirty([existing.customer_id])
+            days.add(existing.order_date)
+            # update() thay vì save(): không sinh sự kiện CAPI riêng cho đơn này
+            Order.objects.filter(pk=existing.pk).update(
+                customer_id=first.customer_id,
+                service=first.service,
+                assigned_consultant_id=consultant_id,
+                original_price=first.original_price,
+                actual_revenue=first.actual_revenue,
+                total_amount=first.total_amount,
+                debt_amount=first.debt_amount,
+                is_paid=first.is_paid,
+                paid_at=first.paid_at,
+                order_date=today,
+                note=note,
+            )
+            first.pk = existing.pk
+            first.appointment = appointment
+            Order.objects.bulk_create(orders[1:])
+        else:
+            orders[0].appointment = appointment
+            Order.objects.bulk_create(orders)
+
+        paid_total = sum((_paid(order) for order in orders), Decimal(0))
+        if paid_total:
+            mark_spent_dirty([appointment.customer_id])
+        mark_days_dirty(days)
+
+        customer = appointment.customer
+        if paid_total and customer.source == 'FACEBOOK':
+            # MySQL không trả về ID sau bulk_create -> đọc lại đơn gắn lịch hẹn để làm khoá ngoại
+            first_order = Order.objects.select_related('customer').get(appointment=appointment)
+            enqueue_purchase_event(first_order, amount=paid_total, event_id=checkout_event_id(appointment))
+    return orders
@@ -0,0 +1,101 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField, Count, Q, Sum
+from django.db.models.functions import Cast
+
+from apps.customers.models import Customer
+from apps.sales.models import Order, Service
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _old_safe_float(value):
+    # Bản sao hàm safe_float cũ (đã bỏ khỏi apps.sales.views) để so sánh
+    if value is None: return 0.0
+    try:
+        if isinstance(value, (int, float)): return float(value)
+        clean_val = str(value).replace(',', '').strip()
+        if not clean_val: return 0.0
+        return float(clean_val)
+    except: return 0.0
+
+
+def old_path(qs):
+    """Cách cũ: ép 3 cột tiền sang chuỗi trong SQL, tải mọi đơn rồi parse & cộng bằng Python."""
+    orders = list(qs.annotate(
+        txt_total=Cast('total_amount', CharField()),
+        txt_revenue=Cast('actual_revenue', CharField()),
+        txt_debt=Cast('debt_amount', CharField())
+    ).defer('total_amount', 'actual_revenue', 'debt_amount'))
+    total_sales = total_revenue = total_debt = success = 0
+    for o in orders:
+        o.total_amount = _old_safe_float(o.txt_total)
+        o.actual_revenue = _old_safe_float(o.txt_revenue)
+        o.debt_amount = _old_safe_float(o.txt_debt)
+        total_sales += o.total_amount
+        total_revenue += o.actual_revenue
+        total_debt += o.debt_amount
+        if o.total_amount > 0:
+            success += 1
+    return total_sales, total_revenue, total_debt, success
+
+
+def new_path(qs):
+    """Cách mới: Decimal gốc, cộng dồn trong SQL."""
+    totals = qs.aggregate(
+        sales=Sum('total_amount'), revenue=Sum('actual_revenue'), debt=Sum('debt_amount'),
+        success=Count('id', filter=Q(total_amount__gt=0)),
+    )
+    return totals['sales'], totals['revenue'], totals['debt'], totals['success']
+
+
+class Command(BaseCommand):
+    help = 'So sánh tốc độ tính tổng đơn hàng: ép chuỗi + parse Python (cũ) với Decimal + SUM trong SQL (mới). Dữ liệu giả được rollback.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000, help='Số đơn giả tạo ra để đo (mặc định 200000)')
+        parser.add_argument('--repeat', type=int, default=3, help='Số lần đo mỗi cách (lấy lần nhanh nhất)')
+
+    def handle(self, *args, **options):
+        n = options['orders']
+        self.stdout.write(self.style.SUCCESS(f"Bắt đầu tạo {n} đơn giả (sẽ rollback sau khi đo)..."))
+        try:
+            with transaction.atomic():
+                self._run(n, options['repeat'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, n, repeat):
+        service = Service.objects.create(name='__benchmark__', base_price=1000000)
+        customer = Customer.objects.create(name='Benchmark', phone='0000000000')
+        start = date(2020, 1, 1)
+        # bulk_create không phát signal (xếp hạng, CAPI, số liệu ngày) -> chỉ đo đúng phần đọc
+        Order.objects.bulk_create([
+            Order(
+                customer=customer, service=service, order_date=start + timedelta(days=i % 1500),
+                total_amount=1000000 + i % 7 * 100000, actual_revenue=1000000, debt_amount=i % 7 * 100000,
+                is_paid=i % 7 == 0,
+            )
+            for i in range(n)
+        ], batch_size=5000)
+        qs = Order.objects.filter(service=service)
+
+        results = {}
+        for label, func in (('Cũ (Cast + parse)', old_path), ('Mới (SUM trong SQL)', new_path)):
+            best = None
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                value = func(qs)
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = best
+            self.stdout.write(f"--- {label}: {best * 1000:.1f} ms -> {value}")
+
+        old, new = results.values()
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Nhanh hơn {old / new:.1f} lần trên {n} đơn! ==="))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.analytics.rollups import mark_days_dirty
+from apps.sales.amounts import repair_order_amounts
+from apps.sales.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Tìm & sửa các đơn hàng có cột tiền (tổng / thực thu / nợ) lưu sai định dạng hoặc âm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ liệt kê, không ghi vào DB')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Số đơn đọc mỗi lô')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.stdout.write(self.style.SUCCESS("Bắt đầu kiểm tra cột tiền của đơn hàng..."))
+
+        with transaction.atomic():
+            repaired = repair_order_amounts(Order, dry_run=dry_run, batch_size=options['batch_size'])
+            if not dry_run:
+                # UPDATE không phát signal -> tự báo bảng số liệu ngày tính lại các ngày bị ảnh hưởng
+                mark_days_dirty({order_date for _, order_date, _, _ in repaired})
+
+        for order_id, _, raw, values in repaired:
+            before = ', '.join(f"{k}={raw[k]!r}" for k in raw)
+            after = ', '.join(f"{k}={values[k]}" for k in raw)
+            self.stdout.write(f"--- Đơn #{order_id}: {before} -> {after}")
+
+        action = 'Tìm thấy' if dry_run else 'Đã sửa'
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: {action} {len(repaired)} đơn hàng lỗi! ==="))
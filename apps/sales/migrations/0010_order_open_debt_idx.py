@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_merge_20260701_1523'),
+        ('customers', '0018_customer_last_call_fields'),
+        ('sales', '0009_merge_0003_order_order_date_index_0008_order_digitals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['is_paid', 'order_date'], name='sales_order_open_debt_idx'),
+        ),
+    ]
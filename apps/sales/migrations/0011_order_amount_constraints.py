@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:52
+
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+# Bản chép của apps.sales.amounts tại thời điểm viết migration: migration không import code của app,
+# để sửa đổi sau này ở amounts.py không làm đổi kết quả của migration đã chạy.
+AMOUNT_FIELDS = ('total_amount', 'actual_revenue', 'debt_amount')
+CANONICAL = re.compile(r'^\d+(\.0*)?$')
+
+
+def parse_amount(value):
+    if value is None:
+        return Decimal(0)
+    text = str(value).replace(',', '').replace(' ', '').strip()
+    try:
+        amount = Decimal(text) if text else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+    if not amount.is_finite() or amount < 0:
+        return Decimal(0)
+    return amount.quantize(Decimal(1), rounding=ROUND_HALF_UP)
+
+
+def repair_amounts(apps, schema_editor):
+    # Sửa dữ liệu lỗi trước khi thêm ràng buộc, nếu không AddConstraint sẽ thất bại
+    Order = apps.get_model('sales', 'Order')
+    rows = Order.objects.annotate(
+        **{f'txt_{field}': Cast(field, CharField()) for field in AMOUNT_FIELDS}
+    ).values_list('id', *[f'txt_{field}' for field in AMOUNT_FIELDS])
+
+    repaired = []
+    for order_id, *texts in rows.iterator(chunk_size=2000):
+        if all(text is not None and CANONICAL.match(text) for text in texts):
+            continue
+        raw = dict(zip(AMOUNT_FIELDS, texts))
+        total = parse_amount(raw['total_amount'])
+        revenue = parse_amount(raw['actual_revenue'])
+        if not total and revenue:
+            total = revenue
+        debt = max(total - revenue, Decimal(0)) if total else Decimal(0)
+        repaired.append((order_id, {
+            'total_amount': total,
+            'actual_revenue': revenue,
+            'debt_amount': debt,
+            'is_paid': debt <= 0 and total > 0,
+        }))
+    for order_id, values in repaired:
+        Order.objects.filter(id=order_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_merge_20260701_1523'),
+        ('customers', '0018_customer_last_call_fields'),
+        ('sales', '0010_order_open_debt_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(repair_amounts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.CheckConstraint(condition=models.Q(('total_amount__gte', 0)), name='sales_order_total_amount_gte_0'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.CheckConstraint(condition=models.Q(('actual_revenue__gte', 0)), name='sales_order_actual_revenue_gte_0'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.CheckConstraint(condition=models.Q(('debt_amount__gte', 0)), name='sales_order_debt_amount_gte_0'),
+        ),
+    ]
@@ -1,7 +1,6 @@
 from django.db import models
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from django.utils import timezone
 from datetime import date
 from apps.customers.models import Customer
 from apps.bookings.models import Appointment
@@ -66,6 +65,9 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PaymentMethod.choices, default=PaymentMethod.TRANSFER, verbose_name="Hình thức thanh toán")
     note = models.TextField(blank=True, verbose_name="Ghi chú đơn hàng")
     is_paid = models.BooleanField(default=False, verbose_name="Đã thanh toán (Hoàn thành)")
+    # [MỚI] Thời điểm đơn chuyển sang "đã thanh toán đủ" - mốc cho lần xuất CSV Meta "từ lần xuất trước"
+    # (null: chưa thanh toán đủ, hoặc đơn cũ đã thanh toán trước khi có cột này)
+    paid_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Thời điểm thanh toán đủ")
 
     # [THÊM MỚI] Tổng số buổi của liệu trình này (Lưu theo đơn hàng)
     total_sessions = models.PositiveIntegerField(
@@ -78,13 +80,13 @@ class Order(models.Model):
     def allocated_marketing_revenue(self):
         """
         Tính toán doanh thu phân bổ cho từng Fanpage để ghi nhận Digital Marketing.
+        Nhiều đơn cùng lúc: dùng apps.marketing.attribution.allocated_revenue (1 truy vấn cho cả danh sách).
         """
-        num_fanpages = self.customer.fanpages.count()
-        if num_fanpages > 0:
-            return self.actual_revenue / num_fanpages
-        return self.actual_revenue if self.customer.source == 'FACEBOOK' else 0
+        from apps.marketing.attribution import allocated_revenue
+        return allocated_revenue([self])[self.pk]
 
-    def save(self, *args, **kwargs):
+    def apply_amount_rules(self):
+        """Giá gốc / còn nợ / đã thanh toán suy ra từ số tiền. Dùng chung cho save() và bulk_create (checkout)."""
         if not self.pk and self.service:
             self.original_price = self.service.base_price
         
@@ -100,9 +102,14 @@ class Order(models.Model):
             
         if self.debt_amount <= 0 and self.total_amount > 0:
             self.is_paid = True
+            if self.paid_at is None:
+                self.paid_at = timezone.now()
         else:
             self.is_paid = False
-            
+            self.paid_at = None
+
+    def save(self, *args, **kwargs):
+        self.apply_amount_rules()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -115,9 +122,12 @@ class Order(models.Model):
         ordering = ['-order_date']
         indexes = [
             models.Index(fields=['order_date'], name='sales_order_order_date_idx'),
+            # Sổ công nợ: chỉ quét các đơn chưa thanh toán xong (is_paid=False) theo ngày
+            models.Index(fields=['is_paid', 'order_date'], name='sales_order_open_debt_idx'),
+        ]
+        # Cột tiền luôn là số không âm (dữ liệu cũ được sửa bởi migration 0011 / lệnh repair_order_amounts)
+        constraints = [
+            models.CheckConstraint(condition=models.Q(total_amount__gte=0), name='sales_order_total_amount_gte_0'),
+            models.CheckConstraint(condition=models.Q(actual_revenue__gte=0), name='sales_order_actual_revenue_gte_0'),
+            models.CheckConstraint(condition=models.Q(debt_amount__gte=0), name='sales_order_debt_amount_gte_0'),
         ]
-
-@receiver([post_save, post_delete], sender=Order)
-def update_customer_ranking(sender, instance, **kwargs):
-    if instance.customer:
-        instance.customer.update_ranking()
\ No newline at end of file
@@ -1,10 +1,15 @@
-from django.db.models.signals import post_save, post_delete
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Order
 from apps.bookings.models import Appointment 
+from apps.customers.ranking import mark_spent_dirty
 
 # [MỚI] Import hàm gửi dữ liệu Meta CAPI
-from apps.marketing.meta_capi import send_purchase_event_to_meta 
+from apps.marketing.meta_capi import enqueue_purchase_event
+from apps.marketing.models import MetaEventOutbox
 
 # --- [MỚI] TỰ ĐỘNG TẠO ĐƠN TỪ LỊCH HẸN VỚI ĐÚNG NGÀY ---
 @receiver(post_save, sender=Appointment)
@@ -41,33 +46,53 @@ def create_order_from_appointment(sender, instance, created, **kwargs):
                 order.save(update_fields=['order_date'])
 
 # --- CẬP NHẬT RANKING KHÁCH HÀNG ---
+# [TỐI ƯU] Chỉ đánh dấu khách có tiền đã thanh toán thay đổi, tính lại 1 lần mỗi transaction (apps.customers.ranking)
+def _paid_amount(is_paid, total_amount):
+    return Decimal(str(total_amount or 0)) if is_paid else Decimal(0)
+
+@receiver(pre_save, sender=Order)
+def remember_spent_before_save(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._ranking_old = Order.objects.filter(pk=instance.pk).values_list('customer_id', 'is_paid', 'total_amount').first()
+
 @receiver(post_save, sender=Order)
-def update_customer_ranking_on_save(sender, instance, created, **kwargs):
-    if instance.customer:
-        instance.customer.update_ranking()
+def update_customer_spent_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_ranking_old', None)
+    instance._ranking_old = None
+    instance._capi_old = old
+    changes = defaultdict(Decimal)
+    if old:
+        changes[old[0]] -= _paid_amount(old[1], old[2])
+    changes[instance.customer_id] += _paid_amount(instance.is_paid, instance.total_amount)
+    # Chỉ tính lại khách có số tiền đã thanh toán thực sự thay đổi
+    mark_spent_dirty(cid for cid, delta in changes.items() if delta)
 
 @receiver(post_delete, sender=Order)
-def update_customer_ranking_on_delete(sender, instance, **kwargs):
-    if instance.customer:
-        instance.customer.update_ranking()
+def update_customer_spent_on_delete(sender, instance, **kwargs):
+    if _paid_amount(instance.is_paid, instance.total_amount):
+        mark_spent_dirty([instance.customer_id])
 
 # --- [MỚI] GỬI SỰ KIỆN PURCHASE LÊN META CAPI ---
 @receiver(post_save, sender=Order)
-def trigger_meta_capi_on_payment(sender, instance, created, **kwargs):
+def trigger_meta_capi_on_payment(sender, instance, created, raw=False, **kwargs):
     """
     Tự động báo cáo doanh thu lên Facebook khi đơn hàng được thanh toán đủ.
+    [TỐI ƯU] Chỉ ghi sự kiện vào hàng đợi MetaEventOutbox (không gọi HTTP trong request checkout);
+    worker `send_meta_events` sẽ gửi theo lô.
+    Đơn vốn đã thanh toán từ trước (vd đơn của checkout đã có sự kiện gộp) thì chỉ cập nhật
+    sự kiện riêng đang chờ gửi của đơn, không sinh thêm sự kiện mới.
     """
-    if instance.is_paid:
-        customer = instance.customer
-        
-        # Chỉ gửi thông tin về Meta nếu khách có nguồn từ FACEBOOK
-        if customer and customer.source == 'FACEBOOK':
-            try:
-                # Gửi sự kiện Purchase với tổng doanh thu (total_amount)
-                response = send_purchase_event_to_meta(
-                    customer=customer, 
-                    amount=instance.total_amount
-                )
-                print(f"Đã gửi Meta CAPI - Khách: {customer.name} | Phản hồi: {response}")
-            except Exception as e:
-                print(f"Lỗi khi gửi Meta CAPI tại signal: {e}")
\ No newline at end of file
+    if raw or not instance.is_paid:
+        return
+    customer = instance.customer
+
+    # Chỉ gửi thông tin về Meta nếu khách có nguồn từ FACEBOOK
+    if not customer or customer.source != 'FACEBOOK':
+        return
+    old = getattr(instance, '_capi_old', None)
+    was_paid = bool(old and old[1])
+    if not was_paid or MetaEventOutbox.objects.filter(event_id=str(instance.pk)).exists():
+        enqueue_purchase_event(instance)
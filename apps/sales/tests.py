@@ -0,0 +1,193 @@
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.bookings.models import Appointment
+from apps.customers.models import Customer
+from apps.customers import ranking
+from apps.customers.ranking import refresh_spent, recompute_rankings
+from apps.sales.amounts import repair_order_amounts
+from apps.marketing.models import MetaEventOutbox
+from apps.sales.models import Order, Service
+from apps.telesales.models import CallLog
+
+User = get_user_model()
+
+
+class DebtManagerTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Rejuran', base_price=5000000)
+        self.sale = User.objects.create_user(username='sale', password='x', first_name='Lan', last_name='Trần', role='CONSULTANT')
+        self.client.force_login(User.objects.create_user(username='admin', password='x', role='ADMIN'))
+
+    def order(self, name, phone, day, total, paid):
+        customer = Customer.objects.create(name=name, phone=phone, source='FACEBOOK')
+        return Order.objects.create(
+            customer=customer, service=self.service, order_date=day,
+            total_amount=total, actual_revenue=paid, assigned_consultant=self.sale,
+        )
+
+    def test_filters_and_totals_in_sql(self):
+        self.order('Nguyễn Văn A', '0911111111', date(2025, 6, 1), 1000, 400)
+        self.order('Lê Thị B', '0922222222', date(2025, 6, 2), 2000, 500)
+        self.order('Phạm C', '0933333333', date(2025, 6, 2), 3000, 3000)  # Đã trả đủ
+        self.order('Võ D', '0944444444', date(2025, 5, 1), 1000, 0)
+
+        ctx = self.client.get('/sales/debt/', {'date_start': '2025-06-01', 'date_end': '2025-06-30'}).context
+        self.assertEqual((ctx['total_debt'], ctx['total_count']), (2100, 2))
+        self.assertEqual(ctx['sale_labels'], ['Trần Lan'])
+        self.assertEqual(ctx['date_data'], [600.0, 1500.0])
+
+        ctx = self.client.get('/sales/debt/', {'q': '0922'}).context
+        self.assertEqual([o.customer.name for o in ctx['debt_orders']], ['Lê Thị B'])
+
+    def test_paginates_open_debts(self):
+        for i in range(55):
+            self.order(f'Khách {i}', f'09000000{i:02d}', date(2025, 6, 1), 1000, 100)
+        resp = self.client.get('/sales/debt/', {'page': 2})
+        self.assertEqual(resp.context['total_count'], 55)
+        self.assertEqual(len(resp.context['debt_orders']), 5)
+
+
+class RepairOrderAmountsTests(TestCase):
+    def test_fixes_text_amounts_and_recomputes_debt(self):
+        service = Service.objects.create(name='Rejuran', base_price=5000000)
+        customer = Customer.objects.create(name='Nguyễn Văn A', phone='0912345678', source='FACEBOOK')
+        good = Order.objects.create(customer=customer, service=service, total_amount=1000, actual_revenue=400)
+        bad = Order.objects.create(customer=customer, service=service, total_amount=1000, actual_revenue=1000)
+        with connection.cursor() as cursor:
+            # Dữ liệu cũ import từ Excel: số có dấu phẩy lưu dạng chuỗi
+            cursor.execute(
+                "UPDATE sales_order SET total_amount = '1,500,000', actual_revenue = '500,000' WHERE id = %s", [bad.id]
+            )
+
+        repaired = repair_order_amounts(Order)
+        self.assertEqual([r[0] for r in repaired], [bad.id])
+        bad.refresh_from_db()
+        self.assertEqual((bad.total_amount, bad.actual_revenue, bad.debt_amount, bad.is_paid), (1500000, 500000, 1000000, False))
+        self.assertEqual(repair_order_amounts(Order), [])
+        good.refresh_from_db()
+        self.assertEqual(good.debt_amount, 600)
+
+
+class CustomerRankingTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Rejuran', base_price=5000000)
+        self.customer = Customer.objects.create(name='Nguyễn Văn A', phone='0912345678', source='OTHER')
+
+    def save_and_commit(self, func):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func()
+
+    def test_checkout_coalesces_ranking_updates(self):
+        with mock.patch.object(ranking._dirty_customers, 'handler', wraps=refresh_spent) as apply:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for _ in range(3):
+                        Order.objects.create(customer=self.customer, service=self.service, total_amount=8000000, actual_revenue=8000000)
+        apply.assert_called_once()
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_spent, self.customer.ranking), (24000000, 'GOLD'))
+
+    def test_running_total_follows_edits_and_deletes(self):
+        order = self.save_and_commit(lambda: Order.objects.create(customer=self.customer, service=self.service, total_amount=15000000, actual_revenue=5000000))
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_spent, self.customer.ranking), (0, 'MEMBER'))
+
+        order.actual_revenue = 15000000
+        self.save_and_commit(order.save)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_spent, self.customer.ranking), (15000000, 'SILVER'))
+
+        self.save_and_commit(order.delete)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_spent, self.customer.ranking), (0, 'MEMBER'))
+
+    def test_rolled_back_orders_do_not_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Order.objects.create(customer=self.customer, service=self.service, total_amount=50000000, actual_revenue=50000000)
+                    raise ValueError
+            except ValueError:
+                pass
+            Order.objects.create(customer=self.customer, service=self.service, total_amount=12000000, actual_revenue=12000000)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_spent, self.customer.ranking), (12000000, 'SILVER'))
+
+    def test_recompute_rankings_fixes_drift(self):
+        Order.objects.create(customer=self.customer, service=self.service, total_amount=80000000, actual_revenue=80000000)
+        Customer.objects.update(total_spent=0, ranking='MEMBER')
+        self.assertEqual(recompute_rankings(), 1)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_spent, self.customer.ranking), (80000000, 'DIAMOND'))
+        self.assertEqual(recompute_rankings(), 0)
+
+
+class CheckoutTests(TestCase):
+    url = '/reception/finish/'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='reception', password='x', role='ADMIN'))
+        self.customer = Customer.objects.create(name='Nguyễn Văn A', phone='0912345678', source='FACEBOOK')
+        self.services = [Service.objects.create(name=f'Dịch vụ {i}', base_price=1000000) for i in range(6)]
+
+    def finish(self, services, appt=None):
+        appt = appt or Appointment.objects.create(customer=self.customer, appointment_date=timezone.now())
+        data = {
+            'appointment_id': appt.id,
+            'result_status': 'buy',
+            'service_ids': [s.id for s in services],
+            'original_prices': ['1000000'] * len(services),
+            'final_amounts': ['900000'] * len(services),
+            'paid_amounts': ['900000'] * (len(services) - 1) + ['400000'],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, data)
+        return appt
+
+    def test_combo_creates_orders_with_one_ranking_update_and_one_capi_event(self):
+        with mock.patch.object(ranking._dirty_customers, 'handler', wraps=refresh_spent) as apply:
+            appt = self.finish(self.services[:3])
+        apply.assert_called_once()
+
+        orders = Order.objects.filter(customer=self.customer).order_by('id')
+        self.assertEqual(len(orders), 3)
+        self.assertEqual([o.appointment_id for o in orders], [appt.id, None, None])
+        self.assertEqual([o.is_paid for o in orders], [True, True, False])
+        self.assertEqual(orders[2].debt_amount, 500000)
+
+        event = MetaEventOutbox.objects.get()
+        self.assertEqual((event.event_id, event.order_id), (f'checkout-{appt.id}', orders[0].id))
+        self.assertEqual(event.payload['custom_data']['value'], 1800000)
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_spent, 1800000)
+        self.assertEqual(CallLog.objects.get(customer=self.customer).status, 'BOOKED')
+
+    def test_reuses_order_auto_created_for_appointment(self):
+        appt = Appointment.objects.create(customer=self.customer, appointment_date=timezone.now(), service=self.services[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            appt.status = 'COMPLETED'
+            appt.save()
+        auto = Order.objects.get(appointment=appt)
+
+        self.finish(self.services[1:3], appt=appt)
+        orders = Order.objects.filter(customer=self.customer).order_by('id')
+        self.assertEqual([o.id for o in orders][0], auto.id)
+        self.assertEqual([o.service_id for o in orders], [s.id for s in self.services[1:3]])
+        self.assertEqual(MetaEventOutbox.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_combo_size(self):
+        self.finish(self.services[:1])  # làm nóng cache content type / session
+        counts = []
+        for size in (2, 6):
+            with CaptureQueriesContext(connection) as ctx:
+                self.finish(self.services[:size])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
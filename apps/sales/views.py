@@ -1,49 +1,26 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q, CharField
-from django.db.models.functions import Cast
+from django.db.models import Sum, Count, Q, F, DecimalField, ExpressionWrapper
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from datetime import datetime, timedelta, time as dt_time
-from django.http import Http404, HttpResponse
-import csv
+from datetime import datetime, timedelta
+from django.core.paginator import Paginator
+from django.http import Http404, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 
 from apps.sales.models import Order, Service
-from apps.customers.models import Customer
-from apps.telesales.models import CallLog
+from apps.sales.amounts import parse_amount
 from apps.bookings.models import Appointment
 from apps.authentication.decorators import allowed_users
-from apps.marketing.meta_capi import clean_phone, split_vietnamese_name, remove_accents
+from apps.analytics.dates import day_range
+from apps.analytics.rollups import facts_between, pending_days_between
+from apps.marketing.models import MetaOfflineExport
+from apps.marketing.offline_export import export_queryset, stream_rows
 
 User = get_user_model()
 
-# --- BỘ CÔNG CỤ XỬ LÝ DỮ LIỆU AN TOÀN ---
-def safe_float(value):
-    if value is None: return 0.0
-    try:
-        if isinstance(value, (int, float)): return float(value)
-        clean_val = str(value).replace(',', '').strip()
-        if not clean_val: return 0.0
-        return float(clean_val)
-    except: return 0.0
-
-def get_safe_orders(queryset):
-    return queryset.annotate(
-        txt_total=Cast('total_amount', CharField()),
-        txt_revenue=Cast('actual_revenue', CharField()),
-        txt_debt=Cast('debt_amount', CharField())
-    ).defer('total_amount', 'actual_revenue', 'debt_amount')
-
-def hydrate_orders(orders_list):
-    for o in orders_list:
-        o.total_amount = safe_float(getattr(o, 'txt_total', 0))
-        o.actual_revenue = safe_float(getattr(o, 'txt_revenue', 0))
-        o.debt_amount = safe_float(getattr(o, 'txt_debt', 0))
-        o.safe_total = o.total_amount
-        o.safe_revenue = o.actual_revenue
-        o.safe_debt = o.debt_amount
-    return orders_list
+DEBT_PAGE_SIZE = 50
 
 # --- 1. [MỚI] VIEW CẤU HÌNH HOA HỒNG (CHỈ ADMIN) ---
 @login_required(login_url='/auth/login/')
@@ -75,60 +52,43 @@ def service_commission_config(request):
 
 # ---------------------------------------------------------
 
-# --- [MỚI] XUẤT CSV TOÀN BỘ KHÁCH ĐÃ MUA HÀNG THEO CHUẨN META OFFLINE EVENT SET ---
+# --- [MỚI] XUẤT CSV KHÁCH ĐÃ MUA HÀNG THEO CHUẨN META OFFLINE EVENT SET ---
 @login_required(login_url='/auth/login/')
 @allowed_users(allowed_roles=['ADMIN'])
 def export_meta_offline_events(request):
     """
-    Xuất toàn bộ đơn hàng đã thanh toán (từ trước tới nay) ra file CSV
+    Xuất đơn hàng đã thanh toán ra file CSV
     theo đúng các trường mà Meta Offline Event Set / Customer List chấp nhận.
     File này dùng để tự tải lên (upload) thủ công trong Meta Events Manager.
     Lưu ý: công cụ upload file thủ công của Meta tự hash dữ liệu ở phía họ,
     nên các trường định danh khách hàng ở đây chỉ chuẩn hoá (thường, bỏ dấu,
     SĐT có mã quốc gia) chứ KHÔNG băm SHA256 sẵn - khác với luồng gửi qua CAPI.
-    """
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="v-medical_meta_offline_events.csv"'
-    response.write('﻿')  # BOM để Excel đọc đúng UTF-8
-
-    writer = csv.writer(response)
-    writer.writerow([
-        'event_name', 'event_time', 'value', 'currency', 'order_id',
-        'email', 'phone', 'fn', 'ln', 'ct', 'country', 'gen', 'doby', 'external_id', 'lead_id',
-    ])
-
-    orders = Order.objects.filter(is_paid=True).select_related('customer').order_by('order_date')
-
-    for order in orders:
-        customer = order.customer
-        if not customer:
-            continue
-
-        first_name, last_name = split_vietnamese_name(customer.name)
-        gender_val = 'f' if customer.gender == 'FEMALE' else ('m' if customer.gender == 'MALE' else '')
-        birth_year = str(customer.dob.year) if customer.dob else ''
-        # Meta yêu cầu event_time dạng ISO 8601 (vd 2024-05-04T18:28:00Z),
-        # KHÔNG phải Unix timestamp - gửi số nguyên khiến Meta lỗi xử lý hàng loạt.
-        event_time = datetime.combine(order.order_date, dt_time.min).strftime('%Y-%m-%dT%H:%M:%SZ')
-
-        writer.writerow([
-            'Purchase',
-            event_time,
-            order.total_amount,
-            'VND',
-            order.id,
-            '',  # email: CRM hiện chưa lưu email khách hàng
-            clean_phone(customer.phone),
-            first_name,
-            last_name,
-            remove_accents(customer.city) if customer.city else '',
-            'VN',
-            gender_val,
-            birth_year,
-            str(customer.id),
-            customer.fb_lead_id or '',
-        ])
 
+    ?mode=ALL (mặc định, toàn bộ) | RANGE (&date_start=&date_end=) | SINCE_LAST (đơn mới từ lần xuất trước)
+    [TỐI ƯU] Stream từng dòng thay vì dựng cả file trong bộ nhớ.
+    """
+    mode = request.GET.get('mode', MetaOfflineExport.Mode.ALL)
+    if mode not in MetaOfflineExport.Mode.values:
+        mode = MetaOfflineExport.Mode.ALL
+    date_start = date_end = None
+    if mode == MetaOfflineExport.Mode.RANGE:
+        raw_start, raw_end = request.GET.get('date_start') or '', request.GET.get('date_end') or ''
+        try:
+            date_start, date_end = parse_date(raw_start), parse_date(raw_end)
+        except ValueError:  # đúng định dạng nhưng không có thật, vd 2026-02-31
+            date_start = date_end = None
+        if (raw_start and date_start is None) or (raw_end and date_end is None):
+            messages.error(request, "Khoảng ngày xuất CSV không hợp lệ.")
+            return redirect('sales_report')
+
+    orders, watermarks = export_queryset(Order.objects.all(), mode, date_start, date_end)
+    log = MetaOfflineExport(
+        mode=mode, date_start=date_start, date_end=date_end, created_by=request.user, **watermarks
+    )
+
+    filename = f"v-medical_meta_offline_events_{mode.lower()}_{timezone.localdate():%Y%m%d}.csv"
+    response = StreamingHttpResponse(stream_rows(orders, log), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 @login_required(login_url='/auth/login/')
@@ -144,13 +104,10 @@ def revenue_dashboard(request):
     consultant_id = request.GET.get('consultant_id')
     telesale_id = request.GET.get('telesale_id')
 
-    # [TỐI ƯU] Dùng range datetime đầy đủ (00:00:00 -> 23:59:59) thay vì
-    # appointment_date__date__range: lookup __date bọc hàm DATE() quanh cột
-    # khiến MySQL không dùng được index, phải quét toàn bảng Lịch hẹn.
-    date_start_obj = datetime.strptime(date_start, '%Y-%m-%d').date()
-    date_end_obj = datetime.strptime(date_end, '%Y-%m-%d').date()
-    dt_range_start = datetime.combine(date_start_obj, dt_time.min)
-    dt_range_end = datetime.combine(date_end_obj, dt_time.max)
+    # [TỐI ƯU] Lọc Lịch hẹn theo khoảng giờ có múi giờ [00:00 ngày đầu, 00:00 ngày sau ngày cuối)
+    # thay vì appointment_date__date__range (DATE() quanh cột -> MySQL không dùng được index).
+    appt_in_range = day_range('appointment_date', datetime.strptime(date_start, '%Y-%m-%d').date(),
+                              datetime.strptime(date_end, '%Y-%m-%d').date())
 
     orders_qs = Order.objects.filter(
         order_date__range=[date_start, date_end]
@@ -164,58 +121,47 @@ def revenue_dashboard(request):
         if telesale_id == 'none': orders_qs = orders_qs.filter(customer__assigned_telesale__isnull=True)
         elif telesale_id.isdigit(): orders_qs = orders_qs.filter(customer__assigned_telesale_id=telesale_id)
 
-    orders = hydrate_orders(list(get_safe_orders(orders_qs)))
-
-    total_sales = 0
-    total_revenue = 0
-    total_debt = 0
-    total_orders_success = 0
-    booked_appointment_ids = []
+    # [TỐI ƯU] Cột tiền đã được chuẩn hoá (lệnh repair_order_amounts + CheckConstraint) ->
+    # đọc thẳng Decimal, các con số tổng cộng dồn trong SQL thay vì ép chuỗi rồi parse từng đơn.
+    totals = orders_qs.aggregate(
+        sales=Sum('total_amount'), revenue=Sum('actual_revenue'), debt=Sum('debt_amount'),
+        success=Count('id', filter=Q(total_amount__gt=0)),
+    )
+    total_sales = totals['sales'] or 0
+    total_revenue = totals['revenue'] or 0
+    total_debt = totals['debt'] or 0
+    total_orders_success = totals['success']
 
     # --- [MỚI] TÍNH TOÁN HOA HỒNG KTV ---
+    # Hoa hồng = Thực thu * (% của Dịch vụ / 100), gom theo KTV ngay trong DB
+    ktv_rows = orders_qs.filter(appointment__assigned_technician__isnull=False).values(
+        'appointment__assigned_technician__username',
+        'appointment__assigned_technician__first_name',
+        'appointment__assigned_technician__last_name',
+    ).annotate(
+        total_revenue=Sum('actual_revenue'),
+        total_commission=Sum(
+            ExpressionWrapper(F('actual_revenue') * F('service__commission_rate') / 100, output_field=DecimalField(max_digits=20, decimal_places=2))
+        ),
+        order_count=Count('id'),
+    ).order_by()
     ktv_commission_map = {}
-
-    for o in orders:
-        total_sales += o.total_amount
-        total_revenue += o.actual_revenue
-        total_debt += o.debt_amount
-        if o.total_amount > 0:
-            total_orders_success += 1
-        
-        if o.appointment_id:
-            booked_appointment_ids.append(o.appointment_id)
-
-        # Logic tính hoa hồng KTV
-        if o.appointment and o.appointment.assigned_technician:
-            ktv = o.appointment.assigned_technician
-            ktv_name = f"{ktv.last_name} {ktv.first_name}".strip() or ktv.username
-            
-            # Lấy % từ Dịch vụ (Lấy trực tiếp từ DB)
-            rate_percent = 0
-            if o.service:
-                rate_percent = float(o.service.commission_rate) # Ví dụ: 0.5, 1, 5
-            
-            # Tính tiền: Thực thu * (% / 100)
-            commission_amount = float(o.actual_revenue) * (rate_percent / 100)
-            
-            if ktv_name not in ktv_commission_map:
-                ktv_commission_map[ktv_name] = {
-                    'name': ktv_name,
-                    'total_revenue': 0,
-                    'total_commission': 0,
-                    'order_count': 0,
-                }
-            
-            ktv_commission_map[ktv_name]['total_revenue'] += o.actual_revenue
-            ktv_commission_map[ktv_name]['total_commission'] += commission_amount
-            ktv_commission_map[ktv_name]['order_count'] += 1
+    for x in ktv_rows:
+        ktv_name = f"{x['appointment__assigned_technician__last_name']} {x['appointment__assigned_technician__first_name']}".strip() or x['appointment__assigned_technician__username']
+        row = ktv_commission_map.setdefault(ktv_name, {'name': ktv_name, 'total_revenue': 0, 'total_commission': 0, 'order_count': 0})
+        row['total_revenue'] += x['total_revenue'] or 0
+        row['total_commission'] += float(x['total_commission'] or 0)
+        row['order_count'] += x['order_count']
 
     ktv_commission_table = sorted(ktv_commission_map.values(), key=lambda x: x['total_commission'], reverse=True)
     avg_order_value = int(total_sales / total_orders_success) if total_orders_success > 0 else 0
 
+    orders = list(orders_qs)
+    booked_appointment_ids = [o.appointment_id for o in orders if o.appointment_id]
+
     # Lấy Ca thất bại
     failed_apps = Appointment.objects.filter(
-        appointment_date__range=[dt_range_start, dt_range_end],
+        appt_in_range,
         status='COMPLETED'
     ).exclude(id__in=booked_appointment_ids).select_related('customer', 'assigned_consultant', 'customer__assigned_telesale', 'order')
 
@@ -279,8 +225,8 @@ def revenue_dashboard(request):
         consultants_list = consultants_list.filter(id=consultant_id)
 
     perf_apps_qs = Appointment.objects.filter(
-        assigned_consultant__isnull=False,
-        appointment_date__range=[dt_range_start, dt_range_end]
+        appt_in_range,
+        assigned_consultant__isnull=False
     ).select_related('order')
     if consultant_id and consultant_id.isdigit():
         perf_apps_qs = perf_apps_qs.filter(assigned_consultant_id=consultant_id)
@@ -374,11 +320,8 @@ def update_order_details(request):
             item_type = request.POST.get('item_type')
             
             if item_type == 'order':
-                qs = Order.objects.filter(id=item_id)
-                safe_qs = get_safe_orders(qs)
-                if not safe_qs.exists(): raise Exception("Không tìm thấy đơn hàng")
-                order = safe_qs.first()
-                hydrate_orders([order])
+                order = Order.objects.filter(id=item_id).first()
+                if not order: raise Exception("Không tìm thấy đơn hàng")
                 
                 new_cons_id = request.POST.get('consultant_id')
                 new_svc_id = request.POST.get('service_id')
@@ -387,7 +330,7 @@ def update_order_details(request):
                 
                 new_amount = request.POST.get('total_amount')
                 if new_amount is not None:
-                    clean_amt = safe_float(new_amount)
+                    clean_amt = parse_amount(new_amount)
                     order.total_amount = clean_amt
                     order.actual_revenue = clean_amt
                 
@@ -440,11 +383,8 @@ def update_order_details(request):
 @login_required(login_url='/auth/login/')
 @allowed_users(allowed_roles=['RECEPTIONIST', 'ADMIN', 'TELESALE', 'CONSULTANT'])
 def print_invoice(request, order_id):
-    qs = Order.objects.filter(id=order_id)
-    safe_qs = get_safe_orders(qs)
-    if not safe_qs.exists(): raise Http404("Đơn hàng không tồn tại")
-    order = safe_qs.first()
-    hydrate_orders([order])
+    order = Order.objects.select_related('customer', 'service').filter(id=order_id).first()
+    if not order: raise Http404("Đơn hàng không tồn tại")
     return render(request, 'sales/invoice_print.html', {
         'order': order, 
         'now': timezone.now(),
@@ -454,48 +394,52 @@ def print_invoice(request, order_id):
 @login_required(login_url='/auth/login/')
 @allowed_users(allowed_roles=['ADMIN', 'RECEPTIONIST', 'TELESALE', 'CONSULTANT'])
 def debt_manager(request):
-    qs = Order.objects.select_related('customer', 'service', 'assigned_consultant').order_by('-order_date')
-    orders_all = hydrate_orders(list(get_safe_orders(qs)))
-    
     date_start = request.GET.get('date_start')
     date_end = request.GET.get('date_end')
     search_query = request.GET.get('q', '').strip().lower()
     
-    d_start, d_end = None, None
+    # [TỐI ƯU] Lọc ngày / tìm kiếm / còn nợ ngay trong SQL (dùng index is_paid + order_date)
+    # thay vì tải toàn bộ đơn hàng từ trước tới nay rồi lọc bằng vòng lặp Python.
+    # Đơn còn nợ luôn có is_paid=False (xem Order.save), điều kiện này giúp DB chỉ quét phần đơn chưa xong.
+    debts = Order.objects.filter(is_paid=False, debt_amount__gt=0)
+
     if date_start and date_end:
         try:
             d_start = datetime.strptime(date_start, '%Y-%m-%d').date()
             d_end = datetime.strptime(date_end, '%Y-%m-%d').date()
-        except: pass
-
-    filtered_orders = []
-    total_debt = 0
-    
-    for o in orders_all:
-        if d_start and d_end and not (d_start <= o.order_date <= d_end): continue
-        if search_query:
-            if (search_query not in (o.customer.name or '').lower()) and (search_query not in (o.customer.phone or '').lower()):
-                continue
-        if o.debt_amount > 0:
-            filtered_orders.append(o)
-            total_debt += o.debt_amount
-
-    debt_by_sale = {}
-    debt_by_date = {}
-    for o in filtered_orders:
-        cons = o.assigned_consultant
-        name = f"{cons.last_name} {cons.first_name}".strip() if (cons and cons.first_name) else (cons.username if cons else "Chưa gán")
-        debt_by_sale[name] = debt_by_sale.get(name, 0) + o.debt_amount
-        debt_by_date[o.order_date] = debt_by_date.get(o.order_date, 0) + o.debt_amount
-
-    sorted_sale = sorted(debt_by_sale.items(), key=lambda x: x[1], reverse=True)[:5]
-    sorted_dates = sorted(debt_by_date.keys())
+            debts = debts.filter(order_date__range=[d_start, d_end])
+        except ValueError: pass
+
+    if search_query:
+        debts = debts.filter(Q(customer__name__icontains=search_query) | Q(customer__phone__icontains=search_query))
+
+    summary = debts.aggregate(total=Sum('debt_amount'), count=Count('id'))
+    total_debt = summary['total'] or 0
+    total_count = summary['count']
+
+    sorted_sale = []
+    by_sale = debts.values(
+        'assigned_consultant__username', 'assigned_consultant__first_name', 'assigned_consultant__last_name'
+    ).annotate(total=Sum('debt_amount')).order_by('-total')[:5]
+    for x in by_sale:
+        if not x['assigned_consultant__username']: name = "Chưa gán"
+        elif x['assigned_consultant__first_name']: name = f"{x['assigned_consultant__last_name']} {x['assigned_consultant__first_name']}".strip()
+        else: name = x['assigned_consultant__username']
+        sorted_sale.append((name, float(x['total'])))
+
+    by_date = debts.values('order_date').annotate(total=Sum('debt_amount')).order_by('order_date')
+
+    paginator = Paginator(
+        debts.select_related('customer', 'service', 'assigned_consultant').order_by('-order_date', '-id'), DEBT_PAGE_SIZE
+    )
+    paginator.count = total_count  # Đã đếm cùng tổng nợ ở trên, không COUNT lại
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     context = {
-        'debt_orders': filtered_orders, 'total_debt': total_debt, 'total_count': len(filtered_orders),
+        'debt_orders': page_obj, 'page_obj': page_obj, 'total_debt': total_debt, 'total_count': total_count,
         'search_query': search_query, 'date_start': date_start, 'date_end': date_end,
         'sale_labels': [k for k,v in sorted_sale], 'sale_data': [v for k,v in sorted_sale],
-        'date_labels': [d.strftime('%d/%m') for d in sorted_dates], 'date_data': [debt_by_date[d] for d in sorted_dates],
+        'date_labels': [x['order_date'].strftime('%d/%m') for x in by_date], 'date_data': [float(x['total']) for x in by_date],
     }
     return render(request, 'sales/debt_list.html', context)
 
@@ -528,70 +472,67 @@ def admin_dashboard(request):
     prev_end = date_start - timedelta(days=1)
     prev_start = prev_end - timedelta(days=days_diff)
 
-    qs_current = Order.objects.filter(order_date__range=[date_start, date_end], is_paid=True)
-    orders_current = hydrate_orders(list(get_safe_orders(qs_current)))
-    
-    qs_prev = Order.objects.filter(order_date__range=[prev_start, prev_end], is_paid=True)
-    orders_prev = hydrate_orders(list(get_safe_orders(qs_prev)))
-
-    revenue_current = 0
-    trend_data = {}
-    service_map = {}
-    telesale_map = {}
-
-    for o in orders_current:
-        revenue_current += o.total_amount
-        if o.order_date: trend_data[o.order_date] = trend_data.get(o.order_date, 0) + o.total_amount
-        svc_name = o.service.name if o.service else "Khác"
-        service_map[svc_name] = service_map.get(svc_name, 0) + o.total_amount
-        tele = o.customer.assigned_telesale if o.customer else None
-        tele_name = f"{tele.last_name} {tele.first_name}".strip() if (tele and tele.first_name) else (tele.username if tele else "Không có Telesale")
-        telesale_map[tele_name] = telesale_map.get(tele_name, 0) + o.total_amount
+    # [TỐI ƯU] Doanh số / Lead / Cuộc gọi đọc từ bảng tổng hợp theo ngày (apps.analytics)
+    # thay vì quét toàn bộ đơn hàng thô của kỳ hiện tại và kỳ trước.
+    facts_current = facts_between(date_start, date_end)
+    facts_prev = facts_between(prev_start, prev_end)
 
-    revenue_previous = sum(o.total_amount for o in orders_prev)
+    totals = facts_current.aggregate(revenue=Sum('paid_sales'), calls=Sum('calls'), leads=Sum('leads'))
+    revenue_current = round(totals['revenue'] or 0)
+    revenue_previous = round(facts_prev.aggregate(s=Sum('paid_sales'))['s'] or 0)
     growth_rate = 0
     if revenue_previous > 0:
         growth_rate = ((revenue_current - revenue_previous) / revenue_previous) * 100
     elif revenue_current > 0: growth_rate = 100
 
-    appts_total = Appointment.objects.filter(appointment_date__date__range=[date_start, date_end]).values('customer').distinct().count()
-    appts_arrived = Appointment.objects.filter(appointment_date__date__range=[date_start, date_end], status__in=['ARRIVED', 'COMPLETED']).values('customer').distinct().count()
+    appts_total = Appointment.objects.filter(day_range('appointment_date', date_start, date_end)).values('customer').distinct().count()
+    appts_arrived = Appointment.objects.filter(day_range('appointment_date', date_start, date_end), status__in=['ARRIVED', 'COMPLETED']).values('customer').distinct().count()
     arrival_rate = (appts_arrived / appts_total * 100) if appts_total > 0 else 0
-    calls_total = CallLog.objects.filter(call_time__date__range=[date_start, date_end]).count()
-    leads_total = Customer.objects.filter(created_at__date__range=[date_start, date_end]).count()
-
-    sorted_trend = sorted(trend_data.keys())
-    chart_labels = [d.strftime('%d/%m') for d in sorted_trend]
-    chart_data = [trend_data[d] for d in sorted_trend]
-
-    sorted_svc = sorted(service_map.items(), key=lambda x: x[1], reverse=True)[:5]
-    service_labels = [k for k,v in sorted_svc]
-    service_data = [v for k,v in sorted_svc]
-
-    sorted_tele = sorted(telesale_map.items(), key=lambda x: x[1], reverse=True)[:5]
-    top_telesales = [{'name': k, 'total': v} for k,v in sorted_tele]
+    calls_total = round(totals['calls'] or 0)
+    leads_total = round(totals['leads'] or 0)
+
+    paid_facts = facts_current.filter(paid_orders__gt=0)
+    trend_data = paid_facts.values('day').annotate(total=Sum('paid_sales')).order_by('day')
+    chart_labels = [x['day'].strftime('%d/%m') for x in trend_data]
+    chart_data = [round(x['total']) for x in trend_data]
+
+    sorted_svc = paid_facts.values('service__name').annotate(total=Sum('paid_sales')).order_by('-total')[:5]
+    service_labels = [x['service__name'] or "Khác" for x in sorted_svc]
+    service_data = [round(x['total']) for x in sorted_svc]
+
+    sorted_tele = paid_facts.values('telesale__username', 'telesale__first_name', 'telesale__last_name').annotate(total=Sum('paid_sales')).order_by('-total')[:5]
+    top_telesales = []
+    for x in sorted_tele:
+        if not x['telesale__username']: name = "Không có Telesale"
+        elif x['telesale__first_name']: name = f"{x['telesale__last_name']} {x['telesale__first_name']}".strip()
+        else: name = x['telesale__username']
+        top_telesales.append({'name': name, 'total': round(x['total'])})
+
+    consultant_sales = {
+        x['consultant']: x for x in paid_facts.values('consultant').annotate(total_orders=Sum('paid_orders'), revenue=Sum('paid_sales'))
+    }
 
     consultant_stats_filtered = []
     for cons in consultants:
-        apps_filtered = Appointment.objects.filter(assigned_consultant=cons, appointment_date__date__range=[date_start, date_end])
+        apps_filtered = Appointment.objects.filter(day_range('appointment_date', date_start, date_end), assigned_consultant=cons)
         assigned = apps_filtered.count()
         checkin = apps_filtered.filter(status__in=['ARRIVED', 'IN_CONSULTATION', 'COMPLETED']).count()
         success = apps_filtered.filter(status='COMPLETED', order__isnull=False).distinct().count()
         failed = apps_filtered.filter(status='COMPLETED', order__isnull=True).count()
         
-        my_orders = [o for o in orders_current if o.assigned_consultant_id == cons.id]
-        rev_filtered = sum(o.total_amount for o in my_orders)
+        my_sales = consultant_sales.get(cons.id, {})
+        total_orders = round(my_sales.get('total_orders') or 0)
+        rev_filtered = round(my_sales.get('revenue') or 0)
         
-        if assigned > 0 or len(my_orders) > 0:
+        if assigned > 0 or total_orders > 0:
             consultant_stats_filtered.append({
                 'name': f"{cons.last_name} {cons.first_name}".strip() or cons.username,
                 'assigned': assigned, 'checkin': checkin, 'success': success,
-                'failed': failed, 'total_orders': len(my_orders), 'revenue': rev_filtered,
+                'failed': failed, 'total_orders': total_orders, 'revenue': rev_filtered,
                 'avg_revenue': int(rev_filtered / checkin) if checkin > 0 else 0
             })
 
-    qs_recent = Order.objects.filter(order_date__range=[date_start, date_end]).order_by('-order_date')[:10]
-    recent_orders = hydrate_orders(list(get_safe_orders(qs_recent)))
+    recent_orders = Order.objects.filter(order_date__range=[date_start, date_end]).select_related('customer', 'service').order_by('-order_date')[:10]
 
     context = {
         'date_start': date_start.strftime('%Y-%m-%d'),
@@ -604,5 +545,6 @@ def admin_dashboard(request):
         'consultant_stats_filtered': consultant_stats_filtered,
         'top_telesales': top_telesales,
         'recent_orders': recent_orders,
+        'rollup_pending': pending_days_between(prev_start, date_end),
     }
     return render(request, 'admin_dashboard.html', context)
\ No newline at end of file
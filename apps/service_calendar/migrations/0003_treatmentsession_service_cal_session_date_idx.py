@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0020_customer_customers_created_idx'),
+        ('sales', '0011_order_amount_constraints'),
+        ('service_calendar', '0002_remove_reminderlog_appointment_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='treatmentsession',
+            index=models.Index(fields=['session_date'], name='service_cal_session_date_idx'),
+        ),
+    ]
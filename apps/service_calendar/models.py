@@ -25,6 +25,9 @@ class TreatmentSession(models.Model):
         verbose_name = "Buổi điều trị (Tour)"
         verbose_name_plural = "Lịch sử Tour KTV"
         ordering = ['-session_date']
+        indexes = [
+            models.Index(fields=['session_date'], name='service_cal_session_date_idx'),
+        ]
 
 # (Giữ lại ReminderLog cũ nếu cần, hoặc xóa đi nếu bạn muốn thay thế hoàn toàn)
 class ReminderLog(models.Model):
@@ -12,6 +12,7 @@ from apps.customers.models import Customer
 from apps.sales.models import Order, Service
 from .models import TreatmentSession
 from apps.authentication.decorators import allowed_users
+from apps.analytics.dates import day_range
 
 User = get_user_model()
 
@@ -52,9 +53,9 @@ def technician_workspace(request):
     # --- 3. TRUY VẤN LỊCH SỬ & LEADERBOARD THEO BỘ LỌC ---
     
     # Query cơ bản: Lọc theo ngày
-    # Lưu ý: __date__range lọc theo ngày (bỏ qua giờ phút)
+    # [TỐI ƯU] Lọc theo khoảng giờ [00:00 ngày đầu, 00:00 ngày sau ngày cuối) -> dùng index session_date
     base_qs = TreatmentSession.objects.filter(
-        session_date__date__range=(date_start, date_end)
+        day_range('session_date', date_start, date_end)
     ).select_related('customer', 'service', 'technician', 'order', 'doctor')
 
     # A. BẢNG LỊCH SỬ (HISTORY)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from apps.customers.models import Customer
+from apps.telesales.models import CallLog
+
+
+class Command(BaseCommand):
+    help = 'Tính lại các cột last_call_status / last_call_time / last_callback_time của Khách hàng từ bảng CallLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Số khách cập nhật trong mỗi lô (theo khoảng ID)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Customer.objects.aggregate(m=Max('id'))['m'] or 0
+
+        latest_log = CallLog.objects.filter(customer=OuterRef('pk')).order_by('-call_time', '-id')
+
+        self.stdout.write(self.style.SUCCESS(f"Bắt đầu đồng bộ trạng thái cuộc gọi cho khách ID 1 -> {max_id}..."))
+
+        updated = 0
+        start = 0
+        while start < max_id:
+            end = start + batch_size
+            # Mỗi lô là 1 câu UPDATE duy nhất (subquery chạy trong DB), giữ khoá ngắn
+            with transaction.atomic():
+                updated += Customer.objects.filter(id__gt=start, id__lte=end).update(
+                    last_call_status=Subquery(latest_log.values('status')[:1]),
+                    last_call_time=Subquery(latest_log.values('call_time')[:1]),
+                    last_callback_time=Subquery(latest_log.values('callback_time')[:1]),
+                )
+            self.stdout.write(f"--- Đã xử lý đến ID {min(end, max_id)}")
+            start = end
+
+        self.stdout.write(self.style.SUCCESS(f"=== HOÀN THÀNH: Đã đồng bộ {updated} khách hàng! ==="))
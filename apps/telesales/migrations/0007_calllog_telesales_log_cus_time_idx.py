@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0018_customer_last_call_fields'),
+        ('telesales', '0006_alter_calllog_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calllog',
+            index=models.Index(fields=['customer', 'call_time'], name='telesales_log_cus_time_idx'),
+        ),
+    ]
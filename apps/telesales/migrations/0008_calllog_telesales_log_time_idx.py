@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0020_customer_customers_created_idx'),
+        ('telesales', '0007_calllog_telesales_log_cus_time_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calllog',
+            index=models.Index(fields=['call_time'], name='telesales_log_time_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from apps.customers.models import Customer
 
 class CallLog(models.Model):
@@ -32,4 +35,53 @@ class CallLog(models.Model):
 
     class Meta:
         verbose_name = "Lịch sử cuộc gọi"
-        verbose_name_plural = "Quản lý Telesale"
\ No newline at end of file
+        verbose_name_plural = "Quản lý Telesale"
+        indexes = [
+            models.Index(fields=['customer', 'call_time'], name='telesales_log_cus_time_idx'),
+            models.Index(fields=['call_time'], name='telesales_log_time_idx'),
+        ]
+
+
+def refresh_customer_last_call(customer_id):
+    """Tính lại các cột last_call_* của 1 khách từ log mới nhất (dùng khi sửa/xoá log)."""
+    latest = CallLog.objects.filter(customer_id=customer_id).order_by('-call_time', '-id').values(
+        'status', 'call_time', 'callback_time'
+    ).first() or {}
+    Customer.objects.filter(pk=customer_id).update(
+        last_call_status=latest.get('status'),
+        last_call_time=latest.get('call_time'),
+        last_callback_time=latest.get('callback_time'),
+    )
+
+
+# --- ĐỒNG BỘ "KẾT QUẢ CUỘC GỌI GẦN NHẤT" SANG BẢNG KHÁCH HÀNG ---
+@receiver(pre_save, sender=CallLog)
+def remember_old_call_customer(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    # Log bị chuyển sang khách khác -> khách cũ cũng phải tính lại
+    instance._old_customer_id = CallLog.objects.filter(pk=instance.pk).values_list('customer_id', flat=True).first()
+
+@receiver(post_save, sender=CallLog)
+def sync_customer_last_call_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_customer_id = getattr(instance, '_old_customer_id', None)
+    instance._old_customer_id = None
+    if old_customer_id and old_customer_id != instance.customer_id:
+        refresh_customer_last_call(old_customer_id)
+    if created:
+        # Log mới: chỉ 1 câu UPDATE có điều kiện, không cần đọc lại lịch sử
+        Customer.objects.filter(pk=instance.customer_id).filter(
+            Q(last_call_time__isnull=True) | Q(last_call_time__lte=instance.call_time)
+        ).update(
+            last_call_status=instance.status,
+            last_call_time=instance.call_time,
+            last_callback_time=instance.callback_time,
+        )
+    else:
+        refresh_customer_last_call(instance.customer_id)
+
+@receiver(post_delete, sender=CallLog)
+def sync_customer_last_call_on_delete(sender, instance, **kwargs):
+    refresh_customer_last_call(instance.customer_id)
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Phân trang hàng đợi khách hàng (cột bên trái Telesale Dashboard) theo con trỏ (keyset).
+
+Thay vì OFFSET/LIMIT hoặc tải toàn bộ queryset, mỗi trang chỉ lấy đúng N dòng
+tiếp theo sau dòng cuối của trang trước: WHERE (created_at, id) < (cursor).
+Chi phí mỗi trang không phụ thuộc tổng số lead.
+Dòng có cột sắp xếp NULL luôn đứng cuối (theo id), con trỏ của chúng mang giá trị null.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+QUEUE_PAGE_SIZE = 50
+QUEUE_TOTAL_CACHE_SECONDS = 60
+
+# Thứ tự sắp xếp của từng bộ lọc: (tên cột thời gian, giảm dần?)
+# Data chăm thêm sắp theo giờ hẹn gọi lại tăng dần, còn lại theo ngày tạo mới nhất.
+QUEUE_ORDERING = {
+    'callback': ('last_callback_time', False),
+}
+DEFAULT_ORDERING = ('created_at', True)
+
+
+def get_queue_ordering(filter_type):
+    return QUEUE_ORDERING.get(filter_type, DEFAULT_ORDERING)
+
+
+def order_queue(customers, filter_type):
+    field, descending = get_queue_ordering(filter_type)
+    if descending:
+        return customers.order_by(F(field).desc(nulls_last=True), '-id')
+    return customers.order_by(F(field).asc(nulls_last=True), 'id')
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat() if value is not None else None, pk])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """Trả về (datetime hoặc None, id), hoặc None nếu con trỏ hỏng/không hợp lệ."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+        value, pk = json.loads(raw)
+        pk = int(pk)
+        if value is not None:
+            value = parse_datetime(value)
+            if value is None:
+                return None
+    except (ValueError, TypeError):
+        return None
+    return value, pk
+
+
+def paginate_queue(customers, filter_type, cursor=None, limit=QUEUE_PAGE_SIZE):
+    """
+    Lấy 1 trang hàng đợi sau con trỏ `cursor`.
+    Trả về (danh sách khách, con trỏ trang kế tiếp hoặc None nếu đã hết).
+    """
+    field, descending = get_queue_ordering(filter_type)
+    customers = order_queue(customers, filter_type)
+
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        after_id = Q(id__lt=pk) if descending else Q(id__gt=pk)
+        if value is None:
+            # Đang ở phần đuôi NULL: chỉ còn các dòng NULL sau id
+            customers = customers.filter(after_id, **{f'{field}__isnull': True})
+        else:
+            beyond = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+            customers = customers.filter(
+                beyond | (Q(**{field: value}) & after_id) | Q(**{f'{field}__isnull': True})
+            )
+
+    # Lấy dư 1 dòng để biết còn trang sau hay không (không cần COUNT)
+    rows = list(customers[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+    return rows, next_cursor
+
+
+def cached_queue_total(customers, request, filter_type):
+    """
+    Tổng số khách của hàng đợi (chỉ để hiển thị) - COUNT được cache ngắn hạn
+    theo bộ lọc + phạm vi team, nên phân trang/chuyển khách không đếm lại.
+    """
+    params = request.GET.copy()
+    for key in ('id', 'cursor'):
+        params.pop(key, None)
+    scope = getattr(request.user, 'team', None) if request.user.role == 'TELESALE' else 'ALL'
+    fingerprint = f"{scope}|{filter_type}|{params.urlencode()}"
+    cache_key = 'telesale_queue_total:' + hashlib.md5(fingerprint.encode('utf-8')).hexdigest()
+
+    total = cache.get(cache_key)
+    if total is None:
+        total = customers.order_by().count()
+        cache.set(cache_key, total, QUEUE_TOTAL_CACHE_SECONDS)
+    return total
@@ -0,0 +1,189 @@
+"""
+Engine tổng hợp số liệu cho trang Báo cáo Telesale (`telesale_report`).
+
+Mọi bảng phân tích đều được tính bằng GROUP BY / aggregate có điều kiện ngay trong DB,
+nên số câu truy vấn là hằng số - không tăng theo số nhân viên hay số lead.
+(Trước đây: 4-5 câu COUNT cho MỖI telesale + duyệt từng khách trong Python để chia nhóm tuổi.)
+"""
+from datetime import date
+
+from django.db.models import Count, Q
+
+from apps.customers.models import Customer
+from apps.telesales.models import CallLog
+
+# Nhóm tuổi hiển thị trên báo cáo: (nhãn, tuổi từ, tuổi đến)
+AGE_BUCKETS = [
+    ('18-25', 18, 25),
+    ('26-35', 26, 35),
+    ('36-45', 36, 45),
+    ('46-55', 46, 55),
+]
+
+
+def _percent(count, total):
+    return round(count / total * 100, 1) if total else 0
+
+
+def _years_ago(today, years):
+    """Ngày tương ứng cách `today` đúng `years` năm (29/02 lùi về 28/02 nếu năm đích không nhuận)."""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def age_group_counts(customers, today=None):
+    """
+    Chia nhóm tuổi bằng 1 câu aggregate (COUNT ... FILTER theo khoảng ngày sinh).
+    Giữ nguyên quy ước cũ của `Customer.age`: không có ngày sinh hoặc chưa đủ 1 tuổi -> 'Unknown',
+    mọi trường hợp còn lại ngoài 4 nhóm chính -> '55+'.
+    """
+    today = today or date.today()
+    aggregates = {
+        'total': Count('id'),
+        'Unknown': Count('id', filter=Q(dob__isnull=True) | Q(dob__gt=_years_ago(today, 1))),
+    }
+    for label, age_from, age_to in AGE_BUCKETS:
+        # tuổi trong [age_from, age_to]  <=>  ngày sinh trong (today - (age_to+1) năm, today - age_from năm]
+        aggregates[label] = Count('id', filter=Q(
+            dob__lte=_years_ago(today, age_from), dob__gt=_years_ago(today, age_to + 1)
+        ))
+
+    row = customers.order_by().aggregate(**aggregates)
+    groups = {label: row[label] for label, _, _ in AGE_BUCKETS}
+    groups['55+'] = row['total'] - row['Unknown'] - sum(groups.values())
+    groups['Unknown'] = row['Unknown']
+    return groups
+
+
+def customer_breakdowns(customers, total_leads):
+    """Phân bổ lead theo Nguồn / Fanpage / Tỉnh thành / Giới tính / Da / Trạng thái - mỗi chiều 1 câu GROUP BY."""
+    customers = customers.order_by()
+
+    source_labels = dict(Customer.Source.choices)
+    source_stats = customers.values('source').annotate(count=Count('id')).order_by('-count')
+    source_data = [
+        {'code': x['source'], 'label': source_labels.get(x['source'], 'Khác'), 'count': x['count'], 'percent': _percent(x['count'], total_leads)}
+        for x in source_stats
+    ]
+
+    fanpage_dict = dict(Customer.FanpageChoices.choices)
+    unmapped_fanpage_count = 0
+    fanpage_data = []
+    for x in customers.values('fanpage').annotate(count=Count('id')):
+        code = x['fanpage']
+        if not code or code not in fanpage_dict:
+            unmapped_fanpage_count += x['count']
+            continue
+        fanpage_data.append({'code': code, 'label': fanpage_dict[code], 'count': x['count'], 'percent': _percent(x['count'], total_leads)})
+    if unmapped_fanpage_count > 0:
+        fanpage_data.append({'code': 'None', 'label': "Chưa cập nhật/Mã lỗi", 'count': unmapped_fanpage_count, 'percent': _percent(unmapped_fanpage_count, total_leads)})
+    fanpage_data.sort(key=lambda x: x['count'], reverse=True)
+
+    city_stats = [
+        {'city': x['city'], 'count': x['count'], 'code': 'None' if not x['city'] else x['city']}
+        for x in customers.values('city').annotate(count=Count('id')).order_by('-count')
+    ]
+
+    gender_labels = dict(Customer.Gender.choices)
+    gender_data = [
+        {'code': x['gender'], 'label': gender_labels.get(x['gender'], 'Không rõ'), 'count': x['count']}
+        for x in customers.values('gender').annotate(count=Count('id'))
+    ]
+
+    skin_labels = dict(Customer.SkinIssue.choices)
+    skin_data = [
+        {'code': x['skin_condition'], 'label': skin_labels.get(x['skin_condition'], 'Không rõ'), 'count': x['count'], 'percent': _percent(x['count'], total_leads)}
+        for x in customers.values('skin_condition').annotate(count=Count('id')).order_by('-count')
+    ]
+
+    status_map = {x['last_call_status']: x['total'] for x in customers.values('last_call_status').annotate(total=Count('id'))}
+    data_quality_list = []
+    total_counted = 0
+    for code, label in CallLog.CallStatus.choices:
+        if code == 'NEW': continue
+        count = status_map.get(code, 0)
+        if count > 0:
+            data_quality_list.append({'code': code, 'label': label, 'count': count, 'rate': _percent(count, total_leads)})
+            total_counted += count
+    count_uncontacted = total_leads - total_counted
+    if count_uncontacted > 0:
+        data_quality_list.append({'code': 'NEW', 'label': 'Mới / Chưa gọi', 'count': count_uncontacted, 'rate': _percent(count_uncontacted, total_leads)})
+    data_quality_list.sort(key=lambda x: x['count'], reverse=True)
+
+    return {
+        'source_data': source_data,
+        'fanpage_data': fanpage_data,
+        'city_stats': city_stats,
+        'gender_data': gender_data,
+        'skin_data': skin_data,
+        'data_quality_list': data_quality_list,
+    }
+
+
+def telesale_performance(telesales, customers, bookings):
+    """
+    Bảng hiệu suất theo data được giao: số khách được giao, số cuộc gọi, số khách đã đặt lịch.
+    3 câu GROUP BY cho toàn bộ team thay vì 3 câu cho mỗi người.
+    `bookings`: queryset Appointment (đã lọc kỳ + trạng thái hợp lệ) của các khách trong `customers`.
+    """
+    customer_ids = customers.order_by().values('id')
+
+    assigned_map = dict(
+        customers.order_by().values_list('assigned_telesale').annotate(c=Count('id'))
+    )
+    calls_map = dict(
+        CallLog.objects.filter(customer_id__in=customer_ids)
+        .order_by().values_list('caller').annotate(c=Count('id'))
+    )
+    booked_map = dict(
+        bookings.filter(customer_id__in=customer_ids)
+        .order_by().values_list('customer__assigned_telesale').annotate(c=Count('customer', distinct=True))
+    )
+
+    performance_data = []
+    for sale in telesales:
+        assigned_count = assigned_map.get(sale.id, 0)
+        total_calls = calls_map.get(sale.id, 0)
+        booked_unique = booked_map.get(sale.id, 0)
+        if assigned_count > 0 or total_calls > 0 or booked_unique > 0:
+            performance_data.append({
+                'fullname': f"{sale.last_name} {sale.first_name}", 'username': sale.username,
+                'assigned': assigned_count, 'total_calls': total_calls, 'booked': booked_unique,
+                'rate': _percent(booked_unique, assigned_count),
+            })
+    performance_data.sort(key=lambda x: x['booked'], reverse=True)
+    return performance_data
+
+
+def telesale_recare(telesales, period_logs, period_bookings):
+    """
+    Bảng chăm sóc trong kỳ: số cuộc gọi, số khách đã tiếp cận, số lịch hẹn do chính telesale tạo.
+    2 câu GROUP BY (CallLog theo người gọi, Appointment theo người tạo).
+    """
+    logs_map = {
+        row['caller']: row
+        for row in period_logs.order_by().values('caller').annotate(
+            total_calls=Count('id'), customers_touched=Count('customer', distinct=True)
+        )
+    }
+    bookings_map = dict(period_bookings.order_by().values_list('created_by').annotate(c=Count('id')))
+
+    recare_data = []
+    for sale in telesales:
+        logs_row = logs_map.get(sale.id, {})
+        total_calls_period = logs_row.get('total_calls', 0)
+        total_customers_touched = logs_row.get('customers_touched', 0)
+        my_bookings = bookings_map.get(sale.id, 0)
+        if total_calls_period > 0 or my_bookings > 0:
+            recare_data.append({
+                'fullname': f"{sale.last_name} {sale.first_name}",
+                'username': sale.username,
+                'total_calls': total_calls_period,
+                'customers_touched': total_customers_touched,
+                'booked': my_bookings,
+                'rate': _percent(my_bookings, total_customers_touched),
+            })
+    recare_data.sort(key=lambda x: x['booked'], reverse=True)
+    return recare_data
@@ -0,0 +1,177 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.analytics.dates import day_start
+from apps.bookings.models import Appointment
+from apps.customers.models import Customer
+from apps.telesales.models import CallLog
+from apps.telesales.queue import paginate_queue
+from apps.telesales.reports import age_group_counts
+
+User = get_user_model()
+
+
+class TelesaleReportQueryTests(TestCase):
+    """Benchmark: số câu truy vấn của Báo cáo Telesale không được tăng theo số nhân viên."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', password='testpass123', role='ADMIN')
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.phone_seq = 0
+
+    def add_telesales(self, count):
+        for _ in range(count):
+            self.phone_seq += 1
+            sale = User.objects.create_user(username=f'sale{self.phone_seq}', password='x', role='TELESALE')
+            customer = Customer.objects.create(name=f'Khách {self.phone_seq}', phone=f'09{self.phone_seq:08d}', assigned_telesale=sale)
+            CallLog.objects.create(customer=customer, caller=sale, status='BOOKED')
+            Appointment.objects.create(customer=customer, appointment_date=timezone.now(), created_by=sale)
+
+    def count_report_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/telesale/report/')
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp
+
+    def test_query_count_constant_as_team_grows(self):
+        self.add_telesales(2)
+        small_team_queries, resp = self.count_report_queries()
+        self.assertEqual(len(resp.context['performance_data']), 2)
+
+        self.add_telesales(10)
+        big_team_queries, resp = self.count_report_queries()
+        self.assertEqual(len(resp.context['performance_data']), 12)
+        self.assertEqual(len(resp.context['recare_data']), 12)
+        self.assertEqual(resp.context['performance_data'][0]['booked'], 1)
+        self.assertEqual(resp.context['recare_data'][0]['customers_touched'], 1)
+
+        self.assertEqual(small_team_queries, big_team_queries)
+
+    def test_age_group_counts_matches_customer_age(self):
+        today = date(2024, 6, 15)
+        dobs = [None, date(2024, 1, 1), date(2006, 6, 15), date(2006, 6, 16), date(1998, 6, 16),
+                date(1998, 6, 15), date(1968, 6, 16), date(1968, 6, 15), date(2015, 1, 1)]
+        for i, dob in enumerate(dobs):
+            Customer.objects.create(name=f'Tuổi {i}', phone=f'08{i:08d}', dob=dob)
+
+        groups = age_group_counts(Customer.objects.all(), today=today)
+        self.assertEqual(groups, {'18-25': 2, '26-35': 1, '36-45': 0, '46-55': 1, '55+': 3, 'Unknown': 2})
+
+
+class LastCallSyncTests(TestCase):
+    """Các cột last_call_* của Khách hàng luôn khớp với log mới nhất (signal + lệnh backfill)."""
+
+    def setUp(self):
+        self.a = Customer.objects.create(name='Khách A', phone='0900000001')
+        self.b = Customer.objects.create(name='Khách B', phone='0900000002')
+
+    def log(self, customer, status, minutes_ago):
+        log = CallLog.objects.create(customer=customer, status=status)
+        CallLog.objects.filter(pk=log.pk).update(call_time=timezone.now() - timedelta(minutes=minutes_ago))
+        log.refresh_from_db()
+        return log
+
+    def last_status(self, customer):
+        customer.refresh_from_db()
+        return customer.last_call_status
+
+    def test_save_repoint_and_delete_keep_both_customers_in_sync(self):
+        older = self.log(self.a, 'NO_ANSWER', 10)
+        latest = CallLog.objects.create(customer=self.a, status='BOOKED')
+        self.assertEqual(self.last_status(self.a), 'BOOKED')
+
+        older.status = 'BUSY'
+        older.save()
+        self.assertEqual(self.last_status(self.a), 'BOOKED')
+
+        # Ghi nhầm khách -> chuyển log sang khách B: A quay về log cũ hơn, B nhận log này
+        latest.customer = self.b
+        latest.save()
+        self.assertEqual((self.last_status(self.a), self.last_status(self.b)), ('BUSY', 'BOOKED'))
+
+        latest.delete()
+        self.assertEqual(self.last_status(self.b), None)
+        self.assertEqual(self.b.last_call_time, None)
+
+    def test_backfill_command_rebuilds_columns(self):
+        self.log(self.a, 'NO_ANSWER', 10)
+        callback = timezone.now() + timedelta(days=1)
+        CallLog.objects.create(customer=self.a, status='FOLLOW_UP', callback_time=callback)
+        Customer.objects.update(last_call_status='SPAM', last_call_time=None, last_callback_time=None)
+
+        call_command('backfill_last_call_status', batch_size=1, stdout=StringIO())
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.last_call_status, self.a.last_callback_time), ('FOLLOW_UP', callback))
+        self.assertEqual(self.last_status(self.b), None)
+
+
+class TelesaleQueueTests(TestCase):
+    """Hàng đợi khách phân trang theo con trỏ: không trùng / sót dòng, kể cả khi trùng thời gian hoặc NULL."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', password='x', role='ADMIN')
+        self.client.force_login(self.admin)
+        self.yesterday = timezone.now() - timedelta(days=1)
+
+    def make(self, count, start=0, **fields):
+        fields.setdefault('created_at', self.yesterday)
+        return Customer.objects.bulk_create([
+            Customer(name=f'Khách {start + i}', phone=f'09{start + i:08d}', **fields) for i in range(count)
+        ])
+
+    def walk(self, customers, filter_type, limit):
+        ids, cursor = [], None
+        while True:
+            rows, cursor = paginate_queue(customers, filter_type, cursor=cursor, limit=limit)
+            ids += [c.id for c in rows]
+            if not cursor:
+                return ids
+
+    def test_cursor_is_continuous_across_ties(self):
+        self.make(7)  # cùng created_at
+        self.make(3, start=7, created_at=self.yesterday - timedelta(hours=1))
+        expected = list(Customer.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(Customer.objects.all(), '', limit=3), expected)
+
+    def test_null_sort_values_come_last_and_are_paginated(self):
+        soon = timezone.now() + timedelta(hours=1)
+        self.make(3, last_callback_time=soon)
+        self.make(4, start=3)  # last_callback_time NULL
+        ids = self.walk(Customer.objects.all(), 'callback', limit=2)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(ids, sorted(ids[:3]) + sorted(ids[3:]))
+        self.assertEqual(set(ids[3:]), set(Customer.objects.filter(last_callback_time__isnull=True).values_list('id', flat=True)))
+
+    def test_api_pages_and_filters(self):
+        self.make(52, source='FACEBOOK')
+        self.make(2, start=52, source='REFERRAL')
+        self.make(1, start=54, created_at=timezone.now())  # khách hôm nay
+        url = '/telesale/api/queue/'
+
+        first = self.client.get(url, {'type': 'old'}).json()
+        self.assertEqual((len(first['results']), first['total']), (50, 54))
+        second = self.client.get(url, {'type': 'old', 'cursor': first['next_cursor']}).json()
+        self.assertNotIn('total', second)
+        self.assertIsNone(second['next_cursor'])
+        ids = [r['id'] for r in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 54)
+
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)  # mặc định: khách mới hôm nay
+        referral = self.client.get(url, {'type': 'old', 'source': 'REFERRAL', 'q': 'Khách 53'}).json()
+        self.assertEqual([r['name'] for r in referral['results']], ['Khách 53'])
+
+        # Chăm thêm: hẹn gọi lại hôm nay, sắp theo giờ hẹn tăng dần
+        later, sooner = self.make(2, start=60)
+        now = day_start(timezone.localdate())
+        Customer.objects.filter(pk=later.pk).update(last_call_status='FOLLOW_UP', last_callback_time=now + timedelta(minutes=2))
+        Customer.objects.filter(pk=sooner.pk).update(last_call_status='FOLLOW_UP', last_callback_time=now + timedelta(minutes=1))
+        callback = self.client.get(url, {'type': 'callback'}).json()
+        self.assertEqual([r['id'] for r in callback['results']], [sooner.pk, later.pk])
@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     # BỔ SUNG: Thay thế đường dẫn gốc bằng Dashboard view
     path('', views.telesale_dashboard, name='telesale_home'),
+
+    # API phân trang hàng đợi khách (cuộn vô hạn ở cột trái Dashboard)
+    path('api/queue/', views.telesale_queue_api, name='telesale_queue_api'),
     
     # HOÀN THIỆN: Đường dẫn cho chức năng thêm khách hàng thủ công
     path('add-manual/', views.add_customer_manual, name='add_customer_manual'),
@@ -1,8 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Max, Subquery, OuterRef, Count
+from django.db.models import Q, Max, Count
 from django.utils import timezone
 from datetime import timedelta, date
 import re 
@@ -11,19 +12,19 @@ from apps.customers.models import Customer, Fanpage
 from apps.telesales.models import CallLog
 from apps.bookings.models import Appointment
 from apps.authentication.decorators import allowed_users
+from apps.analytics.dates import day_range, day_start
+from apps.telesales.queue import paginate_queue, cached_queue_total
+from apps.telesales.reports import customer_breakdowns, age_group_counts, telesale_performance, telesale_recare
 
 User = get_user_model()
 
-@login_required(login_url='/auth/login/')
-# [CẬP NHẬT] Thêm quyền MARKETING
-@allowed_users(allowed_roles=['TELESALE', 'ADMIN', 'RECEPTIONIST', 'CONSULTANT', 'MARKETING', 'MANAGER', 'DIRECTOR'])
-def telesale_dashboard(request):
-    today = timezone.now().date()
-    
-    telesales_list = User.objects.filter(role='TELESALE', is_active=True)
-    city_list_raw = Customer.objects.exclude(city__isnull=True).exclude(city__exact='').values_list('city', flat=True).distinct().order_by('city')
-    city_list = [{'code': city, 'label': city} for city in city_list_raw] 
-
+def build_customer_queue(request, today):
+    """
+    Dựng queryset hàng đợi khách (cột trái Telesale Dashboard) theo bộ lọc trên URL.
+    Dùng chung cho trang Dashboard và API phân trang `telesale_queue_api`.
+    Trả về (customers, filter_type, search_query) - queryset CHƯA sắp xếp/cắt trang.
+    Ngày lọc sai định dạng -> ValueError (view báo lỗi thay vì bỏ lọc ngày).
+    """
     customers = Customer.objects.select_related('assigned_telesale').all()
 
     # Nếu là Telesale thường thì chỉ thấy khách của team mình hoặc chưa gán
@@ -32,7 +33,6 @@ def telesale_dashboard(request):
         customers = customers.filter(
             Q(assigned_telesale_id__in=teammate_ids) | Q(assigned_telesale__isnull=True)
         )
-        telesales_list = telesales_list.filter(team=request.user.team)
 
     search_query = request.GET.get('q', '')
     if search_query:
@@ -67,7 +67,7 @@ def telesale_dashboard(request):
 
     if is_report_context:
         if req_date_start and req_date_end:
-            customers = customers.filter(created_at__date__range=[req_date_start, req_date_end])
+            customers = customers.filter(day_range('created_at', req_date_start, req_date_end))
 
         if req_source: customers = customers.filter(source=req_source)
         
@@ -100,14 +100,11 @@ def telesale_dashboard(request):
                 customers = customers.filter(dob__year__gte=min_dob_year)
 
         if status_to_filter and not request.GET.get('type'):
-            latest_log = CallLog.objects.filter(customer=OuterRef('pk')).order_by('-call_time')
-            customers = customers.annotate(
-                current_status=Subquery(latest_log.values('status')[:1])
-            )
+            # [TỐI ƯU] Đọc cột phi chuẩn hoá last_call_status (có index) thay vì Subquery log mới nhất
             if status_to_filter == 'NEW':
-                customers = customers.filter(Q(current_status='NEW') | Q(current_status__isnull=True))
+                customers = customers.filter(Q(last_call_status='NEW') | Q(last_call_status__isnull=True))
             else:
-                customers = customers.filter(current_status=status_to_filter)
+                customers = customers.filter(last_call_status=status_to_filter)
         
     req_type = request.GET.get('type')
     
@@ -119,22 +116,16 @@ def telesale_dashboard(request):
         filter_type = ''
 
     if filter_type == 'new':
-        customers = customers.filter(created_at__date=today)
+        customers = customers.filter(day_range('created_at', today))
         
     elif filter_type == 'old':
-        customers = customers.exclude(created_at__date=today)
+        customers = customers.exclude(day_range('created_at', today))
         
     elif filter_type == 'callback':
-        last_log = CallLog.objects.filter(customer=OuterRef('pk')).order_by('-call_time')
-        customers = customers.annotate(
-            last_status=Subquery(last_log.values('status')[:1]),
-            last_callback_time=Subquery(last_log.values('callback_time')[:1])
-        )
         customers = customers.filter(
-            last_status='FOLLOW_UP',
-            last_callback_time__date=today
+            day_range('last_callback_time', today),
+            last_call_status='FOLLOW_UP'
         )
-        customers = customers.order_by('last_callback_time')
 
     elif filter_type == 'birthday':
         customers = customers.filter(dob__day=today.day, dob__month=today.month)
@@ -143,10 +134,43 @@ def telesale_dashboard(request):
         cutoff_date = today - timedelta(days=90)
         customers = customers.annotate(
             last_visit=Max('appointments__appointment_date', filter=Q(appointments__status__in=['ARRIVED', 'COMPLETED']))
-        ).filter(last_visit__lt=cutoff_date).exclude(appointments__status='SCHEDULED', appointments__appointment_date__gte=today)
+        ).filter(last_visit__lt=day_start(cutoff_date)).exclude(appointments__status='SCHEDULED', appointments__appointment_date__gte=day_start(today))
+
+    return customers, filter_type, search_query
+
+
+@login_required(login_url='/auth/login/')
+# [CẬP NHẬT] Thêm quyền MARKETING
+@allowed_users(allowed_roles=['TELESALE', 'ADMIN', 'RECEPTIONIST', 'CONSULTANT', 'MARKETING', 'MANAGER', 'DIRECTOR'])
+def telesale_dashboard(request):
+    today = timezone.now().date()
+    
+    telesales_list = User.objects.filter(role='TELESALE', is_active=True)
+    city_list_raw = Customer.objects.exclude(city__isnull=True).exclude(city__exact='').values_list('city', flat=True).distinct().order_by('city')
+    city_list = [{'code': city, 'label': city} for city in city_list_raw] 
+
+    if request.user.role == 'TELESALE' and getattr(request.user, 'team', None):
+        telesales_list = telesales_list.filter(team=request.user.team)
 
-    if not (filter_type == 'callback'):
-        customers = customers.order_by('-created_at')
+    req_date_start = request.GET.get('date_start')
+    req_date_end = request.GET.get('date_end')
+    req_report_city = request.GET.get('filter_city')
+    req_report_gender = request.GET.get('filter_gender')
+    req_report_fanpage = request.GET.get('filter_fanpage')
+    req_report_telesale = request.GET.get('filter_telesale')
+    req_report_status = request.GET.get('filter_status')
+    req_report_skin = request.GET.get('filter_skin')
+
+    try:
+        customers, filter_type, search_query = build_customer_queue(request, today)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('telesale_home')
+
+    # [TỐI ƯU] Chỉ render trang đầu (keyset), các trang sau tải dần qua telesale_queue_api
+    # khi cuộn xuống. Tổng số khách lấy từ COUNT đã cache thay vì đếm lại mỗi lần tải trang.
+    queue_page, queue_next_cursor = paginate_queue(customers, filter_type)
+    total_customers = cached_queue_total(customers, request, filter_type)
 
     selected_customer = None
     call_history = []
@@ -157,8 +181,8 @@ def telesale_dashboard(request):
             selected_customer = get_object_or_404(Customer, id=int(float(str(customer_id).replace(',', '.'))))
         except (ValueError, TypeError, Customer.DoesNotExist):
             pass
-    elif customers.exists():
-        selected_customer = customers.first()
+    elif queue_page:
+        selected_customer = queue_page[0]
 
     if selected_customer:
         call_history = CallLog.objects.filter(customer=selected_customer).order_by('-call_time')
@@ -237,7 +261,9 @@ def telesale_dashboard(request):
     filter_query_string = current_params.urlencode() 
 
     context = {
-        'customers': customers,
+        'customers': queue_page,
+        'total_customers': total_customers,
+        'queue_next_cursor': queue_next_cursor,
         'selected_customer': selected_customer,
         'call_history': call_history,
         'search_query': search_query,
@@ -263,6 +289,42 @@ def telesale_dashboard(request):
     return render(request, 'telesales/dashboard.html', context)
 
 
+@login_required(login_url='/auth/login/')
+@allowed_users(allowed_roles=['TELESALE', 'ADMIN', 'RECEPTIONIST', 'CONSULTANT', 'MARKETING', 'MANAGER', 'DIRECTOR'])
+def telesale_queue_api(request):
+    """
+    API phân trang (keyset) cho hàng đợi khách bên trái Dashboard - dùng cho cuộn vô hạn.
+    Nhận cùng bộ lọc với Dashboard + `cursor` (con trỏ trang trước trả về).
+    Tổng số khách (đã cache) chỉ trả về ở trang đầu.
+    """
+    today = timezone.now().date()
+    try:
+        customers, filter_type, _ = build_customer_queue(request, today)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    cursor = request.GET.get('cursor')
+    rows, next_cursor = paginate_queue(customers, filter_type, cursor=cursor)
+
+    results = []
+    for customer in rows:
+        tele = customer.assigned_telesale
+        callback_time = customer.last_callback_time if filter_type == 'callback' else None
+        results.append({
+            'id': customer.id,
+            'name': customer.name,
+            'phone': customer.phone,
+            'created_at': timezone.localtime(customer.created_at).strftime('%d/%m'),
+            'telesale': f"{tele.last_name} {tele.first_name}" if tele else '',
+            'callback_time': timezone.localtime(callback_time).strftime('%H:%M %d/%m') if callback_time else '',
+        })
+
+    data = {'results': results, 'next_cursor': next_cursor}
+    if not cursor:
+        data['total'] = cached_queue_total(customers, request, filter_type)
+    return JsonResponse(data)
+
+
 @login_required(login_url='/auth/login/')
 # [CẬP NHẬT] Thêm quyền MARKETING
 @allowed_users(allowed_roles=['TELESALE', 'ADMIN', 'RECEPTIONIST', 'CONSULTANT', 'MARKETING', 'MANAGER'])
@@ -305,7 +367,7 @@ def add_customer_manual(request):
                     today = timezone.now().date()
                     
                     target_telesale = team_b_members.annotate(
-                        today_load=Count('customer', filter=Q(customer__created_at__date=today))
+                        today_load=Count('customer', filter=day_range('customer__created_at', today))
                     ).order_by('today_load', '?').first()
                     
                     if target_telesale:
@@ -360,8 +422,15 @@ def telesale_report(request):
     req_telesale = request.GET.get('filter_telesale')
     req_skin = request.GET.get('filter_skin')
     req_status = request.GET.get('filter_status')
-    
-    customers = Customer.objects.filter(created_at__date__range=[date_start_str, date_end_str])
+
+    try:
+        created_in_range = day_range('created_at', date_start_str, date_end_str)
+    except ValueError as e:
+        messages.error(request, f"{e} - đang hiển thị từ đầu tháng đến hôm nay.")
+        date_start_str, date_end_str = str(start_of_month), str(today)
+        created_in_range = day_range('created_at', date_start_str, date_end_str)
+
+    customers = Customer.objects.filter(created_in_range)
 
     if request.user.role == 'TELESALE' and getattr(request.user, 'team', None):
         teammate_ids = User.objects.filter(team=request.user.team).values_list('id', flat=True)
@@ -369,9 +438,6 @@ def telesale_report(request):
             Q(assigned_telesale_id__in=teammate_ids) | Q(assigned_telesale__isnull=True)
         )
     
-    latest_log_subquery = CallLog.objects.filter(customer=OuterRef('pk')).order_by('-call_time').values('status')[:1]
-    customers = customers.annotate(final_status=Subquery(latest_log_subquery))
-
     if req_city:
         if req_city == 'None': customers = customers.filter(city__isnull=True)
         else: customers = customers.filter(city=req_city)
@@ -382,101 +448,30 @@ def telesale_report(request):
     
     if req_status:
         if req_status == 'NEW':
-            customers = customers.filter(Q(final_status='NEW') | Q(final_status__isnull=True))
+            customers = customers.filter(Q(last_call_status='NEW') | Q(last_call_status__isnull=True))
         else:
-            customers = customers.filter(final_status=req_status)
+            customers = customers.filter(last_call_status=req_status)
     
     total_leads = customers.count()
-    
-    source_stats = customers.values('source').annotate(count=Count('id')).order_by('-count')
-    source_data = [{'code': x['source'], 'label': dict(Customer.Source.choices).get(x['source'], 'Khác'), 'count': x['count'], 'percent': round(x['count']/total_leads*100, 1) if total_leads else 0} for x in source_stats]
-
-    fanpage_stats = customers.values('fanpage').annotate(count=Count('id')).order_by('-count')
-    fanpage_dict = dict(Customer.FanpageChoices.choices)
-    unmapped_fanpage_count = 0
-    final_fanpage_data = []
-    for x in fanpage_stats:
-        code = x['fanpage']
-        label = fanpage_dict.get(code, 'UNMAPPED_CODE') 
-        if label == 'UNMAPPED_CODE' or not code:
-            unmapped_fanpage_count += x['count']
-            continue
-        final_fanpage_data.append({'code': code, 'label': label, 'count': x['count'], 'percent': round(x['count']/total_leads*100, 1) if total_leads else 0})
-    if unmapped_fanpage_count > 0:
-        final_fanpage_data.append({'code': 'None', 'label': "Chưa cập nhật/Mã lỗi", 'count': unmapped_fanpage_count, 'percent': round(unmapped_fanpage_count/total_leads*100, 1) if total_leads else 0})
-    final_fanpage_data.sort(key=lambda x: x['count'], reverse=True)
-    fanpage_data = final_fanpage_data
-
-    city_stats_raw = customers.values('city').annotate(count=Count('id')).order_by('-count')
-    city_stats = [{'city': i['city'], 'count': i['count'], 'code': 'None' if not i['city'] else i['city']} for i in city_stats_raw]
-    
-    gender_stats_raw = customers.values('gender').annotate(count=Count('id'))
-    gender_data = [{'code': x['gender'], 'label': dict(Customer.Gender.choices).get(x['gender'], 'Không rõ'), 'count': x['count']} for x in gender_stats_raw]
-
-    age_groups = {'18-25': 0, '26-35': 0, '36-45': 0, '46-55': 0, '55+': 0, 'Unknown': 0}
-    for cus in customers:
-        age = cus.age
-        if not age: age_groups['Unknown'] += 1
-        elif 18 <= age <= 25: age_groups['18-25'] += 1
-        elif 26 <= age <= 35: age_groups['26-35'] += 1
-        elif 36 <= age <= 45: age_groups['36-45'] += 1
-        elif 46 <= age <= 55: age_groups['46-55'] += 1
-        else: age_groups['55+'] += 1
-        
-    skin_stats_raw = customers.values('skin_condition').annotate(count=Count('id')).order_by('-count')
-    skin_data = [{'code': x['skin_condition'], 'label': dict(Customer.SkinIssue.choices).get(x['skin_condition'], 'Không rõ'), 'count': x['count'], 'percent': round(x['count']/total_leads*100, 1) if total_leads else 0} for x in skin_stats_raw]
-
-    status_counts_query = customers.values('final_status').annotate(total=Count('id'))
-    status_map = {item['final_status']: item['total'] for item in status_counts_query}
-    data_quality_list = []
-    total_counted = 0
-    for code, label in CallLog.CallStatus.choices:
-        if code == 'NEW': continue
-        count = status_map.get(code, 0) 
-        if count > 0:
-            data_quality_list.append({'code': code, 'label': label, 'count': count, 'rate': round(count/total_leads*100, 1) if total_leads else 0})
-            total_counted += count
-    count_uncontacted = total_leads - total_counted
-    if count_uncontacted > 0:
-        data_quality_list.append({'code': 'NEW', 'label': 'Mới / Chưa gọi', 'count': count_uncontacted, 'rate': round(count_uncontacted/total_leads*100, 1) if total_leads else 0})
-    data_quality_list.sort(key=lambda x: x['count'], reverse=True)
+
+    # [TỐI ƯU] Toàn bộ bảng phân tích tính bằng GROUP BY trong apps/telesales/reports.py
+    # -> số câu truy vấn cố định, không tăng theo số telesale / số lead
+    breakdowns = customer_breakdowns(customers, total_leads)
+    age_groups = age_group_counts(customers)
 
     telesales = User.objects.filter(role='TELESALE')
     if request.user.role == 'TELESALE' and getattr(request.user, 'team', None):
         telesales = telesales.filter(team=request.user.team)
+    telesales = list(telesales)
 
-    filtered_customer_ids = customers.values_list('id', flat=True) 
-    logs = CallLog.objects.filter(customer__id__in=filtered_customer_ids) 
-    
-    performance_data = []
-    for sale in telesales:
-        assigned_count = customers.filter(assigned_telesale=sale).count() 
-        sale_logs = logs.filter(caller=sale)
-        total_calls = sale_logs.count()
-        
-        booked_unique = Appointment.objects.filter(
-            created_at__date__range=[date_start_str, date_end_str], 
-            customer__assigned_telesale=sale,
-            customer__id__in=filtered_customer_ids,
-            status__in=['SCHEDULED', 'ARRIVED', 'IN_CONSULTATION', 'COMPLETED']
-        ).values('customer').distinct().count()
-
-        rate_on_assigned = (booked_unique / assigned_count * 100) if assigned_count > 0 else 0
-        if assigned_count > 0 or total_calls > 0 or booked_unique > 0:
-            performance_data.append({
-                'fullname': f"{sale.last_name} {sale.first_name}", 'username': sale.username,
-                'assigned': assigned_count, 'total_calls': total_calls, 'booked': booked_unique, 'rate': round(rate_on_assigned, 1)
-            })
-    performance_data.sort(key=lambda x: x['booked'], reverse=True)
-
-    recare_data = []
-    
-    period_logs = CallLog.objects.filter(call_time__date__range=[date_start_str, date_end_str])
+    period_logs = CallLog.objects.filter(day_range('call_time', date_start_str, date_end_str))
     period_bookings = Appointment.objects.filter(
-        created_at__date__range=[date_start_str, date_end_str],
+        created_in_range,
         status__in=['SCHEDULED', 'ARRIVED', 'IN_CONSULTATION', 'COMPLETED']
     )
 
+    performance_data = telesale_performance(telesales, customers, period_bookings)
+
     if req_city:
         if req_city == 'None': 
             period_logs = period_logs.filter(customer__city__isnull=True)
@@ -505,24 +500,7 @@ def telesale_report(request):
         period_logs = period_logs.filter(Q(customer__assigned_telesale_id__in=teammate_ids) | Q(customer__assigned_telesale__isnull=True))
         period_bookings = period_bookings.filter(Q(customer__assigned_telesale_id__in=teammate_ids) | Q(customer__assigned_telesale__isnull=True))
 
-    for sale in telesales:
-        my_logs = period_logs.filter(caller=sale)
-        total_calls_period = my_logs.count()
-        total_customers_touched = my_logs.values('customer').distinct().count()
-        my_bookings = period_bookings.filter(created_by=sale).count()
-        conversion_rate = (my_bookings / total_customers_touched * 100) if total_customers_touched > 0 else 0
-        
-        if total_calls_period > 0 or my_bookings > 0:
-            recare_data.append({
-                'fullname': f"{sale.last_name} {sale.first_name}",
-                'username': sale.username,
-                'total_calls': total_calls_period,
-                'customers_touched': total_customers_touched,
-                'booked': my_bookings,
-                'rate': round(conversion_rate, 1)
-            })
-            
-    recare_data.sort(key=lambda x: x['booked'], reverse=True)
+    recare_data = telesale_recare(telesales, period_logs, period_bookings)
 
     telesales_list = User.objects.filter(role='TELESALE', is_active=True).order_by('first_name')
     if request.user.role == 'TELESALE' and getattr(request.user, 'team', None):
@@ -532,13 +510,8 @@ def telesale_report(request):
         'date_start': date_start_str,
         'date_end': date_end_str,
         'total_leads': total_leads,
-        'source_data': source_data,
-        'fanpage_data': fanpage_data,
-        'city_stats': city_stats,
-        'gender_data': gender_data,
+        **breakdowns,
         'age_groups': age_groups,
-        'skin_data': skin_data,
-        'data_quality_list': data_quality_list,
         'performance_data': performance_data,
         'recare_data': recare_data, 
         'telesales_list': telesales_list,
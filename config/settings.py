@@ -65,6 +65,7 @@ INSTALLED_APPS = [
     'apps.service_calendar',
     'apps.clinical_portal',
     'apps.viral_analysis',
+    'apps.analytics',
 ]
 
 MIDDLEWARE = [
@@ -234,4 +235,22 @@ DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
 
 # Cho phép upload file lớn lên tới 250MB (262144000 bytes)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 262144000
-FILE_UPLOAD_MAX_MEMORY_SIZE = 262144000
\ No newline at end of file
+FILE_UPLOAD_MAX_MEMORY_SIZE = 262144000
+
+# TIẾN TRÌNH NỀN BẮT BUỘC (Dashboard / Báo cáo Marketing chỉ đọc bảng tổng hợp DailyFact):
+# - `python manage.py process_rollup_queue --loop`: worker chạy liên tục (systemd/supervisor), dựng lại các ngày
+#   có thay đổi. Không chạy worker thì số liệu (kể cả hôm nay) đứng yên, Dashboard hiện cảnh báo "đang chờ tổng hợp".
+# - `python manage.py rebuild_daily_facts` hằng đêm qua cron: đối soát 7 ngày gần nhất.
+# CHAT LONG-POLL (chạy dưới ASGI: uvicorn config.asgi:application)
+# Chạy WSGI (gunicorn/runserver) thì API chờ trả về ngay và trình duyệt hỏi định kỳ 3 giây như trước.
+# Mặc định DatabaseNotifier: đúng với mọi cách chạy (nhiều worker uvicorn, nhiều máy); mỗi tiến trình chỉ
+# 1 thread dò DB mỗi CHAT_DB_NOTIFIER_INTERVAL giây, dùng chung cho mọi tab đang chờ.
+# 'apps.chat.notifier.InProcessNotifier' chỉ dùng khi chạy ĐÚNG 1 tiến trình ASGI (uvicorn không --workers),
+# nếu không client ở tiến trình khác sẽ không được đánh thức khi có tin mới.
+CHAT_NOTIFIER = os.getenv('CHAT_NOTIFIER', 'apps.chat.notifier.DatabaseNotifier')
+CHAT_LONG_POLL_TIMEOUT = 25
+CHAT_DB_NOTIFIER_INTERVAL = 1
+# Số thread xử lý ảnh đính kèm chat (0 = xử lý ngay trong request)
+CHAT_IMAGE_WORKERS = 2
+# Số thread nhập kho từ file Excel (0 = xử lý ngay trong request)
+INVENTORY_IMPORT_WORKERS = 1